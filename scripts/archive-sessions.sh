@@ -0,0 +1,84 @@
+#!/usr/bin/env bash
+# archive-sessions.sh — Compress cold session transcripts into seekable archives
+# Usage: archive-sessions.sh [project-path|"all"] [--older-than DAYS] [--codec gz|xz]
+#        [--dry-run] [--restore]
+#
+# Each <id>.jsonl (and its subagent transcripts) untouched for more than
+# --older-than days (default 30) is rewritten as <id>.jsonl.gz or .jsonl.xz,
+# compressed in ~1MB blocks of whole lines, with a <archive>.idx block index.
+# All echo-sleuth scripts read archives transparently, still addressed by the
+# original .jsonl path. Claude Code itself cannot resume an archived session;
+# run with --restore first.
+#
+# Output format (tab-separated):
+#   ACTION  SOURCE  DESTINATION  RAW_BYTES  COMPRESSED_BYTES
+#   then: # <n> file(s), <raw> -> <compressed> bytes
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+SCOPE="$(pwd)"
+if [[ $# -gt 0 && "${1}" != --* ]]; then
+  SCOPE="$1"
+  shift
+fi
+
+OLDER_THAN=30
+CODEC="gz"
+DRY_RUN=0
+RESTORE=0
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --older-than) OLDER_THAN="$2"; shift 2 ;;
+    --codec) CODEC="$2"; shift 2 ;;
+    --dry-run) DRY_RUN=1; shift ;;
+    --restore) RESTORE=1; shift ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+if ! [[ "$OLDER_THAN" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --older-than must be a number of days, got: $OLDER_THAN" >&2
+  exit 1
+fi
+if [[ "$CODEC" != "gz" && "$CODEC" != "xz" ]]; then
+  echo "ERROR: --codec must be 'gz' or 'xz', got: $CODEC" >&2
+  exit 1
+fi
+
+ES_SCOPE="$SCOPE" ES_OLDER_THAN="$OLDER_THAN" ES_CODEC="$CODEC" ES_DRY_RUN="$DRY_RUN" \
+ES_RESTORE="$RESTORE" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
+
+scope = os.environ["ES_SCOPE"]
+if scope == "all":
+    project_dirs = list(echolib.all_project_dirs())
+else:
+    proj_dir = echolib.find_project_dir(scope)
+    if not proj_dir:
+        echolib.cli_error("No Claude session directory found for " + scope)
+    project_dirs = [proj_dir]
+
+dry_run = os.environ.get("ES_DRY_RUN", "0") == "1"
+restore = os.environ.get("ES_RESTORE", "0") == "1"
+done = echolib.archive_cold_sessions(
+    project_dirs,
+    older_than_days=int(os.environ.get("ES_OLDER_THAN", "30")),
+    codec=os.environ.get("ES_CODEC", "gz"),
+    dry_run=dry_run,
+    restore=restore,
+)
+
+action = ("would-" if dry_run else "") + ("restore" if restore else "archive")
+raw_total = comp_total = 0
+for src, dest, raw, comp in done:
+    raw_total += raw
+    comp_total += comp
+    print("\t".join([action, src, dest, str(raw), str(comp)]))
+print("# {} file(s), {} -> {} bytes".format(len(done), raw_total, comp_total))
+PYEOF
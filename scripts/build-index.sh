@@ -5,6 +5,7 @@
 # Creates .echo-sleuth-index.json cache files for fast repeat access.
 # This is called automatically by list-sessions.sh, but can be run manually
 # to pre-warm the cache for all projects.
+# warm-caches.sh keeps this and the other derived caches warm for recent sessions.
 
 set -euo pipefail
 
@@ -26,7 +27,7 @@ if scope == "all":
     for project_dir in echolib.all_project_dirs():
         index_path = project_dir / "sessions-index.json"
         if not index_path.exists():
-            jsonl_files = list(project_dir.glob("*.jsonl"))
+            jsonl_files = echolib.iter_session_files(project_dir)
             if jsonl_files:
                 total += 1
                 entries = echolib.build_fallback_index(project_dir)
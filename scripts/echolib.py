@@ -6,16 +6,49 @@ Single-file, stdlib-only (Python 3.6+). All scripts are thin wrappers around thi
 Classes:
     Record      — A parsed JSONL record with type-aware accessors.
     SessionMeta — Lightweight session metadata (from index or built from .jsonl).
+    ScanBudget  — Deadline/byte budget for scans that may return partial results.
+    TreeScan    — Shared scandir listings of CLAUDE_DIR with cached stat results.
+    CacheLock   — Advisory flock held while a shared cache is rebuilt.
+    SessionCatalog — Cross-project session catalog sorted by created date.
+    UsageWarehouse — Incremental sqlite3 store of per-turn usage and tool calls.
+    SearchIndex — Incremental BM25 inverted index over messages and tool inputs.
+    SessionVectors — Cached hashed TF-IDF session vectors for related-session queries.
+    UuidRegistry — Per-project owners of record uuids, for resume-aware dedup.
+    SessionDigest — Pre-extracted messages, tool calls and files of one session.
+    BlobStore   — Content-addressed, reference-counted store for repeated payloads.
+    SchemaRegistry — Record types and fields per client version, with first sightings.
     Memory      — A parsed memory file with frontmatter fields.
+    ProjectSnapshot — File paths and identifiers of a project root, for claim checks.
 
 Functions:
+    open_session()        — Open a .jsonl or its block-compressed archive at an offset.
+    archive_session()     — Compress a session into seekable blocks (+ restore_session()).
+    bounded_lines()       — Iterate lines, decoding giant ones with bounded memory.
     iter_records()        — Stream records from a .jsonl file with filtering.
+    iter_many()           — Stream records from many files, opening and reading ahead.
     detect_schema()       — Probe a .jsonl file and report its structure.
+    record_shape()        — Field names describing one record's structure.
     session_stats()       — Compute statistics for a session file.
+    session_tree_stats()  — Stats for a session plus its subagents (cached, parallel).
+    project_stats()       — Stats rolled up over a project, optionally resume-deduplicated.
     extract_messages()    — Yield human-readable messages from a session.
     extract_tools()       — Yield tool calls joined with their results.
     extract_files_changed() — Get files edited from the last snapshot (reverse-read).
+    extract_file_timeline() — Per-file version transitions across every snapshot.
+    session_digest()      — Fresh digest of a large session, if one has been built.
     list_sessions()       — List sessions across projects (index + fallback).
+    stream_sessions()     — All-project listing streamed newest first, projects by mtime.
+    load_catalog()        — Load and incrementally refresh the global session catalog.
+    corpus_roots()        — Session trees of a multi-root corpus ($ECHO_SLEUTH_ROOTS).
+    corpus_sessions()     — Newest-first sessions merged from every root's own catalog.
+    corpus_search()       — BM25 top-k over every root's index with corpus-wide statistics.
+    warm_plan() / warm_caches() — Find and refresh stale caches of recent sessions, throttled.
+    git_commits()         — Parsed git log records from a HEAD-keyed per-repo cache.
+    correlate_sessions()  — Interval-join sessions with commits into a timeline.
+    scan_knowledge()      — Single-pass knowledge candidates from one session.
+    extract_project_knowledge() — Incremental, parallel knowledge extraction for a project.
+    scan_projects()       — The shared TreeScan, reused for SCAN_MAX_AGE seconds.
+    read_cache() / write_cache() — Versioned JSON caches, replaced atomically.
     find_project_dir()    — Map a project path to its Claude session directory.
     build_fallback_index() — Build index entries for projects without sessions-index.json.
 
@@ -27,8 +60,12 @@ Functions:
     staleness_score()     — Compute heuristic staleness for a memory.
     estimate_tokens()     — Rough token count estimate.
     memory_stats()        — Aggregate stats for one project's memories.
+    extract_claims()      — File path and identifier claims in a memory body.
+    verify_memories()     — Check every memory's claims against one snapshot per project.
 """
 
+import bisect
+import heapq
 import json
 import math
 import os
@@ -164,637 +201,2544 @@ class Record:
 
 
 # ---------------------------------------------------------------------------
-# Core iterator
+# Session file access (plain .jsonl and block-compressed archives)
 # ---------------------------------------------------------------------------
 
-def iter_records(path, types=None, skip_noise=True, limit=0):
+ARCHIVE_SUFFIXES = (".jsonl.gz", ".jsonl.xz")
+SESSION_SUFFIXES = (".jsonl",) + ARCHIVE_SUFFIXES
+
+# Archives are a concatenation of independently compressed blocks of whole
+# lines; <archive>.idx records where each block starts, raw and compressed.
+BLOCK_INDEX_SUFFIX = ".idx"
+BLOCK_INDEX_VERSION = 1
+ARCHIVE_BLOCK_SIZE = 1_048_576
+
+
+def session_file_id(path):
+    """Session/agent id from a session file name, ignoring archive suffixes."""
+    name = os.path.basename(str(path))
+    for suffix in SESSION_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+def live_session_path(path):
+    """The .jsonl path a session file was (or will be) stored under."""
+    s = str(path)
+    for suffix in ARCHIVE_SUFFIXES:
+        if s.endswith(suffix):
+            return s[:-len(suffix) + len(".jsonl")]
+    return s
+
+
+def resolve_session_path(path):
     """
-    Yield Record objects from a .jsonl file.
+    Return `path`, or its archived sibling if the .jsonl has been archived.
 
-    Args:
-        path: Path to the .jsonl file.
-        types: Optional set/list of record types to include.
-        skip_noise: Skip progress/queue-operation records.
-        limit: Stop after this many yielded records (0 = unlimited).
+    Index entries keep pointing at <id>.jsonl after archival; this lets every
+    reader follow them to <id>.jsonl.gz / <id>.jsonl.xz transparently.
     """
-    type_filter = set(types) if types else None
-    count = 0
+    s = str(path)
+    if s.endswith(".jsonl") and not _scan_exists(s):
+        for suffix in ARCHIVE_SUFFIXES:
+            candidate = s[:-len(".jsonl")] + suffix
+            if _scan_exists(candidate):
+                return candidate
+    return s
 
-    with open(path, encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
 
-            # Pre-filter: skip noise by string match before json.loads
-            if skip_noise:
-                if any(ns in line for ns in _NOISE_STRINGS):
-                    continue
+def iter_session_files(directory, prefix=""):
+    """
+    Sorted Paths of session files directly in `directory` (plain or archived).
 
-            # Pre-filter: skip types we don't want (cheap string check)
-            if type_filter and '"file-history-snapshot"' in line and "file-history-snapshot" not in type_filter:
-                continue
+    When both <id>.jsonl and an archive exist, the live .jsonl wins.
+    """
+    files = _listing(directory)[0]
+    return [Path(entry.path) for entry in _session_entries(files, prefix)]
 
-            try:
-                d = json.loads(line)
-            except (json.JSONDecodeError, ValueError):
-                continue
 
-            rtype = d.get("type", "")
-            if skip_noise and rtype in NOISE_TYPES:
-                continue
-            if type_filter and rtype not in type_filter:
-                continue
+def _session_entries(files, prefix=""):
+    """Session DirEntries from a {name: DirEntry} listing, sorted by id; .jsonl beats archives."""
+    found = {}
+    for name, entry in files.items():
+        if not name.startswith(prefix) or not name.endswith(SESSION_SUFFIXES):
+            continue
+        sid = session_file_id(name)
+        if sid not in found or name.endswith(".jsonl"):
+            found[sid] = entry
+    return [found[sid] for sid in sorted(found)]
+
+
+def _archive_codec(path):
+    s = str(path)
+    if s.endswith(".gz"):
+        return "gz"
+    if s.endswith(".xz"):
+        return "xz"
+    return None
 
-            yield Record(d)
-            count += 1
-            if limit and count >= limit:
-                return
 
+def load_block_index(path):
+    """Block index dict for an archive ({codec, raw_size, blocks}), or None."""
+    return read_cache(str(path) + BLOCK_INDEX_SUFFIX, BLOCK_INDEX_VERSION)
 
-# ---------------------------------------------------------------------------
-# Schema detection
-# ---------------------------------------------------------------------------
 
-def detect_schema(path):
+def session_signature(path):
     """
-    Probe a .jsonl file and return a schema report dict.
+    [mtime, raw_size] for cache validation, or None if unreadable.
 
-    Returns dict with keys: file, lines, bytes, first_timestamp, last_timestamp,
-    versions, models, unknown_types, record_types (type -> {count, fields}).
+    For archives raw_size comes from the block index, and archival keeps the
+    original mtime, so a session's signature survives being archived.
     """
-    type_counts = Counter()
-    field_sets = {}
-    versions = set()
-    models = set()
-    first_ts = ""
-    last_ts = ""
-    total_bytes = 0
-    line_count = 0
-    unknown_types = set()
-
-    with open(path, encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line_count += 1
-            total_bytes += len(line)
-            line = line.strip()
-            if not line:
-                continue
+    path = resolve_session_path(path)
+    sig = _file_signature(path)
+    if sig is None or _archive_codec(path) is None:
+        return sig
+    idx = load_block_index(path)
+    if idx:
+        sig[1] = idx.get("raw_size", sig[1])
+    return sig
 
-            if '"type"' not in line:
-                continue
 
-            try:
-                rec = json.loads(line)
-            except (json.JSONDecodeError, ValueError):
-                continue
+def _file_signature(path, cached=False):
+    """
+    (mtime, size) for cache validation, or None if the file is unreadable.
 
-            rtype = rec.get("type", "")
-            type_counts[rtype] += 1
+    cached=True takes the stat from the shared tree scan (see scan_projects()).
+    """
+    try:
+        st = _scan_stat(path) if cached else os.stat(str(path))
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
 
-            if rtype not in KNOWN_TYPES:
-                unknown_types.add(rtype)
 
-            if rtype not in field_sets:
-                field_sets[rtype] = set()
-            if type_counts[rtype] <= 5:
-                field_sets[rtype].update(rec.keys())
+def _decompress_block(codec, data):
+    if codec == "gz":
+        import zlib
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    import lzma
+    return lzma.decompress(data)
 
-            v = rec.get("version", "")
-            if v:
-                versions.add(v)
 
-            msg = rec.get("message", {})
-            if isinstance(msg, dict):
-                m = msg.get("model", "")
-                if m and m != "<synthetic>":
-                    models.add(m)
+def _open_archive_stream(path, codec, comp_offset=0):
+    """Binary decompressing reader starting at a block boundary; owns the file."""
+    import gzip
+    import lzma
 
-            ts = rec.get("timestamp", "")
-            if ts:
-                if not first_ts or ts < first_ts:
-                    first_ts = ts
-                if ts > last_ts:
-                    last_ts = ts
+    raw = open(path, "rb")
+    raw.seek(comp_offset)
+    if codec == "gz":
+        stream = gzip.GzipFile(fileobj=raw, mode="rb")
+    else:
+        stream = lzma.LZMAFile(raw, mode="rb")
+    close = stream.close
 
-    return {
-        "file": str(path),
-        "lines": line_count,
-        "bytes": total_bytes,
-        "first_timestamp": first_ts,
-        "last_timestamp": last_ts,
-        "versions": sorted(versions),
-        "models": sorted(models),
-        "unknown_types": sorted(unknown_types),
-        "record_types": {
-            rtype: {
-                "count": count,
-                "fields": sorted(field_sets.get(rtype, set())),
-            }
-            for rtype, count in type_counts.most_common()
-        },
-    }
+    def close_both():
+        try:
+            close()
+        finally:
+            raw.close()
 
+    stream.close = close_both
+    return stream
 
-# ---------------------------------------------------------------------------
-# Session statistics (single-pass)
-# ---------------------------------------------------------------------------
 
-def session_stats(path):
+def open_session(path, offset=0, binary=False):
     """
-    Compute session statistics in a single pass.
+    Open a session file for reading from raw byte `offset`.
 
-    Returns a dict with: slug, model, branch, started, ended, user_messages,
-    assistant_messages, tool_calls, files_edited, errors, input_tokens,
-    output_tokens, cache_read_tokens, cache_create_tokens, total_tokens,
-    compactions, summary.
+    Plain .jsonl files are opened directly. Archives are decompressed on the
+    fly; with a block index, only blocks from the one containing `offset`
+    onward are read. Text mode decodes UTF-8 with errors="replace".
     """
-    stats = {
-        "slug": "", "model": "", "branch": "",
-        "started": "", "ended": "",
-        "user_messages": 0, "assistant_messages": 0,
-        "tool_calls": 0, "files_edited": 0, "errors": 0,
-        "input_tokens": 0, "output_tokens": 0,
-        "cache_read_tokens": 0, "cache_create_tokens": 0,
-        "compactions": 0, "summary": "",
-    }
+    import io
 
-    with open(path, encoding="utf-8", errors="replace") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
+    path = resolve_session_path(path)
+    codec = _archive_codec(path)
 
-            # Count errors by string match BEFORE parsing (cheap)
-            if '"is_error": true' in line or '"is_error":true' in line:
-                stats["errors"] += 1
+    if codec is None:
+        if not offset and not binary:
+            return open(path, encoding="utf-8", errors="replace")
+        stream = open(path, "rb")
+        stream.seek(offset)
+    else:
+        skip = offset
+        comp_offset = 0
+        idx = load_block_index(path) if offset else None
+        if idx and idx.get("blocks"):
+            starts = [b[0] for b in idx["blocks"]]
+            i = max(0, bisect.bisect_right(starts, offset) - 1)
+            comp_offset = idx["blocks"][i][1]
+            skip = offset - idx["blocks"][i][0]
+        stream = _open_archive_stream(path, codec, comp_offset)
+        while skip > 0:
+            got = stream.read(min(skip, ARCHIVE_BLOCK_SIZE))
+            if not got:
+                break
+            skip -= len(got)
+
+    if binary:
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+
+
+def iter_archive_blocks_reversed(path):
+    """Yield decompressed blocks of an indexed archive, last block first."""
+    path = resolve_session_path(path)
+    codec = _archive_codec(path)
+    idx = load_block_index(path)
+    if codec is None or not idx:
+        return
+    blocks = idx.get("blocks", [])
+    comp_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        for i in range(len(blocks) - 1, -1, -1):
+            start = blocks[i][1]
+            end = blocks[i + 1][1] if i + 1 < len(blocks) else comp_size
+            f.seek(start)
+            yield _decompress_block(codec, f.read(end - start))
 
-            try:
-                d = json.loads(line)
-            except (json.JSONDecodeError, ValueError):
-                continue
 
-            rtype = d.get("type", "")
-            ts = d.get("timestamp", "")
+def archive_session(path, codec="gz", block_size=ARCHIVE_BLOCK_SIZE):
+    """
+    Recompress a .jsonl into <id>.jsonl.gz|xz plus a block index, then
+    remove the original. The archive keeps the original mtime.
 
-            if ts:
-                if not stats["started"] or ts < stats["started"]:
-                    stats["started"] = ts
-                if ts > stats["ended"]:
-                    stats["ended"] = ts
+    Returns (archive_path, raw_size, compressed_size).
+    """
+    import gzip
+    import lzma
+
+    if codec not in ("gz", "xz"):
+        raise ValueError("codec must be 'gz' or 'xz'")
+    src = str(path)
+    st = os.stat(src)
+    dest = src[:-len(".jsonl")] + ".jsonl." + codec if src.endswith(".jsonl") else src + "." + codec
+    tmp = dest + ".tmp"
+
+    def compress(data):
+        if codec == "gz":
+            return gzip.compress(data, compresslevel=6)
+        return lzma.compress(data, preset=6)
+
+    blocks = []
+    raw_pos = 0
+    comp_pos = 0
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        pending = []
+        pending_len = 0
+        for line in fin:
+            pending.append(line)
+            pending_len += len(line)
+            if pending_len >= block_size:
+                data = compress(b"".join(pending))
+                blocks.append([raw_pos, comp_pos])
+                fout.write(data)
+                raw_pos += pending_len
+                comp_pos += len(data)
+                pending, pending_len = [], 0
+        if pending:
+            data = compress(b"".join(pending))
+            blocks.append([raw_pos, comp_pos])
+            fout.write(data)
+            raw_pos += pending_len
+            comp_pos += len(data)
+
+    if not write_cache(dest + BLOCK_INDEX_SUFFIX, {
+            "codec": codec, "raw_size": raw_pos, "blocks": blocks}, BLOCK_INDEX_VERSION):
+        os.remove(tmp)
+        raise OSError("cannot write block index for " + dest)
+    os.replace(tmp, dest)
+    os.utime(dest, (st.st_atime, st.st_mtime))
+    os.remove(src)
+    invalidate_scan()
+    return dest, raw_pos, comp_pos
+
+
+def restore_session(path):
+    """Decompress an archive back to <id>.jsonl (keeping mtime); returns the new path."""
+    import shutil
+
+    src = str(path)
+    dest = live_session_path(src)
+    st = os.stat(src)
+    with open_session(src, binary=True) as fin, open(dest + ".tmp", "wb") as fout:
+        shutil.copyfileobj(fin, fout)
+    os.replace(dest + ".tmp", dest)
+    os.utime(dest, (st.st_atime, st.st_mtime))
+    os.remove(src)
+    try:
+        os.remove(src + BLOCK_INDEX_SUFFIX)
+    except OSError:
+        pass
+    invalidate_scan()
+    return dest
 
-            if not stats["branch"]:
-                stats["branch"] = d.get("gitBranch", "")
-            if not stats["slug"]:
-                stats["slug"] = d.get("slug", "")
 
-            if rtype == "user":
-                msg = d.get("message", {})
-                if not isinstance(msg, dict):
+def archive_cold_sessions(project_dirs, older_than_days=30, codec="gz",
+                          dry_run=False, restore=False, now=None):
+    """
+    Archive (or with restore=True, restore) session and subagent files.
+
+    Only plain .jsonl files last modified more than `older_than_days` ago are
+    archived; restore ignores age. Returns a list of
+    (source, destination, raw_size, compressed_size) tuples; sizes are 0
+    for restores and dry runs.
+    """
+    import time
+
+    cutoff = (now or time.time()) - older_than_days * 86400
+    done = []
+    for project_dir in project_dirs:
+        for path in iter_session_files(project_dir):
+            for f in [path] + find_subagent_files(path):
+                s = str(f)
+                if restore:
+                    if _archive_codec(s) is None:
+                        continue
+                    dest = live_session_path(s)
+                    if not dry_run:
+                        restore_session(s)
+                    done.append((s, dest, 0, 0))
                     continue
-                if d.get("isMeta") or d.get("isCompactSummary"):
+                if _archive_codec(s) is not None:
                     continue
-                content = msg.get("content", "")
-                if isinstance(content, list):
-                    has_tr = any(
-                        isinstance(b, dict) and b.get("type") == "tool_result"
-                        for b in content
-                    )
-                    if has_tr:
+                try:
+                    if _scan_stat(s).st_mtime > cutoff:
                         continue
-                    has_text = any(
-                        isinstance(b, dict) and b.get("type") == "text"
-                        for b in content
-                    )
-                    if has_text:
-                        stats["user_messages"] += 1
-                elif isinstance(content, str) and content.strip():
-                    stats["user_messages"] += 1
-
-            elif rtype == "assistant":
-                msg = d.get("message", {})
-                if not isinstance(msg, dict):
+                except OSError:
                     continue
-                m = msg.get("model", "")
-                if m == "<synthetic>":
+                if dry_run:
+                    done.append((s, s + "." + codec, 0, 0))
                     continue
-                stats["assistant_messages"] += 1
-                if not stats["model"] and m:
-                    stats["model"] = m
-
-                usage = msg.get("usage", {})
-                if isinstance(usage, dict):
-                    stats["input_tokens"] += usage.get("input_tokens", 0)
-                    stats["output_tokens"] += usage.get("output_tokens", 0)
-                    stats["cache_read_tokens"] += usage.get("cache_read_input_tokens", 0)
-                    stats["cache_create_tokens"] += usage.get("cache_creation_input_tokens", 0)
-
-                content = msg.get("content", [])
-                if isinstance(content, list):
-                    for block in content:
-                        if isinstance(block, dict) and block.get("type") == "tool_use":
-                            stats["tool_calls"] += 1
-
-            elif rtype == "summary":
-                stats["summary"] = d.get("summary", "")
-
-            elif rtype == "file-history-snapshot":
-                backups = d.get("snapshot", {}).get("trackedFileBackups", {})
-                fc = len(backups) if isinstance(backups, dict) else 0
-                if fc > stats["files_edited"]:
-                    stats["files_edited"] = fc
-
-            elif rtype == "system":
-                st = d.get("subtype", "")
-                if st in ("compact_boundary", "microcompact_boundary"):
-                    stats["compactions"] += 1
+                dest, raw, comp = archive_session(s, codec=codec)
+                done.append((s, dest, raw, comp))
+    return done
 
-    stats["total_tokens"] = stats["input_tokens"] + stats["output_tokens"]
-    return stats
+
+class SessionTail:
+    """
+    Follow a growing .jsonl: yield complete lines as they are appended.
+
+    `offset` is the byte position just past the last complete line handed
+    out, so a partially written trailing line is never parsed; it is picked
+    up whole on a later poll. If the file shrinks (rewritten), reading
+    restarts from 0 and `restarts` is incremented, so a consumer that
+    accumulates state can start over. Iteration polls every `poll` seconds
+    and ends after `idle_timeout` seconds without new lines (0 = follow
+    forever).
+    """
+
+    __slots__ = ("path", "offset", "poll", "idle_timeout", "restarts")
+
+    def __init__(self, path, offset=0, poll=1.0, idle_timeout=0):
+        self.path = resolve_session_path(path)
+        self.offset = offset
+        self.poll = poll
+        self.idle_timeout = idle_timeout
+        self.restarts = 0
+
+    # Bytes read per poll, so following a large file from 0 streams it.
+    CHUNK = 8_388_608
+
+    def read_new(self):
+        """Complete lines (decoded, without newline) appended since the last call."""
+        lines = []
+        read = 0
+        try:
+            if _archive_codec(self.path) is None and os.path.getsize(self.path) < self.offset:
+                self.offset = 0
+                self.restarts += 1
+            with open_session(self.path, offset=self.offset, binary=True) as f:
+                for n, raw in bounded_lines(f, sizes=True):
+                    if not raw.endswith(b"\n"):
+                        break  # Still being written
+                    lines.append(raw[:-1].decode("utf-8", errors="replace"))
+                    read += n
+                    if read >= self.CHUNK:
+                        break
+        except (OSError, EOFError):
+            pass
+        self.offset += read
+        return lines
+
+    def batches(self):
+        """Yield each poll's list of new lines; see the class docstring for timing."""
+        import time
+
+        idle_since = time.monotonic()
+        while True:
+            lines = self.read_new()
+            if lines:
+                yield lines
+                idle_since = time.monotonic()
+                continue
+            if self.idle_timeout and time.monotonic() - idle_since >= self.idle_timeout:
+                return
+            time.sleep(self.poll)
+
+    def __iter__(self):
+        for lines in self.batches():
+            for line in lines:
+                yield line
 
 
 # ---------------------------------------------------------------------------
-# Message extraction
+# Projects tree scan (shared scandir listings with cached stat results)
 # ---------------------------------------------------------------------------
 
-def extract_messages(path, role="both", no_tools=False, limit=0, thinking_limit=0):
-    """
-    Yield dicts with keys: role, timestamp, text.
+# Listings under CLAUDE_DIR are shared by every lookup in the process for this
+# many seconds, so one command lists each directory and stats each file once.
+SCAN_MAX_AGE = 2.0
 
-    Args:
-        role: "user", "assistant", or "both".
-        no_tools: If True, omit tool_use summaries from assistant messages.
-        limit: Max messages to yield (0 = unlimited).
-        thinking_limit: Max chars for thinking blocks (0 = full, -1 = hide).
+_SCAN_CACHE = {}
+
+
+class TreeScan:
     """
-    count = 0
+    Memoized os.scandir() listings of the CLAUDE_DIR tree.
 
-    for rec in iter_records(path, types={"user", "assistant"}, skip_noise=True, limit=0):
-        if limit and count >= limit:
-            return
+    Each directory is listed at most once, on first use, into files and
+    subdirectories kept as os.DirEntry objects; a DirEntry caches its stat()
+    result after the first call. Stats of paths whose directory was never
+    listed are memoized too, so asking for one file does not list a project.
+    """
 
-        if role != "both" and rec.type != role:
-            continue
+    __slots__ = ("root", "taken", "_listings", "_stats")
+
+    def __init__(self, root):
+        import time
+
+        self.root = str(root)
+        self.taken = time.monotonic()
+        self._listings = {}
+        self._stats = {}
+
+    def covers(self, path):
+        path = str(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def listing(self, directory):
+        """({name: DirEntry} of files, {name: DirEntry} of subdirs) in `directory`."""
+        key = str(directory)
+        listed = self._listings.get(key)
+        if listed is None:
+            listed = self._listings[key] = _scan_dir(key)
+        return listed
+
+    def projects(self):
+        """Project directory Paths, in directory order."""
+        return [Path(entry.path) for entry in self.listing(self.root)[1].values()]
+
+    def subagents(self, session_path):
+        """Subagent DirEntries of a session file, listing <id>/subagents only if <id>/ exists."""
+        parent, name = os.path.split(str(session_path))
+        sid = session_file_id(name)
+        if sid not in self.listing(parent)[1]:
+            return []
+        files = self.listing(os.path.join(parent, sid, "subagents"))[0]
+        return _session_entries(files, "agent-")
+
+    def stat(self, path):
+        """os.stat() of `path`; raises OSError like os.stat()."""
+        import errno
+
+        path = str(path)
+        parent, name = os.path.split(path)
+        listed = self._listings.get(parent)
+        if listed is not None:
+            entry = listed[0].get(name) or listed[1].get(name)
+            if entry is None:
+                raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+            return entry.stat()
+        st = self._stats.get(path)
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                st = e
+            self._stats[path] = st
+        if isinstance(st, OSError):
+            raise st
+        return st
+
+    def is_dir(self, path):
+        """True if `path` is a directory, answered from its parent's listing when taken."""
+        import stat
+
+        parent, name = os.path.split(str(path))
+        listed = self._listings.get(parent)
+        if listed is not None:
+            return name in listed[1]
+        try:
+            return stat.S_ISDIR(self.stat(path).st_mode)
+        except OSError:
+            return False
 
-        if rec.type == "user":
-            if rec.is_meta_user() or rec.is_compact_summary():
-                continue
-            if rec.is_tool_result_message():
-                continue
 
-            text = rec.text_content()
-            if not text or text.startswith("<system-reminder>") or text.startswith("[Request interrupted"):
-                continue
+def _scan_dir(directory):
+    """One os.scandir() pass: ({name: DirEntry} files, {name: DirEntry} dirs)."""
+    files = {}
+    dirs = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    files[entry.name] = entry
+                elif entry.is_dir():
+                    dirs[entry.name] = entry
+    except OSError:
+        pass
+    return files, dirs
 
-            yield {"role": "USER", "timestamp": rec.timestamp, "text": text}
-            count += 1
 
-        elif rec.type == "assistant":
-            if rec.is_synthetic():
-                continue
+def scan_projects(max_age=SCAN_MAX_AGE):
+    """
+    The shared TreeScan of CLAUDE_DIR, reused while younger than `max_age`
+    seconds. max_age=0 starts a fresh scan (e.g. before detecting changes).
+    """
+    import time
 
-            content = rec.content
-            if not isinstance(content, list):
-                continue
+    key = str(CLAUDE_DIR)
+    scan = _SCAN_CACHE.get(key)
+    if scan is None or time.monotonic() - scan.taken >= max_age:
+        _SCAN_CACHE.clear()
+        scan = _SCAN_CACHE[key] = TreeScan(CLAUDE_DIR)
+    return scan
 
-            parts = []
-            for block in content:
-                if not isinstance(block, dict):
-                    continue
-                btype = block.get("type", "")
 
-                if btype == "text":
-                    t = block.get("text", "").strip()
-                    if t:
-                        parts.append(t)
+def invalidate_scan():
+    """Forget the shared TreeScan; call after changing files under CLAUDE_DIR."""
+    _SCAN_CACHE.clear()
 
-                elif btype == "thinking" and thinking_limit != -1:
-                    t = block.get("thinking", "").strip()
-                    if t:
-                        if thinking_limit > 0:
-                            t = t[:thinking_limit]
-                        parts.append("[THINKING] " + t)
 
-                elif btype == "tool_use" and not no_tools:
-                    name = block.get("name", "?")
-                    inp = block.get("input", {})
-                    if not isinstance(inp, dict):
-                        inp = {}
-                    key = _tool_key(name, inp)
-                    if key:
-                        parts.append("[TOOL: {}] {}".format(name, key))
-                    else:
-                        parts.append("[TOOL: {}]".format(name))
+def _listing(directory):
+    """(files, dirs) of `directory`, from the shared scan when it is under CLAUDE_DIR."""
+    scan = scan_projects()
+    if scan.covers(directory):
+        return scan.listing(directory)
+    return _scan_dir(str(directory))
 
-            if not parts:
-                continue
 
-            yield {"role": "ASSISTANT", "timestamp": rec.timestamp, "text": "\n".join(parts)}
-            count += 1
+def _scan_stat(path):
+    """os.stat() of `path`, from the shared scan when it is under CLAUDE_DIR."""
+    scan = scan_projects()
+    if scan.covers(path):
+        return scan.stat(path)
+    return os.stat(str(path))
 
 
-def _tool_key(name, inp):
-    """Extract the most informative field from a tool_use input."""
-    if name in ("Read", "Write", "Edit", "MultiEdit"):
-        return inp.get("file_path", "")
-    elif name == "Bash":
-        return inp.get("command", "")[:80]
-    elif name in ("Grep", "Glob"):
-        return inp.get("pattern", "")
-    elif name == "Task":
-        return inp.get("description", "")
-    elif name == "WebSearch":
-        return inp.get("query", "")
-    elif name == "WebFetch":
-        return inp.get("url", "")
-    return ""
+def _scan_exists(path):
+    try:
+        _scan_stat(path)
+    except OSError:
+        return False
+    return True
 
 
 # ---------------------------------------------------------------------------
-# Tool extraction
+# Cache storage (versioned JSON files, atomic writes, advisory locks)
 # ---------------------------------------------------------------------------
 
-def extract_tools(path, tool_filter="", errors_only=False, limit=0):
+# A process that finds a cache being rebuilt waits this long for the
+# rebuild before doing the work itself.
+CACHE_LOCK_TIMEOUT = 10.0
+CACHE_LOCK_SUFFIX = ".lock"
+
+
+def read_cache(path, version):
+    """The dict written by write_cache() at `path`, or None if missing, unreadable or another version."""
+    try:
+        with open(str(path), encoding="utf-8") as f:
+            data = json.load(f)
+    except (ValueError, OSError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != version:
+        return None
+    return data
+
+
+def write_cache(path, data, version):
     """
-    Yield tool call dicts: {timestamp, name, status, key_input, result_preview}.
+    Replace the JSON cache at `path` with `data` under a "version" header.
 
-    Two-pass: first collect all tool_use and tool_result, then join by ID.
+    The file is written to a temp file in the same directory and renamed
+    over `path`, so concurrent readers see the old or the new cache, never
+    a partial one. Returns False if it could not be written (non-fatal).
     """
-    tool_calls = {}
-    tool_order = []
-    tool_results = {}
+    payload = {"version": version}
+    payload.update(data)
+    return _replace_file(path, lambda f: json.dump(payload, f, ensure_ascii=False))
 
-    for rec in iter_records(path, types={"user", "assistant"}, skip_noise=True, limit=0):
-        ts = rec.timestamp[:19] if rec.timestamp else ""
-        content = rec.content
 
-        if rec.type == "assistant" and isinstance(content, list):
-            for block in content:
-                if not isinstance(block, dict) or block.get("type") != "tool_use":
-                    continue
-                tid = block.get("id", "")
-                name = block.get("name", "")
-                inp = block.get("input", {})
-                if not isinstance(inp, dict):
-                    inp = {}
+_NEW_FILE_MODE = []
 
-                if tool_filter and name != tool_filter:
-                    continue
-
-                key = _tool_key(name, inp)
-                tool_calls[tid] = (ts, name, key)
-                tool_order.append(tid)
 
-        elif rec.type == "user" and isinstance(content, list):
-            for block in content:
-                if not isinstance(block, dict) or block.get("type") != "tool_result":
-                    continue
-                tid = block.get("tool_use_id", "")
-                is_error = block.get("is_error", False)
-                rc = block.get("content", "")
-                if isinstance(rc, list):
-                    preview = " ".join(
-                        b.get("text", "")[:100]
-                        for b in rc if isinstance(b, dict)
-                    )
-                elif isinstance(rc, str):
-                    preview = rc[:150].replace("\n", " ").replace("\t", " ")
-                else:
-                    preview = ""
-                tool_results[tid] = ("error" if is_error else "ok", preview)
+def _new_file_mode():
+    """
+    Mode open() would give a new file under the process umask (mkstemp uses
+    0600). Read once: os.umask() can only be read by setting it, which is
+    not safe while other threads create files.
+    """
+    if not _NEW_FILE_MODE:
+        umask = os.umask(0o022)
+        os.umask(umask)
+        _NEW_FILE_MODE.append(0o666 & ~umask)
+    return _NEW_FILE_MODE[0]
 
-    count = 0
-    for tid in tool_order:
-        if tid not in tool_calls:
-            continue
-        ts, name, key = tool_calls[tid]
-        status, preview = tool_results.get(tid, ("ok", "(no result captured)"))
 
-        if errors_only and status != "error":
-            continue
-        if limit and count >= limit:
-            return
+def _replace_file(path, write):
+    """
+    Atomically replace `path` with what write(f) puts in a text temp file; False on failure.
 
-        yield {
-            "timestamp": ts,
-            "name": name,
-            "status": status,
-            "key_input": key,
-            "result_preview": preview,
-        }
-        count += 1
+    The result gets the mode of a plainly created file, so caches inside a
+    shared session tree stay readable by its other users.
+    """
+    import tempfile
 
+    path = str(path)
+    try:
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(path) or ".")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            write(f)
+            if hasattr(os, "fchmod"):
+                os.fchmod(f.fileno(), _new_file_mode())
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+    return True
 
-# ---------------------------------------------------------------------------
-# Files changed (reverse-read for last snapshot)
-# ---------------------------------------------------------------------------
 
-def extract_files_changed(path, with_versions=False):
+class CacheLock:
     """
-    Return list of files edited in the session from the last file-history-snapshot.
+    Advisory exclusive lock (flock) on <cache path>.lock, held while a cache
+    is rebuilt so that concurrent processes do not all rebuild it.
 
-    Uses reverse read to find the last snapshot efficiently.
-    Returns list of (filepath,) or (filepath, version_count) tuples.
+    Used as a context manager; `held` says whether the lock was obtained.
+    wait=0 makes a single attempt, so a caller holding a stale copy can use
+    it instead of waiting. Where flock is unavailable, or the lock file
+    cannot be created, the lock is always granted: writes stay atomic.
     """
-    last_snapshot = None
 
-    # Read file in reverse to find the last snapshot quickly
-    try:
-        size = os.path.getsize(path)
-    except OSError:
-        return []
+    __slots__ = ("path", "wait", "held", "_fd")
 
-    if size < 50_000_000:  # < 50MB: just iterate forward, it's fast enough
-        with open(path, encoding="utf-8", errors="replace") as f:
-            for line in f:
-                if '"file-history-snapshot"' in line:
-                    last_snapshot = line
-    else:
-        # Large file: read from the end in chunks
-        last_snapshot = _reverse_find(path, '"file-history-snapshot"')
+    def __init__(self, path, wait=CACHE_LOCK_TIMEOUT):
+        self.path = str(path) + CACHE_LOCK_SUFFIX
+        self.wait = wait
+        self.held = False
+        self._fd = None
 
-    if not last_snapshot:
-        return []
+    def __enter__(self):
+        import time
+        try:
+            import fcntl
+        except ImportError:
+            self.held = True
+            return self
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            self.held = True
+            return self
+        deadline = time.monotonic() + self.wait
+        while True:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.held = True
+                return self
+            except OSError:
+                if time.monotonic() >= deadline:
+                    return self
+                time.sleep(0.05)
 
-    try:
-        rec = json.loads(last_snapshot.strip())
-    except (json.JSONDecodeError, ValueError):
-        return []
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            os.close(self._fd)  # Closing releases the flock
+            self._fd = None
+        self.held = False
+        return False
 
-    backups = rec.get("snapshot", {}).get("trackedFileBackups", {})
-    if not isinstance(backups, dict):
-        return []
 
-    result = []
-    for filepath in sorted(backups.keys()):
-        info = backups[filepath]
-        if with_versions:
-            ver = info.get("version", 1) if isinstance(info, dict) else 1
-            result.append((filepath, ver))
-        else:
-            result.append((filepath,))
-    return result
+# ---------------------------------------------------------------------------
+# Bounded line reading (giant single-line records)
+# ---------------------------------------------------------------------------
 
+# Lines longer than this (bytes, or characters for text-mode files) are never
+# held whole: they are decoded incrementally into a bounded copy instead.
+MAX_LINE_BYTES = 4_194_304
 
-def _reverse_find(path, needle, chunk_size=1_048_576):
-    """Find the last line containing needle by reading from end of file."""
-    with open(path, "rb") as f:
-        f.seek(0, 2)
-        file_size = f.tell()
-        pos = file_size
-        remainder = b""
-        last_match = None
+# In the bounded copy of an oversized line, strings keep this many characters
+# and containers this many items; the rest is parsed and dropped.
+LARGE_STRING_PREVIEW = 2048
+LARGE_CONTAINER_ITEMS = 10_000
 
-        while pos > 0:
-            read_size = min(chunk_size, pos)
-            pos -= read_size
-            f.seek(pos)
-            chunk = f.read(read_size) + remainder
-            lines = chunk.split(b"\n")
-            remainder = lines[0]  # May be partial line
+_BOUNDED_CHUNK = 65_536
 
-            for line in reversed(lines[1:]):
-                try:
-                    decoded = line.decode("utf-8", errors="replace")
-                except Exception:
-                    continue
-                if needle in decoded:
-                    return decoded
 
-        # Check remainder (first line of file)
-        if remainder:
-            try:
-                decoded = remainder.decode("utf-8", errors="replace")
-                if needle in decoded:
-                    return decoded
-            except Exception:
-                pass
+def bounded_lines(f, max_line_bytes=None, sizes=False):
+    """
+    Iterate the lines of a text or binary file object with bounded memory.
+
+    Lines up to `max_line_bytes` (default MAX_LINE_BYTES; 0 = no limit) are
+    yielded unchanged. A longer line, typically a multi-MB tool_result or
+    file snapshot, is read in 64KB pieces by _BoundedDecoder and replaced by
+    its compact JSON re-encoding with long strings cut to
+    LARGE_STRING_PREVIEW characters, so routing fields (type, uuid,
+    timestamp, tool ids) survive while the payload does not. It keeps the
+    original's trailing newline, or lack of one for a partially written last
+    line; an oversized line that is not valid JSON comes back empty.
+
+    With sizes=True, yields (length, line) where length is the original
+    line's length in the file's units, so callers can keep exact offsets.
+    """
+    if max_line_bytes is None:
+        max_line_bytes = MAX_LINE_BYTES
+    if not max_line_bytes:
+        for line in f:
+            yield (len(line), line) if sizes else line
+        return
 
-    return None
+    binary = isinstance(f.read(0), bytes)
+    newline = b"\n" if binary else "\n"
+    readline = f.readline
+    while True:
+        line = readline(max_line_bytes)
+        if not line:
+            return
+        if len(line) == max_line_bytes and not line.endswith(newline):
+            decoder = _BoundedDecoder(readline, line, binary)
+            line = decoder.decode()
+            if binary:
+                line = line.encode("utf-8", errors="replace")
+            length = decoder.length
+        else:
+            length = len(line)
+        yield (length, line) if sizes else line
+
+
+class _BoundedDecoder:
+    """
+    Incremental JSON decoder for one oversized line (see bounded_lines()).
+
+    Reads the rest of the line with readline(_BOUNDED_CHUNK), so it never
+    consumes past the newline, and holds one chunk plus the bounded value.
+    `length` is the original line's length once decode() returns.
+    """
+
+    __slots__ = ("readline", "decoder", "buf", "pos", "length", "complete")
+
+    _WS = " \t\r\n"
+    _DELIMS = ",]}: \t\r\n"
+
+    def __init__(self, readline, first, binary):
+        import codecs
+        self.readline = readline
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace") if binary else None
+        self.buf = ""
+        self.pos = 0
+        self.length = 0
+        self.complete = False
+        self._feed(first)
+
+    def _feed(self, piece):
+        self.length += len(piece)
+        self.complete = piece.endswith(b"\n" if self.decoder else "\n")
+        self.buf = self.decoder.decode(piece, final=self.complete) if self.decoder else piece
+        self.pos = 0
+
+    def _more(self):
+        """Load the next non-empty piece of the line; False at end of line or file."""
+        while not self.complete:
+            piece = self.readline(_BOUNDED_CHUNK)
+            if not piece:
+                return False
+            self._feed(piece)
+            if self.buf:
+                return True
+        return False
+
+    def _peek(self):
+        while self.pos >= len(self.buf):
+            if not self._more():
+                raise ValueError("unexpected end of line")
+        return self.buf[self.pos]
+
+    def _skip_ws(self):
+        while self._peek() in self._WS:
+            self.pos += 1
+        return self.buf[self.pos]
+
+    def decode(self):
+        """Bounded compact JSON for the line (newline-terminated if complete), or ""."""
+        try:
+            value = self._value(True)
+            while self.pos < len(self.buf) or self._more():
+                if self.buf[self.pos] not in self._WS:
+                    raise ValueError("trailing data")
+                self.pos += 1
+            text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        except (ValueError, RecursionError):
+            text = ""
+        # Drain whatever is left of a malformed line
+        while self._more():
+            pass
+        return text + "\n" if self.complete else text
+
+    def _value(self, keep):
+        c = self._skip_ws()
+        if c == '"':
+            self.pos += 1
+            return self._string(LARGE_STRING_PREVIEW if keep else 0)
+        if c == "{":
+            self.pos += 1
+            return self._object(keep)
+        if c == "[":
+            self.pos += 1
+            return self._array(keep)
+        # Number or literal: short, so read it a character at a time
+        token = ""
+        while (self.pos < len(self.buf) or self._more()) and len(token) < 64:
+            c = self.buf[self.pos]
+            if c in self._DELIMS:
+                break
+            token += c
+            self.pos += 1
+        return json.loads(token)
+
+    def _object(self, keep):
+        obj = {}
+        if self._skip_ws() == "}":
+            self.pos += 1
+            return obj
+        while True:
+            if self._skip_ws() != '"':
+                raise ValueError("expected key")
+            self.pos += 1
+            key = self._string(LARGE_STRING_PREVIEW)
+            if self._skip_ws() != ":":
+                raise ValueError("expected ':'")
+            self.pos += 1
+            value = self._value(keep and len(obj) < LARGE_CONTAINER_ITEMS)
+            if keep and len(obj) < LARGE_CONTAINER_ITEMS:
+                obj[key] = value
+            c = self._skip_ws()
+            self.pos += 1
+            if c == "}":
+                return obj
+            if c != ",":
+                raise ValueError("expected ',' or '}'")
+
+    def _array(self, keep):
+        arr = []
+        if self._skip_ws() == "]":
+            self.pos += 1
+            return arr
+        while True:
+            value = self._value(keep and len(arr) < LARGE_CONTAINER_ITEMS)
+            if keep and len(arr) < LARGE_CONTAINER_ITEMS:
+                arr.append(value)
+            c = self._skip_ws()
+            self.pos += 1
+            if c == "]":
+                return arr
+            if c != ",":
+                raise ValueError("expected ',' or ']'")
+
+    def _string(self, cap):
+        """Rest of a string after its opening quote, cut to `cap` characters."""
+        limit = cap * 12 + 12  # Raw characters that can decode to `cap` (an escaped pair is 12)
+        raw = []
+        kept = 0
+        total = 0
+        slashes = 0  # Backslashes ending the previous chunk
+        while True:
+            if self.pos >= len(self.buf) and not self._more():
+                raise ValueError("unterminated string")
+            buf, start = self.buf, self.pos
+            q = buf.find('"', start)
+            end = q if q >= 0 else len(buf)
+            # An odd run of backslashes before the quote escapes it
+            j = end
+            while j > start and buf[j - 1] == "\\":
+                j -= 1
+            run = end - j + (slashes if j == start else 0)
+            if kept < limit:
+                piece = buf[start:min(end + 1, start + limit - kept)]
+                raw.append(piece)
+                kept += len(piece)
+            total += end - start + 1
+            self.pos = end + 1
+            if q < 0:
+                slashes = run
+                self.pos = end
+                total -= 1
+                continue
+            if run % 2 == 0:
+                break
+            slashes = 0
+        raw = "".join(raw)
+        if kept == total:
+            raw = raw[:-1]  # The closing quote
+        # A cut can split an escape; drop partial escape characters until it decodes
+        for trim in range(13):
+            try:
+                text = json.loads('"' + raw[:len(raw) - trim] + '"')
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError("bad string")
+        if kept < total or len(text) > cap:
+            # Counting decoded characters would mean decoding all of it
+            text = text[:cap] + "... [truncated from {} chars of JSON]".format(total - 1)
+        return text
 
 
 # ---------------------------------------------------------------------------
-# Memory file parsing
+# Core iterator
 # ---------------------------------------------------------------------------
 
-def parse_frontmatter(text):
+class ScanBudget:
     """
-    Parse simple key: value frontmatter from a markdown string.
+    Wall-clock and byte budget shared by the scans of one call.
 
-    Handles ONLY the subset used by Claude Code memory files:
-    - Block delimited by --- on its own line (first line must be ---)
-    - Key-value pairs: "key: value" (one per line, value is everything after first ": ")
-    - No nested structures, no lists, no multi-line values
+    Scans check ok() before each line (or file) and stop early once the
+    deadline passes or `max_bytes` have been read, setting `exhausted`.
+    Single-file scans also record `resume`, the byte offset of the first
+    unprocessed line, which can be passed back as `offset=` to continue.
+    Zero means no limit.
+    """
 
-    Returns: (dict, body_string)
-    If no valid frontmatter: (empty dict, full text)
+    __slots__ = ("seconds", "max_bytes", "started", "bytes_read", "exhausted", "resume")
+
+    def __init__(self, seconds=0, max_bytes=0):
+        import time
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.started = time.monotonic()
+        self.bytes_read = 0
+        self.exhausted = False
+        self.resume = None
+
+    def ok(self):
+        """True while there is budget left; marks the budget exhausted otherwise."""
+        import time
+        if not self.exhausted:
+            if self.max_bytes and self.bytes_read >= self.max_bytes:
+                self.exhausted = True
+            elif self.seconds and time.monotonic() - self.started >= self.seconds:
+                self.exhausted = True
+        return not self.exhausted
+
+    def marker(self):
+        """One-line truncation marker for script output."""
+        import time
+        msg = "# TRUNCATED: scan budget exhausted after {} bytes, {:.1f}s".format(
+            self.bytes_read, time.monotonic() - self.started)
+        if self.resume is not None:
+            return msg + "; resume with --resume {}".format(self.resume)
+        return msg + "; rerun to continue (completed work is cached)"
+
+
+def iter_records(path, types=None, skip_noise=True, limit=0,
+                 follow=False, poll=1.0, idle_timeout=0, offset=0, budget=None,
+                 max_line_bytes=None, dedup=None):
     """
-    lines = text.split("\n")
-    if not lines or lines[0].strip() != "---":
-        return {}, text
+    Yield Record objects from a .jsonl file (or its .jsonl.gz/.xz archive).
 
-    end_idx = -1
-    for i in range(1, len(lines)):
-        if lines[i].strip() == "---":
-            end_idx = i
-            break
+    Args:
+        path: Path to the .jsonl file.
+        types: Optional set/list of record types to include.
+        skip_noise: Skip progress/queue-operation records.
+        limit: Stop after this many yielded records (0 = unlimited).
+        follow: Keep polling for appended records (see SessionTail).
+        poll: Seconds between polls when following.
+        idle_timeout: Stop following after this many idle seconds (0 = never).
+        offset: Start at this byte offset (a line boundary, e.g. budget.resume).
+        budget: Optional ScanBudget; when it runs out iteration stops and
+            budget.resume holds the offset to continue from.
+        max_line_bytes: Lines longer than this are decoded with bounded
+            memory and long strings truncated (see bounded_lines()).
+        dedup: Optional UuidRegistry; only records first seen in this file
+            are yielded. The prefix a resumed session repeats is skipped by
+            byte offset without being read (when following, only the prefix).
+    """
+    skip = ()
+    if dedup is not None:
+        start, skip = dedup.first_seen(path)
+        offset = max(offset, start)
+
+    if follow:
+        lines = SessionTail(path, offset=offset, poll=poll, idle_timeout=idle_timeout)
+        for rec in _parse_records(lines, types, skip_noise, limit):
+            yield rec
+        return
 
-    if end_idx < 0:
-        return {}, text
+    if budget is None and not offset and not skip:
+        with open_session(path) as f:
+            lines = bounded_lines(f, max_line_bytes)
+            for rec in _parse_records(lines, types, skip_noise, limit):
+                yield rec
+        return
 
-    fm = {}
-    for line in lines[1:end_idx]:
+    with open_session(path, offset=offset, binary=True) as f:
+        lines = _budgeted_lines(bounded_lines(f, max_line_bytes, sizes=True), offset,
+                                budget, skip)
+        for rec in _parse_records(lines, types, skip_noise, limit):
+            yield rec
+
+
+def _budgeted_lines(sized_lines, offset, budget, skip=()):
+    """
+    Decode (length, bytes) lines, charging and checking `budget` per line
+    and dropping lines that start at an offset in `skip`.
+    """
+    for n, raw in sized_lines:
+        if budget is not None:
+            if not budget.ok():
+                budget.resume = offset
+                return
+            budget.bytes_read += n
+        offset += n
+        if skip and offset - n in skip:
+            continue
+        yield raw.decode("utf-8", errors="replace")
+
+
+def _parse_records(lines, types, skip_noise, limit):
+    """Filter and parse raw lines into Records for iter_records()."""
+    type_filter = set(types) if types else None
+    count = 0
+
+    for line in lines:
         line = line.strip()
         if not line:
             continue
-        sep = line.find(": ")
-        if sep > 0:
-            key = line[:sep].strip()
-            value = line[sep + 2:].strip()
-            fm[key] = value
 
-    body = "\n".join(lines[end_idx + 1:])
-    return fm, body
+        # Pre-filter: skip noise by string match before json.loads
+        if skip_noise:
+            if any(ns in line for ns in _NOISE_STRINGS):
+                continue
 
+        # Pre-filter: skip types we don't want (cheap string check)
+        if type_filter and '"file-history-snapshot"' in line and "file-history-snapshot" not in type_filter:
+            continue
 
-class Memory:
-    """A parsed memory file."""
+        try:
+            d = json.loads(line)
+        except (json.JSONDecodeError, ValueError):
+            continue
 
-    __slots__ = ("path", "name", "description", "type", "content",
-                 "project", "project_dir", "mtime", "size")
+        rtype = d.get("type", "")
+        if skip_noise and rtype in NOISE_TYPES:
+            continue
+        if type_filter and rtype not in type_filter:
+            continue
 
-    def __init__(self, **kwargs):
-        for k in self.__slots__:
-            setattr(self, k, kwargs.get(k))
+        yield Record(d)
+        count += 1
+        if limit and count >= limit:
+            return
 
 
-def iter_memories(memory_dir):
-    """
-    Yield Memory objects from a memory/ directory (or a directory containing
-    .md memory files).
+# ---------------------------------------------------------------------------
+# Multi-file read-ahead (overlapped opens and reads)
+# ---------------------------------------------------------------------------
 
-    Layout 1 (index + files): MEMORY.md is index, individual .md files have
-    frontmatter. Yields individual files, skips MEMORY.md and archive/.
-    Layout 2 (standalone): only MEMORY.md exists (no other .md files outside
-    archive/). Yields single Memory with type=unknown.
+# Files opened and read ahead of the one being consumed. On a local disk 0
+# (sequential reads) is as fast; on a network-mounted home, where each open
+# costs a round trip, 8-16 keeps the link busy.
+ITER_MANY_CONCURRENCY = 8
+
+# Lines are handed over in batches of about this many bytes, and at most
+# _ITER_MANY_QUEUE batches are buffered per file.
+_ITER_MANY_BATCH_BYTES = 262_144
+_ITER_MANY_QUEUE = 4
+
+
+def iter_many(paths, types=None, skip_noise=True, concurrency=ITER_MANY_CONCURRENCY):
     """
-    memory_dir = str(memory_dir)
+    Yield (path, Record) from many session files, overlapping their I/O.
 
-    # Collect .md files excluding MEMORY.md and archive/
-    md_files = []
-    for entry in sorted(os.listdir(memory_dir)):
-        full = os.path.join(memory_dir, entry)
-        if not os.path.isfile(full):
-            continue
-        if not entry.endswith(".md"):
-            continue
-        if entry == "MEMORY.md":
+    Records come file by file in the order of `paths` and in file order
+    within each, filtered as by iter_records(). Meanwhile up to
+    `concurrency` following files are opened and read ahead in a thread
+    pool (see _iter_many_lines()). Unreadable files yield nothing.
+    """
+    for path, lines in _iter_many_lines(paths, concurrency):
+        if lines is None:
             continue
-        md_files.append(full)
+        decoded = (raw.decode("utf-8", errors="replace") for _n, raw in lines)
+        for rec in _parse_records(decoded, types, skip_noise, 0):
+            yield path, rec
 
-    if md_files:
-        # Layout 1: index + individual files
-        for fpath in md_files:
-            try:
-                with open(fpath, encoding="utf-8") as f:
-                    text = f.read()
-                stat = os.stat(fpath)
-            except OSError:
+
+def _iter_many_lines(sources, concurrency=ITER_MANY_CONCURRENCY):
+    """
+    Yield (path, lines) per source in order, reading ahead of the consumer.
+
+    `sources` holds paths or (path, offset) pairs. `lines` iterates the
+    file's (length, bytes) lines from the offset, as bounded_lines(f,
+    sizes=True) would, or is None if the file cannot be opened; it must be
+    consumed (as far as wanted) before the next item is requested.
+
+    An asyncio event loop drives one reader coroutine per file: each opens
+    its file and reads batches of lines through run_in_executor() into a
+    bounded queue. Readers run for the current file and the `concurrency`
+    - 1 after it, so opens and reads of later files overlap the consumer's
+    work on earlier ones. The loop only runs while the consumer waits for
+    its next batch; blocking I/O proceeds in the pool meanwhile.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    sources = [(str(s[0]), s[1]) if isinstance(s, tuple) else (str(s), 0) for s in sources]
+    if not sources:
+        return
+    concurrency = max(1, concurrency)
+    loop = asyncio.new_event_loop()
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    readers = []
+
+    async def start(path, offset):
+        queue = asyncio.Queue(_ITER_MANY_QUEUE)
+        state = {"stop": False}
+        task = asyncio.ensure_future(_read_ahead(path, offset, queue, pool, state))
+        return queue, state, task
+
+    def batches(queue, first):
+        batch = first
+        while batch is not None:
+            for line in batch:
+                yield line
+            batch = loop.run_until_complete(queue.get())
+
+    try:
+        for i, (path, _offset) in enumerate(sources):
+            while len(readers) < min(len(sources), i + concurrency):
+                readers.append(loop.run_until_complete(start(*sources[len(readers)])))
+            queue, state, _task = readers[i]
+            first = loop.run_until_complete(queue.get())
+            if isinstance(first, Exception):
+                yield path, None
                 continue
-            fm, body = parse_frontmatter(text)
-            yield Memory(
-                path=fpath,
-                name=fm.get("name"),
-                description=fm.get("description"),
-                type=fm.get("type", "unknown"),
-                content=body,
-                project=os.path.basename(os.path.dirname(memory_dir))
-                    if os.path.basename(memory_dir) == "memory"
-                    else os.path.basename(memory_dir),
-                project_dir=os.path.dirname(memory_dir)
-                    if os.path.basename(memory_dir) == "memory"
-                    else memory_dir,
-                mtime=stat.st_mtime,
-                size=stat.st_size,
-            )
-    else:
-        # Layout 2: standalone MEMORY.md (or empty)
-        mem_path = os.path.join(memory_dir, "MEMORY.md")
-        if not os.path.isfile(mem_path):
-            return
-        try:
-            with open(mem_path, encoding="utf-8") as f:
-                text = f.read()
-            stat = os.stat(mem_path)
-        except OSError:
-            return
-        # Skip if effectively empty (just a heading)
-        body = text.strip()
-        lines = body.split("\n")
-        content_lines = [l for l in lines if not l.startswith("# ")]
-        content = "\n".join(content_lines).strip()
-        if not content:
-            return
+            yield path, batches(queue, first)
+            state["stop"] = True  # Whatever the consumer left unread
+    finally:
+        loop.run_until_complete(_stop_readers(readers))
+        pool.shutdown()
+        loop.close()
+
+
+async def _read_ahead(path, offset, queue, pool, state):
+    """Reader coroutine for _iter_many_lines(): batches of lines, then None."""
+    import asyncio
+    import functools
+
+    loop = asyncio.get_event_loop()
+    try:
+        f = await loop.run_in_executor(
+            pool, functools.partial(open_session, path, offset=offset, binary=True))
+    except (OSError, EOFError) as e:
+        await queue.put(e)
+        return
+    try:
+        lines = bounded_lines(f, sizes=True)
+        while not state["stop"]:
+            try:
+                batch = await loop.run_in_executor(pool, _take_lines, lines)
+            except (OSError, EOFError, ValueError):
+                break
+            if not batch:
+                break
+            await queue.put(batch)
+    finally:
+        await loop.run_in_executor(pool, f.close)
+        await queue.put(None)
+
+
+def _take_lines(lines):
+    batch = []
+    size = 0
+    for n, raw in lines:
+        batch.append((n, raw))
+        size += n
+        if size >= _ITER_MANY_BATCH_BYTES:
+            break
+    return batch
+
+
+async def _stop_readers(readers):
+    """Stop every reader, discarding what it buffered, and wait for it to close its file."""
+    import asyncio
+
+    for _queue, state, _task in readers:
+        state["stop"] = True
+    for queue, _state, task in readers:
+        while not task.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait([task], timeout=0.01)
+
+
+# ---------------------------------------------------------------------------
+# Schema detection
+# ---------------------------------------------------------------------------
+
+def detect_schema(path):
+    """
+    Probe a .jsonl file and return a schema report dict.
+
+    Returns dict with keys: file, lines, bytes, first_timestamp, last_timestamp,
+    versions, models, unknown_types, record_types (type -> {count, fields}).
+    """
+    type_counts = Counter()
+    field_sets = {}
+    versions = set()
+    models = set()
+    first_ts = ""
+    last_ts = ""
+    total_bytes = 0
+    line_count = 0
+    unknown_types = set()
+
+    with open_session(path) as f:
+        for n, line in bounded_lines(f, sizes=True):
+            line_count += 1
+            total_bytes += n
+            line = line.strip()
+            if not line:
+                continue
+
+            if '"type"' not in line:
+                continue
+
+            try:
+                rec = json.loads(line)
+            except (json.JSONDecodeError, ValueError):
+                continue
+
+            rtype = rec.get("type", "")
+            type_counts[rtype] += 1
+
+            if rtype not in KNOWN_TYPES:
+                unknown_types.add(rtype)
+
+            if rtype not in field_sets:
+                field_sets[rtype] = set()
+            if type_counts[rtype] <= 5:
+                field_sets[rtype].update(rec.keys())
+
+            v = rec.get("version", "")
+            if v:
+                versions.add(v)
+
+            msg = rec.get("message", {})
+            if isinstance(msg, dict):
+                m = msg.get("model", "")
+                if m and m != "<synthetic>":
+                    models.add(m)
+
+            ts = rec.get("timestamp", "")
+            if ts:
+                if not first_ts or ts < first_ts:
+                    first_ts = ts
+                if ts > last_ts:
+                    last_ts = ts
+
+    return {
+        "file": str(path),
+        "lines": line_count,
+        "bytes": total_bytes,
+        "first_timestamp": first_ts,
+        "last_timestamp": last_ts,
+        "versions": sorted(versions),
+        "models": sorted(models),
+        "unknown_types": sorted(unknown_types),
+        "record_types": {
+            rtype: {
+                "count": count,
+                "fields": sorted(field_sets.get(rtype, set())),
+            }
+            for rtype, count in type_counts.most_common()
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# Session statistics (single-pass)
+# ---------------------------------------------------------------------------
+
+def session_stats(path, follow=False, poll=1.0, idle_timeout=0, dedup=None, digest=True):
+    """
+    Compute session statistics in a single pass.
+
+    Returns a dict with: slug, model, branch, started, ended, user_messages,
+    assistant_messages, tool_calls, files_edited, errors, input_tokens,
+    output_tokens, cache_read_tokens, cache_create_tokens, total_tokens,
+    compactions, summary.
+
+    With follow=True, returns a generator instead that yields an updated
+    copy of the dict each time new lines are appended (see SessionTail);
+    only the new lines are parsed.
+
+    dedup: Optional UuidRegistry; count only records first seen in this file,
+    so a resumed session's totals exclude the history it repeats.
+
+    digest: Take the stats from the session's digest header when a fresh
+    digest exists (see session_digest()).
+    """
+    if follow:
+        return _follow_session_stats(path, poll, idle_timeout)
+    if dedup is not None:
+        return _first_seen_stats((path,) + dedup.first_seen(path))
+    if digest:
+        cached = session_digest(path)
+        if cached is not None:
+            return dict(cached.stats)
+    stats = _new_stats()
+    with open_session(path) as f:
+        _update_stats(stats, bounded_lines(f))
+    stats["total_tokens"] = stats["input_tokens"] + stats["output_tokens"]
+    return stats
+
+
+def _first_seen_stats(job):
+    """session_stats() over (path, start, skip) from UuidRegistry.first_seen()."""
+    path, start, skip = job
+    stats = _new_stats()
+    with open_session(path, offset=start, binary=True) as f:
+        _update_stats(stats, _budgeted_lines(bounded_lines(f, sizes=True), start, None, skip))
+    stats["total_tokens"] = stats["input_tokens"] + stats["output_tokens"]
+    return stats
+
+
+def _follow_session_stats(path, poll, idle_timeout):
+    stats = _new_stats()
+    tail = SessionTail(path, poll=poll, idle_timeout=idle_timeout)
+    restarts = 0
+    for lines in tail.batches():
+        if tail.restarts != restarts:
+            restarts = tail.restarts
+            stats = _new_stats()  # Rewritten: these lines are the whole file again
+        _update_stats(stats, lines)
+        stats["total_tokens"] = stats["input_tokens"] + stats["output_tokens"]
+        yield dict(stats)
+
+
+def _new_stats():
+    return {
+        "slug": "", "model": "", "branch": "",
+        "started": "", "ended": "",
+        "user_messages": 0, "assistant_messages": 0,
+        "tool_calls": 0, "files_edited": 0, "errors": 0,
+        "input_tokens": 0, "output_tokens": 0,
+        "cache_read_tokens": 0, "cache_create_tokens": 0,
+        "compactions": 0, "summary": "",
+    }
+
+
+def _update_stats(stats, lines):
+    """Fold raw .jsonl lines into a session_stats() dict in place."""
+    for line in lines:
+        _fold_stats_line(stats, line)
+
+
+def _fold_stats_line(stats, line):
+    """Fold one raw line into `stats`; returns its decoded dict (None if blank or invalid)."""
+    line = line.strip()
+    if not line:
+        return None
+
+    # Count errors by string match BEFORE parsing (cheap)
+    if '"is_error": true' in line or '"is_error":true' in line:
+        stats["errors"] += 1
+
+    try:
+        d = json.loads(line)
+    except (json.JSONDecodeError, ValueError):
+        return None
+    if not isinstance(d, dict):
+        return None
+
+    rtype = d.get("type", "")
+    ts = d.get("timestamp", "")
+
+    if ts:
+        if not stats["started"] or ts < stats["started"]:
+            stats["started"] = ts
+        if ts > stats["ended"]:
+            stats["ended"] = ts
+
+    if not stats["branch"]:
+        stats["branch"] = d.get("gitBranch", "")
+    if not stats["slug"]:
+        stats["slug"] = d.get("slug", "")
+
+    if rtype == "user":
+        msg = d.get("message", {})
+        if not isinstance(msg, dict):
+            return d
+        if d.get("isMeta") or d.get("isCompactSummary"):
+            return d
+        content = msg.get("content", "")
+        if isinstance(content, list):
+            has_tr = any(
+                isinstance(b, dict) and b.get("type") == "tool_result"
+                for b in content
+            )
+            if has_tr:
+                return d
+            has_text = any(
+                isinstance(b, dict) and b.get("type") == "text"
+                for b in content
+            )
+            if has_text:
+                stats["user_messages"] += 1
+        elif isinstance(content, str) and content.strip():
+            stats["user_messages"] += 1
+
+    elif rtype == "assistant":
+        msg = d.get("message", {})
+        if not isinstance(msg, dict):
+            return d
+        m = msg.get("model", "")
+        if m == "<synthetic>":
+            return d
+        stats["assistant_messages"] += 1
+        if not stats["model"] and m:
+            stats["model"] = m
+
+        usage = msg.get("usage", {})
+        if isinstance(usage, dict):
+            stats["input_tokens"] += usage.get("input_tokens", 0)
+            stats["output_tokens"] += usage.get("output_tokens", 0)
+            stats["cache_read_tokens"] += usage.get("cache_read_input_tokens", 0)
+            stats["cache_create_tokens"] += usage.get("cache_creation_input_tokens", 0)
+
+        content = msg.get("content", [])
+        if isinstance(content, list):
+            for block in content:
+                if isinstance(block, dict) and block.get("type") == "tool_use":
+                    stats["tool_calls"] += 1
+
+    elif rtype == "summary":
+        stats["summary"] = d.get("summary", "")
+
+    elif rtype == "file-history-snapshot":
+        backups = d.get("snapshot", {}).get("trackedFileBackups", {})
+        fc = len(backups) if isinstance(backups, dict) else 0
+        if fc > stats["files_edited"]:
+            stats["files_edited"] = fc
+
+    elif rtype == "system":
+        st = d.get("subtype", "")
+        if st in ("compact_boundary", "microcompact_boundary"):
+            stats["compactions"] += 1
+    return d
+
+
+# ---------------------------------------------------------------------------
+# Message extraction
+# ---------------------------------------------------------------------------
+
+def extract_messages(path, role="both", no_tools=False, limit=0, thinking_limit=0,
+                     offset=0, budget=None, dedup=None, digest=True):
+    """
+    Yield dicts with keys: role, timestamp, text.
+
+    Args:
+        role: "user", "assistant", or "both".
+        no_tools: If True, omit tool_use summaries from assistant messages.
+        limit: Max messages to yield (0 = unlimited).
+        thinking_limit: Max chars for thinking blocks (0 = full, -1 = hide).
+        offset, budget, dedup: Resume point, ScanBudget and UuidRegistry, as
+            for iter_records().
+        digest: With thinking hidden and no offset, budget or dedup, serve
+            from the session's digest (see session_digest()).
+    """
+    if digest and thinking_limit == -1 and not offset and budget is None and dedup is None:
+        cached = session_digest(path)
+        if cached is not None:
+            for msg in cached.messages(role, no_tools, limit):
+                yield msg
+            return
+
+    count = 0
+
+    for rec in iter_records(path, types={"user", "assistant"}, skip_noise=True, limit=0,
+                            offset=offset, budget=budget, dedup=dedup):
+        if limit and count >= limit:
+            return
+
+        if role != "both" and rec.type != role:
+            continue
+
+        if rec.type == "user":
+            text = _user_message_text(rec)
+            if not text:
+                continue
+
+            yield {"role": "USER", "timestamp": rec.timestamp, "text": text}
+            count += 1
+
+        elif rec.type == "assistant":
+            text = _assistant_message_text(rec, no_tools, thinking_limit)
+            if not text:
+                continue
+
+            yield {"role": "ASSISTANT", "timestamp": rec.timestamp, "text": text}
+            count += 1
+
+
+def _user_message_text(rec):
+    """Text of a human-typed user record; "" for meta, tool results and reminders."""
+    if rec.is_meta_user() or rec.is_compact_summary() or rec.is_tool_result_message():
+        return ""
+    text = rec.text_content()
+    if not text or text.startswith("<system-reminder>") or text.startswith("[Request interrupted"):
+        return ""
+    return text
+
+
+def _assistant_message_text(rec, no_tools=False, thinking_limit=0):
+    """Text, thinking and tool summaries of an assistant record joined by newlines."""
+    return _join_message_parts(_assistant_message_parts(rec, thinking_limit), no_tools)
+
+
+def _assistant_message_parts(rec, thinking_limit=0):
+    """
+    Pieces of an assistant record in order: text and thinking as strings,
+    tool_use summaries as [name, key] lists (see _join_message_parts()).
+    """
+    if rec.is_synthetic():
+        return []
+    content = rec.content
+    if not isinstance(content, list):
+        return []
+
+    parts = []
+    for block in content:
+        if not isinstance(block, dict):
+            continue
+        btype = block.get("type", "")
+
+        if btype == "text":
+            t = block.get("text", "").strip()
+            if t:
+                parts.append(t)
+
+        elif btype == "thinking" and thinking_limit != -1:
+            t = block.get("thinking", "").strip()
+            if t:
+                if thinking_limit > 0:
+                    t = t[:thinking_limit]
+                parts.append("[THINKING] " + t)
+
+        elif btype == "tool_use":
+            name = block.get("name", "?")
+            inp = block.get("input", {})
+            if not isinstance(inp, dict):
+                inp = {}
+            parts.append([name, _tool_key(name, inp)])
+
+    return parts
+
+
+def _join_message_parts(parts, no_tools=False):
+    out = []
+    for part in parts:
+        if isinstance(part, str):
+            out.append(part)
+        elif not no_tools:
+            name, key = part
+            out.append("[TOOL: {}] {}".format(name, key) if key else "[TOOL: {}]".format(name))
+    return "\n".join(out)
+
+
+def _tool_key(name, inp):
+    """Extract the most informative field from a tool_use input."""
+    if name in ("Read", "Write", "Edit", "MultiEdit"):
+        return inp.get("file_path", "")
+    elif name == "Bash":
+        return inp.get("command", "")[:80]
+    elif name in ("Grep", "Glob"):
+        return inp.get("pattern", "")
+    elif name == "Task":
+        return inp.get("description", "")
+    elif name == "WebSearch":
+        return inp.get("query", "")
+    elif name == "WebFetch":
+        return inp.get("url", "")
+    return ""
+
+
+# ---------------------------------------------------------------------------
+# Tool extraction
+# ---------------------------------------------------------------------------
+
+def extract_tools(path, tool_filter="", errors_only=False, limit=0,
+                  follow=False, poll=1.0, idle_timeout=0, offset=0, budget=None,
+                  dedup=None, digest=True, full_results=False):
+    """
+    Yield tool call dicts: {timestamp, name, status, key_input, result_preview},
+    plus the whole result text as "result" when full_results is set.
+
+    Two-pass: first collect all tool_use and tool_result, then join by ID.
+    With follow=True (see SessionTail), each call is instead yielded as soon
+    as its result arrives, in result order, and calls still awaiting a
+    result are held back. With a budget (see iter_records), the join covers
+    only the records read before it ran out. With dedup (a UuidRegistry),
+    only calls first seen in this file are joined. Otherwise the calls come
+    from the session's digest when `digest` is set (see session_digest()).
+    """
+    if digest and not follow and not offset and budget is None and dedup is None:
+        cached = session_digest(path)
+        if cached is not None:
+            calls = cached.tools(tool_filter, errors_only, limit, full_results)
+            if full_results:
+                # Evicted result blobs: read the transcript instead
+                calls = list(calls)
+                if any(call["result"] is None for call in calls):
+                    calls = None
+            if calls is not None:
+                for call in calls:
+                    yield call
+                return
+
+    tool_calls = {}
+    tool_order = []
+    tool_results = {}
+    count = 0
+
+    records = iter_records(path, types={"user", "assistant"}, skip_noise=True,
+                           follow=follow, poll=poll, idle_timeout=idle_timeout,
+                           offset=offset, budget=budget, dedup=dedup)
+    for rec in records:
+        ts = rec.timestamp[:19] if rec.timestamp else ""
+        content = rec.content
+
+        if rec.type == "assistant" and isinstance(content, list):
+            for block in content:
+                if not isinstance(block, dict) or block.get("type") != "tool_use":
+                    continue
+                tid = block.get("id", "")
+                name = block.get("name", "")
+                inp = block.get("input", {})
+                if not isinstance(inp, dict):
+                    inp = {}
+
+                if tool_filter and name != tool_filter:
+                    continue
+
+                key = _tool_key(name, inp)
+                tool_calls[tid] = (ts, name, key)
+                if not follow:
+                    tool_order.append(tid)
+
+        elif rec.type == "user" and isinstance(content, list):
+            for block in content:
+                if not isinstance(block, dict) or block.get("type") != "tool_result":
+                    continue
+                tid = block.get("tool_use_id", "")
+                is_error = block.get("is_error", False)
+                rc = block.get("content", "")
+                preview = _result_preview(rc)
+                full = _result_text(rc) if full_results else None
+                status = "error" if is_error else "ok"
+                if not follow:
+                    tool_results[tid] = (status, preview, full)
+                    continue
+
+                call = tool_calls.pop(tid, None)
+                if call is None or (errors_only and status != "error"):
+                    continue
+                out = {
+                    "timestamp": call[0],
+                    "name": call[1],
+                    "status": status,
+                    "key_input": call[2],
+                    "result_preview": preview,
+                }
+                if full_results:
+                    out["result"] = full
+                yield out
+                count += 1
+                if limit and count >= limit:
+                    return
+
+    for tid in tool_order:
+        if tid not in tool_calls:
+            continue
+        ts, name, key = tool_calls[tid]
+        status, preview, full = tool_results.get(
+            tid, ("ok", "(no result captured)", "(no result captured)"))
+
+        if errors_only and status != "error":
+            continue
+        if limit and count >= limit:
+            return
+
+        out = {
+            "timestamp": ts,
+            "name": name,
+            "status": status,
+            "key_input": key,
+            "result_preview": preview,
+        }
+        if full_results:
+            out["result"] = full
+        yield out
+        count += 1
+
+
+def _result_text(rc):
+    """Whole text of a tool_result content (string or list of blocks)."""
+    if isinstance(rc, list):
+        return "\n".join(b.get("text", "") for b in rc
+                         if isinstance(b, dict) and b.get("text"))
+    if isinstance(rc, str):
+        return rc
+    return ""
+
+
+def _result_preview(rc):
+    """One-line preview of a tool_result content (string or list of blocks)."""
+    if isinstance(rc, list):
+        return " ".join(b.get("text", "")[:100] for b in rc if isinstance(b, dict))
+    if isinstance(rc, str):
+        return rc[:150].replace("\n", " ").replace("\t", " ")
+    return ""
+
+
+# ---------------------------------------------------------------------------
+# Files changed (reverse-read for last snapshot)
+# ---------------------------------------------------------------------------
+
+def extract_files_changed(path, with_versions=False, digest=True):
+    """
+    Return list of files edited in the session from the last file-history-snapshot.
+
+    Uses reverse read to find the last snapshot efficiently, or the
+    session's digest when `digest` is set and a fresh one exists (see
+    session_digest()).
+    Returns list of (filepath,) or (filepath, version_count) tuples.
+    """
+    if digest:
+        cached = session_digest(path)
+        if cached is not None:
+            return cached.files(with_versions)
+
+    last_snapshot = None
+
+    # Read file in reverse to find the last snapshot quickly
+    path = resolve_session_path(path)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return []
+
+    if size < 50_000_000 and _archive_codec(path) is None:
+        # < 50MB: just iterate forward, it's fast enough
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in bounded_lines(f):
+                if '"file-history-snapshot"' in line:
+                    last_snapshot = line
+    else:
+        # Large file or archive: read from the end in chunks/blocks
+        last_snapshot = _reverse_find(path, '"file-history-snapshot"')
+
+    if not last_snapshot:
+        return []
+
+    try:
+        rec = json.loads(last_snapshot.strip())
+    except (json.JSONDecodeError, ValueError):
+        return []
+
+    backups = rec.get("snapshot", {}).get("trackedFileBackups", {})
+    if not isinstance(backups, dict):
+        return []
+
+    result = []
+    for filepath in sorted(backups.keys()):
+        info = backups[filepath]
+        if with_versions:
+            ver = info.get("version", 1) if isinstance(info, dict) else 1
+            result.append((filepath, ver))
+        else:
+            result.append((filepath,))
+    return result
+
+
+def extract_file_timeline(path, digest=True):
+    """
+    Yield per-file version transitions from every file-history-snapshot.
+
+    One forward pass; lines without the "file-history-snapshot" bytes are
+    skipped before any decoding. A transition is emitted whenever a file's
+    version differs from the one in the previous snapshot, as a dict with
+    file, version, previous (0 when first tracked), timestamp (the backup
+    time, else the snapshot's) and message_id (the triggering message).
+    With `digest`, the snapshots come from the session's digest instead
+    (see session_digest()).
+    """
+    snapshots = None
+    if digest:
+        cached = session_digest(path)
+        if cached is not None:
+            snapshots = cached.snapshots()
+    if snapshots is None:
+        snapshots = _iter_snapshots(path)
+    versions = {}
+    for message_id, snap_ts, backups in snapshots:
+        for change in _snapshot_changes(versions, backups, message_id, snap_ts):
+            yield change
+
+
+def _iter_snapshots(path):
+    """(message_id, timestamp, trackedFileBackups) of each snapshot in `path`."""
+    try:
+        f = open_session(path, binary=True)
+    except (OSError, EOFError):
+        return
+    with f:
+        for raw in bounded_lines(f):
+            if b'"file-history-snapshot"' not in raw:
+                continue
+            try:
+                rec = json.loads(raw.decode("utf-8", errors="replace"))
+            except ValueError:
+                continue
+            if not isinstance(rec, dict) or rec.get("type") != "file-history-snapshot":
+                continue
+            snapshot = rec.get("snapshot")
+            if not isinstance(snapshot, dict):
+                continue
+            backups = snapshot.get("trackedFileBackups")
+            if not isinstance(backups, dict):
+                continue
+            yield (rec.get("messageId") or snapshot.get("messageId") or "",
+                   snapshot.get("timestamp") or rec.get("timestamp") or "",
+                   backups)
+
+
+def _snapshot_changes(versions, backups, message_id, snap_ts):
+    """Version transitions of one snapshot against `versions`, which is updated."""
+    changes = []
+    for filepath, info in backups.items():
+        if not isinstance(info, dict):
+            info = {}
+        ver = info.get("version", 1)
+        prev = versions.get(filepath, 0)
+        if ver == prev:
+            continue
+        versions[filepath] = ver
+        changes.append({
+            "file": filepath,
+            "version": ver,
+            "previous": prev,
+            "timestamp": info.get("backupTime") or snap_ts,
+            "message_id": message_id,
+        })
+    changes.sort(key=lambda c: (str(c["timestamp"]), c["file"]))
+    return changes
+
+
+def _reverse_find(path, needle, chunk_size=1_048_576):
+    """Find the last line containing needle by reading from end of file."""
+    path = resolve_session_path(path)
+    if _archive_codec(path) is not None:
+        return _reverse_find_archive(path, needle)
+
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        pos = file_size
+        remainder = b""
+        last_match = None
+
+        while pos > 0:
+            read_size = min(chunk_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            chunk = f.read(read_size) + remainder
+            lines = chunk.split(b"\n")
+            remainder = lines[0]  # May be partial line
+
+            for line in reversed(lines[1:]):
+                try:
+                    decoded = line.decode("utf-8", errors="replace")
+                except Exception:
+                    continue
+                if needle in decoded:
+                    return decoded
+
+        # Check remainder (first line of file)
+        if remainder:
+            try:
+                decoded = remainder.decode("utf-8", errors="replace")
+                if needle in decoded:
+                    return decoded
+            except Exception:
+                pass
+
+    return None
+
+
+def _reverse_find_archive(path, needle):
+    """_reverse_find() for archives: decompress blocks last-to-first."""
+    needle = needle.encode("utf-8")
+    if load_block_index(path) is None:
+        # No index: one forward pass over the decompressed stream
+        last = None
+        with open_session(path, binary=True) as f:
+            for line in f:
+                if needle in line:
+                    last = line
+        return last.decode("utf-8", errors="replace") if last is not None else None
+
+    # Blocks hold whole lines, so each can be searched on its own
+    for block in iter_archive_blocks_reversed(path):
+        for line in reversed(block.split(b"\n")):
+            if needle in line:
+                return line.decode("utf-8", errors="replace")
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Blob store (content-addressed payloads shared by a project's caches)
+# ---------------------------------------------------------------------------
+
+BLOB_DB_FILE = ".echo-sleuth-blobs.sqlite"
+
+# Compressed bytes kept per project; beyond this the least recently stored
+# blobs are evicted, unreferenced ones first.
+BLOB_STORE_MAX_BYTES = 64 * 1_048_576
+
+# New blobs are written in transactions of about this many raw bytes.
+_BLOB_BATCH_BYTES = 4_194_304
+
+_BLOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored INTEGER NOT NULL,
+    refs INTEGER NOT NULL DEFAULT 0,
+    used REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS refs (
+    owner TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (owner, hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_hash ON refs (hash);
+CREATE INDEX IF NOT EXISTS blobs_used ON blobs (used);
+"""
+
+
+def blob_hash(data):
+    """Content address of `data` (bytes): a 40-hex-digit BLAKE2b digest."""
+    import hashlib
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class BlobStore:
+    """
+    Content-addressed, reference-counted store for large repeated payloads.
+
+    The same file is often Read dozens of times and the same command output
+    recurs across sessions; caches keep a hash instead of the payload, and
+    the payload is stored once, zlib-compressed. Each reference is an
+    (owner, hash) pair, e.g. a session digest and a tool result it holds:
+    release(owner) drops all of an owner's references before it is rebuilt.
+    evict() keeps the store within max_bytes, removing unreferenced blobs
+    first, then the least recently stored; get() returns None for a blob
+    that was evicted, and callers fall back to the transcript.
+
+    put() only hashes payloads already stored; new ones are buffered and
+    written in batches by flush(). Call commit() when done.
+    """
+
+    __slots__ = ("path", "max_bytes", "conn", "_pending", "_pending_bytes", "_refs", "_known")
+
+    def __init__(self, path, max_bytes=BLOB_STORE_MAX_BYTES):
+        import sqlite3
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(str(self.path), timeout=CACHE_LOCK_TIMEOUT)
+        self.conn.executescript(_BLOB_SCHEMA)
+        self._pending = {}
+        self._pending_bytes = 0
+        self._refs = set()
+        self._known = set()
+
+    def close(self):
+        self.conn.close()
+
+    def put(self, data, owner):
+        """Reference `data` (str or bytes) from `owner`, storing it if new. Returns its hash."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        h = blob_hash(data)
+        self._refs.add((owner, h))
+        if h not in self._known and h not in self._pending:
+            if self.conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (h,)).fetchone():
+                self._known.add(h)
+            else:
+                self._pending[h] = data
+                self._pending_bytes += len(data)
+        if self._pending_bytes >= _BLOB_BATCH_BYTES:
+            self.flush()
+        return h
+
+    def flush(self):
+        """Write buffered blobs and references in one transaction."""
+        import time
+        import zlib
+
+        now = time.time()
+        cur = self.conn.cursor()
+        for h, data in self._pending.items():
+            packed = zlib.compress(data)
+            cur.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, 0, ?, ?)",
+                        (h, len(data), len(packed), now, packed))
+        cur.executemany("UPDATE blobs SET used = ? WHERE hash = ?",
+                        [(now, h) for h in {h for _owner, h in self._refs}
+                         if h not in self._pending])
+        for ref in self._refs:
+            cur.execute("INSERT OR IGNORE INTO refs VALUES (?, ?)", ref)
+            if cur.rowcount > 0:
+                cur.execute("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", (ref[1],))
+        self.conn.commit()
+        self._known.update(self._pending)
+        self._pending = {}
+        self._pending_bytes = 0
+        self._refs = set()
+
+    def get(self, h):
+        """The payload bytes stored under hash `h`, or None if unknown or evicted."""
+        import zlib
+
+        data = self._pending.get(h)
+        if data is not None:
+            return data
+        row = self.conn.execute("SELECT data FROM blobs WHERE hash = ?", (h,)).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def release(self, owner):
+        """Drop every reference held by `owner`."""
+        self.flush()
+        cur = self.conn.cursor()
+        cur.execute("UPDATE blobs SET refs = refs - 1 WHERE hash IN "
+                    "(SELECT hash FROM refs WHERE owner = ?)", (owner,))
+        cur.execute("DELETE FROM refs WHERE owner = ?", (owner,))
+        self.conn.commit()
+
+    def evict(self):
+        """Delete blobs until the store fits max_bytes. Returns the number deleted."""
+        self.flush()
+        total = self.conn.execute("SELECT COALESCE(SUM(stored), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        victims = []
+        for h, stored in self.conn.execute(
+                "SELECT hash, stored FROM blobs ORDER BY refs > 0, used"):
+            victims.append((h,))
+            total -= stored
+            if total <= self.max_bytes:
+                break
+        cur = self.conn.cursor()
+        cur.executemany("DELETE FROM blobs WHERE hash = ?", victims)
+        cur.executemany("DELETE FROM refs WHERE hash = ?", victims)
+        self.conn.commit()
+        self._known.difference_update(h for (h,) in victims)
+        return len(victims)
+
+    def commit(self):
+        self.flush()
+
+    def stats(self):
+        """{blobs, referenced, raw_bytes, stored_bytes, refs} of the whole store."""
+        self.flush()
+        blobs, referenced, raw, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(refs > 0), 0), COALESCE(SUM(size), 0), "
+            "COALESCE(SUM(stored), 0) FROM blobs").fetchone()
+        refs = self.conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {"blobs": blobs, "referenced": referenced, "raw_bytes": raw,
+                "stored_bytes": stored, "refs": refs}
+
+
+def _session_project_dir(path):
+    """Project directory holding a session file, or a subagent transcript's session."""
+    parent = Path(os.path.abspath(str(path))).parent
+    if parent.name == "subagents":
+        parent = parent.parent.parent
+    return parent
+
+
+def project_blob_store(path):
+    """The BlobStore of the project holding session file `path`."""
+    return BlobStore(_session_project_dir(path) / BLOB_DB_FILE)
+
+
+# ---------------------------------------------------------------------------
+# Session digests (pre-extracted views beside the session)
+# ---------------------------------------------------------------------------
+
+DIGEST_DIR = ".echo-sleuth-digests"
+DIGEST_SUFFIX = ".digest"
+# Bump when the extraction logic changes, so that existing digests are rebuilt.
+DIGEST_VERSION = 2
+
+# Sessions smaller than this are cheaper to re-read than to digest.
+DIGEST_MIN_BYTES = 1_000_000
+
+_DIGEST_SECTIONS = ("messages", "tools", "files", "snapshots")
+
+
+class SessionDigest:
+    """
+    The derived views of one session, read from its digest file.
+
+    A digest is line-oriented: a JSON header (version, the session's
+    signature, its session_stats() and the byte range of each section),
+    then one JSON array per line: messages as [ROLE, timestamp, text or
+    parts], tool calls as [timestamp, name, status, key_input, preview,
+    result hash], files from the last snapshot as [path, version] and
+    snapshots as [message_id, timestamp, backups hash]. Each view reads
+    only its own section, so serving it costs a fraction of the digest.
+
+    Full tool results (when longer than the preview) and snapshot file
+    lists live in the project's BlobStore, so a file Read many times or a
+    snapshot repeated unchanged is stored once.
+    """
+
+    __slots__ = ("path", "stats")
+
+    def __init__(self, path, header):
+        self.path = Path(path)
+        self.stats = header["stats"]
+
+    def _rows(self, section):
+        # The header is re-read so that a digest replaced since loading is
+        # read with its own section offsets.
+        try:
+            f = open(str(self.path), "rb")
+        except OSError:
+            return
+        with f:
+            header = _digest_header(f.readline())
+            if header is None:
+                return
+            start, end = header["sections"][section]
+            f.seek(start, os.SEEK_CUR)
+            pos = start
+            for raw in f:
+                if pos >= end:
+                    return
+                pos += len(raw)
+                yield json.loads(raw.decode("utf-8"))
+
+    def messages(self, role="both", no_tools=False, limit=0):
+        """extract_messages() with thinking hidden, from the digest."""
+        count = 0
+        for msg_role, ts, body in self._rows("messages"):
+            if limit and count >= limit:
+                return
+            if role != "both" and msg_role.lower() != role:
+                continue
+            text = body if msg_role == "USER" else _join_message_parts(body, no_tools)
+            if not text:
+                continue
+            yield {"role": msg_role, "timestamp": ts, "text": text}
+            count += 1
+
+    def _blob_store(self):
+        return BlobStore(_session_project_dir(self.path.parent) / BLOB_DB_FILE)
+
+    def tools(self, tool_filter="", errors_only=False, limit=0, full_results=False):
+        """
+        extract_tools() from the digest. With full_results, "result" is None
+        for a result whose blob has been evicted.
+        """
+        store = self._blob_store() if full_results else None
+        count = 0
+        try:
+            for ts, name, status, key, preview, h in self._rows("tools"):
+                if tool_filter and name != tool_filter:
+                    continue
+                if errors_only and status != "error":
+                    continue
+                if limit and count >= limit:
+                    return
+                call = {
+                    "timestamp": ts,
+                    "name": name,
+                    "status": status,
+                    "key_input": key,
+                    "result_preview": preview,
+                }
+                if store is not None:
+                    data = store.get(h) if h else preview.encode("utf-8")
+                    call["result"] = data.decode("utf-8") if data is not None else None
+                yield call
+                count += 1
+        finally:
+            if store is not None:
+                store.close()
+
+    def snapshots(self):
+        """
+        [(message_id, timestamp, trackedFileBackups)] for every snapshot, or
+        None if a blob has been evicted. Identical file lists are decoded once.
+        """
+        store = self._blob_store()
+        decoded = {}
+        result = []
+        try:
+            for message_id, ts, h in self._rows("snapshots"):
+                if h not in decoded:
+                    data = store.get(h)
+                    if data is None:
+                        return None
+                    decoded[h] = json.loads(data.decode("utf-8"))
+                result.append((message_id, ts, decoded[h]))
+        finally:
+            store.close()
+        return result
+
+    def files(self, with_versions=False):
+        """extract_files_changed() from the digest."""
+        if with_versions:
+            return [(filepath, ver) for filepath, ver in self._rows("files")]
+        return [(filepath,) for filepath, _ver in self._rows("files")]
+
+
+def digest_path(path):
+    """<session dir>/.echo-sleuth-digests/<id>.digest, shared by a session and its archive."""
+    directory, name = os.path.split(os.path.abspath(str(path)))
+    return Path(directory) / DIGEST_DIR / (session_file_id(name) + DIGEST_SUFFIX)
+
+
+def _digest_header(line):
+    try:
+        header = json.loads(line.decode("utf-8"))
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or header.get("version") != DIGEST_VERSION:
+        return None
+    return header
+
+
+def load_digest(path, sig=None):
+    """The SessionDigest of session file `path` if it matches the session's signature, else None."""
+    if sig is None:
+        sig = session_signature(path)
+        if sig is None:
+            return None
+    target = digest_path(path)
+    try:
+        with open(str(target), "rb") as f:
+            header = _digest_header(f.readline())
+    except OSError:
+        return None
+    if header is None or header.get("sig") != sig:
+        return None
+    return SessionDigest(target, header)
+
+
+def session_digest(path):
+    """
+    A fresh SessionDigest for `path`, or None to read the .jsonl instead.
+
+    Only sessions of at least DIGEST_MIN_BYTES are digested. Reads never
+    build one: a full pass over a large session would cost far more than
+    the read it serves. A missing or stale digest (the session's mtime or
+    size changed) is rebuilt by build_digest(), which warm_caches() runs in
+    the background.
+    """
+    sig = session_signature(path)
+    if sig is None or sig[1] < DIGEST_MIN_BYTES:
+        return None
+    return load_digest(path, sig)
+
+
+def build_digest(path, sig=None):
+    """
+    Write the digest of session file `path` from one pass over it.
+
+    Returns the SessionDigest, or None if the session is unreadable, the
+    digest cannot be written, or another process is building it (the
+    caller then reads the .jsonl, as it would without a digest).
+    """
+    import sqlite3
+
+    if sig is None:
+        sig = session_signature(path)
+        if sig is None:
+            return None
+    target = digest_path(path)
+    try:
+        os.makedirs(str(target.parent), exist_ok=True)
+    except OSError:
+        return None
+    with CacheLock(target, wait=0) as lock:
+        if not lock.held:
+            return None
+        digest = load_digest(path, sig)
+        if digest is not None:
+            return digest
+        try:
+            store = project_blob_store(path)
+        except sqlite3.Error:
+            return None
+        try:
+            owner = str(target)
+            store.release(owner)
+            stats, sections = _digest_sections(path, store, owner)
+            store.evict()
+        except (OSError, EOFError, sqlite3.Error):
+            return None
+        finally:
+            store.close()
+        ranges = {}
+        pos = 0
+        for name in _DIGEST_SECTIONS:
+            size = sum(len(line) for line in sections[name])
+            ranges[name] = [pos, pos + size]
+            pos += size
+        header = {"version": DIGEST_VERSION, "sig": sig, "stats": stats, "sections": ranges}
+
+        def write(f):
+            f.write(json.dumps(header) + "\n")
+            for name in _DIGEST_SECTIONS:
+                f.writelines(sections[name])
+
+        if not _replace_file(target, write):
+            return None
+    return SessionDigest(target, header)
+
+
+def _digest_sections(path, store, owner):
+    """
+    (session_stats() dict, {section: [JSON lines]}) from one pass over `path`.
+
+    Each line is decoded once and feeds both the stats and the views; the
+    views apply the same pre-filters as iter_records(), so they match what
+    extract_messages() / extract_tools() yield from the .jsonl. Full tool
+    results and snapshot file lists go to `store`, referenced by `owner`.
+    Lines are ASCII-escaped JSON, so their lengths are byte offsets.
+    """
+    stats = _new_stats()
+    messages = []
+    snapshots = []
+    tool_calls = {}
+    tool_order = []
+    tool_results = {}
+    backups = None
+
+    with open_session(path) as f:
+        for line in bounded_lines(f):
+            d = _fold_stats_line(stats, line)
+            if d is None:
+                continue
+            rtype = d.get("type", "")
+            if rtype == "file-history-snapshot":
+                snapshot = d.get("snapshot")
+                backups = snapshot.get("trackedFileBackups") if isinstance(snapshot, dict) else None
+                if isinstance(backups, dict):
+                    snapshots.append(json.dumps([
+                        d.get("messageId") or snapshot.get("messageId") or "",
+                        snapshot.get("timestamp") or d.get("timestamp") or "",
+                        store.put(json.dumps(backups, sort_keys=True), owner),
+                    ]) + "\n")
+                continue
+            if rtype not in ("user", "assistant"):
+                continue
+            if any(ns in line for ns in _NOISE_STRINGS) or '"file-history-snapshot"' in line:
+                continue
+
+            rec = Record(d)
+            content = rec.content
+            if rtype == "user":
+                text = _user_message_text(rec)
+                if text:
+                    messages.append(json.dumps(["USER", rec.timestamp, text]) + "\n")
+                if not isinstance(content, list):
+                    continue
+                for block in content:
+                    if isinstance(block, dict) and block.get("type") == "tool_result":
+                        status = "error" if block.get("is_error", False) else "ok"
+                        rc = block.get("content", "")
+                        preview = _result_preview(rc)
+                        full = _result_text(rc)
+                        h = store.put(full, owner) if full != preview else ""
+                        tool_results[block.get("tool_use_id", "")] = (status, preview, h)
+            else:
+                parts = _assistant_message_parts(rec, thinking_limit=-1)
+                if parts:
+                    messages.append(json.dumps(["ASSISTANT", rec.timestamp, parts]) + "\n")
+                if not isinstance(content, list):
+                    continue
+                ts = rec.timestamp[:19] if rec.timestamp else ""
+                for block in content:
+                    if not isinstance(block, dict) or block.get("type") != "tool_use":
+                        continue
+                    tid = block.get("id", "")
+                    name = block.get("name", "")
+                    inp = block.get("input", {})
+                    if not isinstance(inp, dict):
+                        inp = {}
+                    tool_calls[tid] = (ts, name, _tool_key(name, inp))
+                    tool_order.append(tid)
+
+    stats["total_tokens"] = stats["input_tokens"] + stats["output_tokens"]
+    tools = []
+    for tid in tool_order:
+        ts, name, key = tool_calls[tid]
+        status, preview, h = tool_results.get(tid, ("ok", "(no result captured)", ""))
+        tools.append(json.dumps([ts, name, status, key, preview, h]) + "\n")
+    files = []
+    if isinstance(backups, dict):
+        for filepath in sorted(backups):
+            info = backups[filepath]
+            ver = info.get("version", 1) if isinstance(info, dict) else 1
+            files.append(json.dumps([filepath, ver]) + "\n")
+    return stats, {"messages": messages, "tools": tools, "files": files,
+                   "snapshots": snapshots}
+
+
+# ---------------------------------------------------------------------------
+# Memory file parsing
+# ---------------------------------------------------------------------------
+
+def parse_frontmatter(text):
+    """
+    Parse simple key: value frontmatter from a markdown string.
+
+    Handles ONLY the subset used by Claude Code memory files:
+    - Block delimited by --- on its own line (first line must be ---)
+    - Key-value pairs: "key: value" (one per line, value is everything after first ": ")
+    - No nested structures, no lists, no multi-line values
+
+    Returns: (dict, body_string)
+    If no valid frontmatter: (empty dict, full text)
+    """
+    lines = text.split("\n")
+    if not lines or lines[0].strip() != "---":
+        return {}, text
+
+    end_idx = -1
+    for i in range(1, len(lines)):
+        if lines[i].strip() == "---":
+            end_idx = i
+            break
+
+    if end_idx < 0:
+        return {}, text
+
+    fm = {}
+    for line in lines[1:end_idx]:
+        line = line.strip()
+        if not line:
+            continue
+        sep = line.find(": ")
+        if sep > 0:
+            key = line[:sep].strip()
+            value = line[sep + 2:].strip()
+            fm[key] = value
+
+    body = "\n".join(lines[end_idx + 1:])
+    return fm, body
+
+
+class Memory:
+    """A parsed memory file."""
+
+    __slots__ = ("path", "name", "description", "type", "content",
+                 "project", "project_dir", "mtime", "size")
+
+    def __init__(self, **kwargs):
+        for k in self.__slots__:
+            setattr(self, k, kwargs.get(k))
+
+
+def iter_memories(memory_dir):
+    """
+    Yield Memory objects from a memory/ directory (or a directory containing
+    .md memory files).
+
+    Layout 1 (index + files): MEMORY.md is index, individual .md files have
+    frontmatter. Yields individual files, skips MEMORY.md and archive/.
+    Layout 2 (standalone): only MEMORY.md exists (no other .md files outside
+    archive/). Yields single Memory with type=unknown.
+    """
+    memory_dir = str(memory_dir)
+
+    # Collect .md files excluding MEMORY.md and archive/
+    files, dirs = _listing(memory_dir)
+    if not files and not dirs and not os.path.isdir(memory_dir):
+        raise FileNotFoundError(memory_dir)
+    md_files = [files[name] for name in sorted(files)
+                if name.endswith(".md") and name != "MEMORY.md"]
+
+    if md_files:
+        # Layout 1: index + individual files
+        for entry in md_files:
+            fpath = entry.path
+            try:
+                with open(fpath, encoding="utf-8") as f:
+                    text = f.read()
+                stat = entry.stat()
+            except OSError:
+                continue
+            fm, body = parse_frontmatter(text)
+            yield Memory(
+                path=fpath,
+                name=fm.get("name"),
+                description=fm.get("description"),
+                type=fm.get("type", "unknown"),
+                content=body,
+                project=os.path.basename(os.path.dirname(memory_dir))
+                    if os.path.basename(memory_dir) == "memory"
+                    else os.path.basename(memory_dir),
+                project_dir=os.path.dirname(memory_dir)
+                    if os.path.basename(memory_dir) == "memory"
+                    else memory_dir,
+                mtime=stat.st_mtime,
+                size=stat.st_size,
+            )
+    else:
+        # Layout 2: standalone MEMORY.md (or empty)
+        entry = files.get("MEMORY.md")
+        if entry is None:
+            return
+        mem_path = entry.path
+        try:
+            with open(mem_path, encoding="utf-8") as f:
+                text = f.read()
+            stat = entry.stat()
+        except OSError:
+            return
+        # Skip if effectively empty (just a heading)
+        body = text.strip()
+        lines = body.split("\n")
+        content_lines = [l for l in lines if not l.startswith("# ")]
+        content = "\n".join(content_lines).strip()
+        if not content:
+            return
         project_name = (os.path.basename(os.path.dirname(memory_dir))
                         if os.path.basename(memory_dir) == "memory"
                         else os.path.basename(memory_dir))
@@ -814,492 +2758,3236 @@ def iter_memories(memory_dir):
 
 
 # ---------------------------------------------------------------------------
-# Staleness scoring and memory statistics
+# Staleness scoring and memory statistics
+# ---------------------------------------------------------------------------
+
+class StaleScore:
+    """Staleness assessment for a memory."""
+    __slots__ = ("score", "reasons", "action")
+    def __init__(self, **kwargs):
+        for k in self.__slots__:
+            setattr(self, k, kwargs.get(k))
+
+class MemoryStats:
+    """Aggregate stats for one project's memories."""
+    __slots__ = ("project", "file_count", "total_bytes",
+                 "estimated_tokens", "staleness_distribution")
+    def __init__(self, **kwargs):
+        for k in self.__slots__:
+            setattr(self, k, kwargs.get(k))
+
+_HALF_LIVES = {
+    "project": 14, "feedback": 90, "user": 180,
+    "reference": 60, "value": 365, "unknown": 30,
+}
+
+def staleness_score(memory):
+    """Compute type-based heuristic staleness score using exponential decay."""
+    import time
+    age_days = (time.time() - memory.mtime) / 86400.0
+    half_life = _HALF_LIVES.get(memory.type, 30)
+    score = int(100 * (1 - math.exp(-age_days * math.log(2) / half_life)))
+    score = max(0, min(100, score))
+    reasons = []
+    if age_days > half_life:
+        reasons.append("older than half-life (%d days for type=%s)" % (half_life, memory.type))
+    if age_days > half_life * 3:
+        reasons.append("significantly past expiry")
+    if score < 50:
+        action = "keep"
+    elif score < 75:
+        action = "review"
+    else:
+        action = "prune"
+    return StaleScore(score=score, reasons=reasons, action=action)
+
+def estimate_tokens(text):
+    """Rough token estimate: len(text) // 4."""
+    return len(text) // 4
+
+def all_memory_dirs():
+    """Scan ~/.claude/projects/ for directories containing memory/ subdirs.
+    Returns list of (encoded_project_name, memory_dir_path) tuples."""
+    scan = scan_projects()
+    result = []
+    for d in scan.projects():
+        if scan.is_dir(d / "memory"):
+            result.append((d.name, str(d / "memory")))
+    return result
+
+def memory_stats(memory_dir):
+    """Aggregate stats for one project's memories."""
+    mems = list(iter_memories(memory_dir))
+    total_bytes = sum(m.size for m in mems)
+    total_content = "".join(m.content for m in mems)
+    dist = {"fresh": 0, "aging": 0, "review": 0, "stale": 0}
+    for m in mems:
+        ss = staleness_score(m)
+        if ss.score < 25:
+            dist["fresh"] += 1
+        elif ss.score < 50:
+            dist["aging"] += 1
+        elif ss.score < 75:
+            dist["review"] += 1
+        else:
+            dist["stale"] += 1
+    project_name = (os.path.basename(os.path.dirname(memory_dir))
+                    if os.path.basename(memory_dir) == "memory"
+                    else os.path.basename(memory_dir))
+    return MemoryStats(
+        project=project_name, file_count=len(mems),
+        total_bytes=total_bytes,
+        estimated_tokens=estimate_tokens(total_content),
+        staleness_distribution=dist,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Batch claim verification (one snapshot per project root)
+# ---------------------------------------------------------------------------
+
+# Paths with a directory part and a file extension, e.g. src/app/main.ts
+_CLAIM_PATH = r"(?<![\w/.~-])((?:~|\.{1,2})?/?(?:[\w.@-]+/)+[\w@-][\w.@-]*\.[A-Za-z0-9]{1,8})(?![\w/])"
+# Backticked camelCase, PascalCase or snake_case identifiers, optionally called
+_CLAIM_IDENT = r"`((?:[A-Za-z_][\w]*\.)*([A-Za-z_]*(?:[a-z0-9][A-Z]|_[A-Za-z0-9])[\w]*))(?:\(\))?`"
+# Definition sites an identifier claim is verified against
+_CLAIM_DEFINITION = r"\b(?:def|class|function|const|let|var)\s+([A-Za-z_][\w]*)"
+
+# Snapshot limits: directories never walked, and files too big to tokenize
+_SNAPSHOT_SKIP_DIRS = frozenset((".git", "node_modules", "__pycache__", ".venv", "venv",
+                                 ".tox", "dist", "build", ".next", "target"))
+_SNAPSHOT_MAX_FILE_BYTES = 1_048_576
+
+# Deep-audit staleness modifiers, once per kind of missing claim
+_CLAIM_PENALTIES = {"path": 20, "identifier": 30}
+
+
+def extract_claims(text):
+    """
+    Verifiable (kind, value) claims in a memory body, in order of appearance.
+
+    Kinds are "path" (contains / and ends in a file extension; URLs are
+    ignored) and "identifier" (a backticked camelCase, PascalCase or
+    snake_case name; for dotted names the last part is checked).
+    """
+    import re
+
+    text = re.sub(r"\b[a-z][a-z0-9+.-]*://\S+", " ", text)
+    claims = []
+    for m in re.finditer(_CLAIM_PATH, text):
+        claims.append(("path", m.group(1)))
+    for m in re.finditer(_CLAIM_IDENT, text):
+        if "/" not in m.group(1):
+            claims.append(("identifier", m.group(2)))
+    return list(dict.fromkeys(claims))
+
+
+class ProjectSnapshot:
+    """
+    File paths and identifiers of one project root, answered in memory.
+
+    Files come from `git ls-files` (tracked plus untracked, not ignored) or,
+    outside git, from a directory walk that skips _SNAPSHOT_SKIP_DIRS. Only
+    the identifiers asked for are looked up, at their definition sites
+    (def, class, function, const, let or var before the name), in one pass
+    over the text files that stops once all are found.
+    """
+
+    __slots__ = ("root", "files", "suffixes", "identifiers")
+
+    def __init__(self, root, identifiers=()):
+        self.root = str(root)
+        self.files = _snapshot_files(self.root)
+        self.suffixes = set()
+        for rel in self.files:
+            parts = rel.split("/")
+            for i in range(len(parts)):
+                self.suffixes.add("/".join(parts[i:]))
+        self.identifiers = _snapshot_identifiers(self.root, self.files, set(identifiers))
+
+    def has_path(self, claim):
+        """True if `claim` names an existing file: absolute/home paths on disk, others by path suffix."""
+        if claim.startswith(("/", "~")):
+            return os.path.exists(os.path.expanduser(claim))
+        rel = claim
+        while rel.startswith(("./", "../")):
+            rel = rel.split("/", 1)[1]
+        return rel in self.suffixes
+
+    def has_identifier(self, name):
+        return name in self.identifiers
+
+
+def _snapshot_files(root):
+    """Relative, /-separated file paths of a project root."""
+    listed = _git(root, "ls-files", "-z", "--cached", "--others", "--exclude-standard")
+    if listed is not None:
+        return [p for p in dict.fromkeys(listed.split("\0")) if p]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in _SNAPSHOT_SKIP_DIRS]
+        rel = os.path.relpath(dirpath, root)
+        for name in filenames:
+            path = name if rel == "." else os.path.join(rel, name)
+            files.append(path.replace(os.sep, "/"))
+    return files
+
+
+def _snapshot_identifiers(root, files, wanted):
+    """The names in `wanted` defined in the project's text files (see _CLAIM_DEFINITION)."""
+    import re
+
+    found = set()
+    if not wanted:
+        return found
+    defined = re.compile(_CLAIM_DEFINITION)
+    for rel in files:
+        path = os.path.join(root, rel)
+        try:
+            if os.path.getsize(path) > _SNAPSHOT_MAX_FILE_BYTES:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b"\0" in data[:8192]:
+            continue
+        found.update(wanted.intersection(defined.findall(data.decode("utf-8", errors="replace"))))
+        if len(found) == len(wanted):
+            break
+    return found
+
+
+class ClaimReport:
+    """Verified and missing claims of one memory, with the deep-audit score."""
+
+    __slots__ = ("memory", "root", "verified", "missing", "score")
+
+    def __init__(self, **kwargs):
+        for k in self.__slots__:
+            setattr(self, k, kwargs.get(k))
+
+
+def verify_memories(memories):
+    """
+    ClaimReports for iter_memories() output, in input order.
+
+    Claims are extracted from every body first; then each project's root is
+    resolved once (resolve_project_root()) and one ProjectSnapshot answers
+    all of that project's checks. A memory whose root cannot be resolved
+    gets root=None and its claims left unchecked (verified and missing
+    empty). score is staleness_score() plus _CLAIM_PENALTIES for each kind
+    of missing claim, capped at 100.
+    """
+    memories = list(memories)
+    claims = [extract_claims(m.content or "") for m in memories]
+
+    wanted = {}
+    for m, found in zip(memories, claims):
+        names = wanted.setdefault(m.project_dir, set())
+        names.update(v for kind, v in found if kind == "identifier")
+    snapshots = {}
+    for project_dir, names in wanted.items():
+        root = resolve_project_root(project_dir) if project_dir else None
+        snapshots[project_dir] = ProjectSnapshot(root, names) if root else None
+
+    reports = []
+    for m, found in zip(memories, claims):
+        snap = snapshots[m.project_dir]
+        verified = []
+        missing = []
+        if snap is not None:
+            for kind, value in found:
+                ok = snap.has_path(value) if kind == "path" else snap.has_identifier(value)
+                (verified if ok else missing).append((kind, value))
+        score = staleness_score(m).score
+        score += sum(_CLAIM_PENALTIES[k] for k in {kind for kind, _ in missing})
+        reports.append(ClaimReport(memory=m, root=snap.root if snap else None,
+                                   verified=verified, missing=missing,
+                                   score=min(100, score)))
+    return reports
+
+
+# ---------------------------------------------------------------------------
+# Project directory resolution
+# ---------------------------------------------------------------------------
+
+def _encode_project_path(project_path):
+    """Encode an absolute path to Claude's directory format."""
+    # /Users/joker/github/myproject -> -Users-joker-github-myproject
+    normalized = project_path.replace("/", "-")
+    if normalized.startswith("-"):
+        return normalized
+    return "-" + normalized
+
+
+def find_project_dir(target):
+    """
+    Map a project path to its Claude session directory.
+
+    Returns the Path to the directory, or None if not found.
+    Uses exact encoded-path match first, then falls back to full-path matching.
+    """
+    scan = scan_projects()
+    projects = scan.projects()
+    if not projects:
+        return None
+    names = {d.name for d in projects}
+
+    # Exact match
+    encoded = _encode_project_path(target)
+    if encoded in names:
+        return CLAUDE_DIR / encoded
+
+    # Try without leading dash variations
+    stripped = target.rstrip("/")
+    encoded2 = _encode_project_path(stripped)
+    if encoded2 in names:
+        return CLAUDE_DIR / encoded2
+
+    # Full-path substring match: check sessions-index.json originalPath
+    for d in projects:
+        index_path = d / "sessions-index.json"
+        try:
+            scan.stat(index_path)
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            orig = data.get("originalPath", "")
+            if orig and (orig == target or orig == stripped):
+                return index_path.parent
+        except (json.JSONDecodeError, OSError):
+            continue
+
+    # Last resort: match the full encoded path (not just basename)
+    # This handles minor encoding differences
+    target_parts = stripped.strip("/").split("/")
+    best_match = None
+    best_score = 0
+
+    for d in projects:
+        dirname = d.name.lstrip("-")
+        dir_parts = dirname.split("-")
+
+        # Check if target_parts appear as a contiguous subsequence in dir_parts
+        if len(target_parts) <= len(dir_parts):
+            score = 0
+            for i in range(len(dir_parts) - len(target_parts) + 1):
+                match = all(
+                    target_parts[j] == dir_parts[i + j]
+                    for j in range(len(target_parts))
+                )
+                if match:
+                    score = len(target_parts)
+                    break
+            if score > best_score:
+                best_score = score
+                best_match = d
+
+    return best_match
+
+
+def resolve_project_root(project_dir):
+    """
+    Map a Claude encoded project directory back to its real filesystem path.
+    Returns: absolute path string, or None if unresolvable.
+    """
+    project_dir = Path(project_dir) if not isinstance(project_dir, Path) else project_dir
+    if not project_dir.is_dir():
+        return None
+
+    # Strategy 1: sessions-index.json
+    index_path = project_dir / "sessions-index.json"
+    if index_path.exists():
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            orig = data.get("originalPath", "")
+            if orig and os.path.isdir(orig):
+                return orig
+            entries = data.get("entries", [])
+            if isinstance(entries, list):
+                for s in entries:
+                    pp = s.get("projectPath", "")
+                    if pp and os.path.isdir(pp):
+                        return pp
+        except (json.JSONDecodeError, OSError, TypeError):
+            pass
+
+    # Strategy 2: best-effort decode
+    dirname = project_dir.name
+    if dirname.startswith("-"):
+        decoded = "/" + dirname[1:].replace("-", "/")
+        if os.path.isdir(decoded):
+            return decoded
+
+    return None
+
+
+def all_project_dirs():
+    """Yield all project directories under ~/.claude/projects/."""
+    for d in scan_projects().projects():
+        yield d
+
+
+# ---------------------------------------------------------------------------
+# Session listing (with fallback index building)
+# ---------------------------------------------------------------------------
+
+class SessionMeta:
+    """Lightweight session metadata."""
+
+    __slots__ = (
+        "session_id", "full_path", "created", "modified",
+        "message_count", "git_branch", "summary", "first_prompt",
+        "project_path",
+    )
+
+    def __init__(self, **kwargs):
+        for k in self.__slots__:
+            setattr(self, k, kwargs.get(k, ""))
+
+    def to_tsv(self):
+        fields = [
+            str(self.session_id),
+            str(self.created),
+            str(self.modified),
+            str(self.message_count),
+            str(self.git_branch),
+            _sanitize_tsv(str(self.summary), 80),
+            _sanitize_tsv(str(self.first_prompt), 100),
+            str(self.project_path),
+            str(self.full_path),
+        ]
+        return "\t".join(fields)
+
+
+def _sanitize_tsv(s, max_len=0):
+    """Clean a string for TSV output."""
+    s = s.replace("\t", " ").replace("\n", " ")
+    if max_len and len(s) > max_len:
+        s = s[: max_len - 3] + "..."
+    return s
+
+
+def load_index(index_path):
+    """Load sessions from a sessions-index.json file. Returns list of SessionMeta."""
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return []
+
+    entries = data.get("entries", [])
+    result = []
+    for e in entries:
+        result.append(SessionMeta(
+            session_id=e.get("sessionId", ""),
+            full_path=e.get("fullPath", ""),
+            created=e.get("created", ""),
+            modified=e.get("modified", ""),
+            message_count=e.get("messageCount", 0),
+            git_branch=e.get("gitBranch", ""),
+            summary=e.get("summary", ""),
+            first_prompt=e.get("firstPrompt", ""),
+            project_path=e.get("projectPath", ""),
+        ))
+    return result
+
+
+INDEX_CACHE_FILE = ".echo-sleuth-index.json"
+INDEX_CACHE_VERSION = 1
+PARTIAL_INDEX_FILE = ".echo-sleuth-index.partial.json"
+
+
+def build_fallback_index(project_dir, budget=None, concurrency=0):
+    """
+    Build index entries for a project directory that has no sessions-index.json.
+
+    Reads the first user message and last summary from each .jsonl file.
+    message_count counts every message in the file, like sessions-index.json,
+    so a resumed session includes the history it repeats (project_stats()
+    with dedup=True counts each record once).
+    Caches the result in .echo-sleuth-index.json within the project dir,
+    valid while the newest session mtime and the session count match.
+
+    Concurrent builds of one project are serialized by a CacheLock: a process
+    that finds another one rebuilding returns the stale cache when it has
+    one, or otherwise waits and reuses the result.
+
+    With a ScanBudget that runs out, the entries read so far are returned
+    and also saved to .echo-sleuth-index.partial.json, so the next build
+    only reads the session files that were not finished.
+
+    concurrency > 0 reads that many session files ahead (see iter_many()),
+    for high-latency storage such as network-mounted home directories.
+    """
+    project_dir = Path(project_dir)
+    cache_path = project_dir / INDEX_CACHE_FILE
+
+    # Check cache freshness
+    jsonl_files = iter_session_files(project_dir)
+    if not jsonl_files:
+        return []
+
+    sig = _fallback_index_signature(jsonl_files)
+    cached = read_cache(cache_path, INDEX_CACHE_VERSION)
+    stale = _cached_index_entries(cached)
+    if stale is not None and cached.get("sig") == sig:
+        return stale
+
+    with CacheLock(cache_path, wait=0 if stale is not None else CACHE_LOCK_TIMEOUT) as lock:
+        if not lock.held and stale is not None:
+            return stale  # Another process is rebuilding it
+        # A rebuild we waited for may already cover these files
+        cached = read_cache(cache_path, INDEX_CACHE_VERSION)
+        entries = _cached_index_entries(cached)
+        if entries is not None and cached.get("sig") == sig:
+            return entries
+        return _rebuild_fallback_index(project_dir, jsonl_files, sig, budget, concurrency)
+
+
+def _fallback_index_signature(files):
+    """
+    [newest mtime, count] of a project's session files (iter_session_files()),
+    the key a fallback index is valid for.
+
+    Files that vanish between listing and stat (deleted or archived by a
+    concurrent prune) are left out rather than failing the listing.
+    """
+    sigs = [sig for sig in (_file_signature(f, cached=True) for f in files) if sig is not None]
+    return [max((sig[0] for sig in sigs), default=0.0), len(sigs)]
+
+
+def _cached_index_entries(cached):
+    if cached is None:
+        return None
+    try:
+        return [SessionMeta(**e) for e in cached["entries"]]
+    except (KeyError, TypeError):
+        return None
+
+
+def _rebuild_fallback_index(project_dir, jsonl_files, sig, budget, concurrency=0):
+    cache_path = project_dir / INDEX_CACHE_FILE
+    partial_path = project_dir / PARTIAL_INDEX_FILE
+
+    # Entries finished by an earlier build that ran out of budget
+    finished = (read_cache(partial_path, INDEX_CACHE_VERSION) or {}).get("files", {})
+
+    # Build index from raw files
+    entries = []
+    done = {}
+    # Derive project_path from directory name
+    dir_name = project_dir.name
+    # Reverse the encoding: -Users-joker-github-myproject -> /Users/joker/github/myproject
+    # This is lossy (can't distinguish - that was / vs literal -), but best effort
+    project_path = "/" + dir_name.lstrip("-").replace("-", "/") if dir_name.startswith("-") else dir_name
+
+    # Skip subagent directories
+    jsonl_files = [p for p in jsonl_files if "subagents" not in str(p)]
+    sigs = [_file_signature(p, cached=True) for p in jsonl_files]
+    unread = [p for p, file_sig in zip(jsonl_files, sigs)
+              if (finished.get(p.name) or {}).get("sig") != file_sig]
+    ahead = _iter_many_lines(unread, concurrency) if concurrency > 0 and len(unread) > 1 else None
+
+    try:
+        for jsonl_path, file_sig in zip(jsonl_files, sigs):
+            prev = finished.get(jsonl_path.name)
+            if prev and prev.get("sig") == file_sig:
+                entry = SessionMeta(**prev["entry"])
+            else:
+                if budget is not None and not budget.ok():
+                    break
+                lines = None
+                if ahead is not None:
+                    _path, lines = next(ahead)
+                    if lines is None:
+                        continue
+                entry = _fallback_entry(jsonl_path, project_path, budget, lines)
+                if entry is None:
+                    if budget is not None and budget.exhausted:
+                        break
+                    continue
+            entries.append(entry)
+            done[jsonl_path.name] = {
+                "sig": file_sig, "entry": {k: getattr(entry, k) for k in SessionMeta.__slots__}}
+    finally:
+        if ahead is not None:
+            ahead.close()
+
+    if budget is not None and budget.exhausted:
+        write_cache(partial_path, {"files": done}, INDEX_CACHE_VERSION)
+        return entries
+
+    # Cache for next time; write failure is non-fatal
+    cache_data = [{k: getattr(e, k) for k in SessionMeta.__slots__} for e in entries]
+    if write_cache(cache_path, {"sig": sig, "entries": cache_data}, INDEX_CACHE_VERSION):
+        try:
+            partial_path.unlink()
+        except OSError:
+            pass
+
+    return entries
+
+
+class _TextLines:
+    """Context manager over a session's (length in bytes, text) lines: read-ahead lines decoded, else the file."""
+
+    __slots__ = ("path", "lines", "_f")
+
+    def __init__(self, path, lines=None):
+        self.path = path
+        self.lines = lines
+        self._f = None
+
+    def __enter__(self):
+        lines = self.lines
+        if lines is None:
+            self._f = open_session(self.path, binary=True)
+            lines = bounded_lines(self._f, sizes=True)
+        return ((n, raw.decode("utf-8", errors="replace")) for n, raw in lines)
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            self._f.close()
+        return False
+
+
+def _fallback_entry(jsonl_path, project_path, budget=None, lines=None):
+    """
+    SessionMeta for one session file, or None if unreadable or the budget ran out.
+
+    lines: the file's (length, bytes) lines when already read ahead.
+    """
+    session_id = session_file_id(jsonl_path)
+    first_prompt = ""
+    summary = ""
+    first_ts = ""
+    last_ts = ""
+    msg_count = 0
+    branch = ""
+
+    try:
+        with _TextLines(jsonl_path, lines) as source:
+            for n, line in source:
+                if budget is not None:
+                    if not budget.ok():
+                        break
+                    budget.bytes_read += n
+                line = line.strip()
+                if not line:
+                    continue
+
+                # Quick string checks before parsing
+                if '"progress"' in line or '"queue-operation"' in line:
+                    continue
+
+                try:
+                    d = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    continue
+
+                rtype = d.get("type", "")
+                ts = d.get("timestamp", "")
+
+                if ts:
+                    if not first_ts or ts < first_ts:
+                        first_ts = ts
+                    if ts > last_ts:
+                        last_ts = ts
+
+                if not branch:
+                    branch = d.get("gitBranch", "")
+
+                if rtype == "user":
+                    if d.get("isMeta") or d.get("isCompactSummary"):
+                        continue
+                    msg = d.get("message", {})
+                    if not isinstance(msg, dict):
+                        continue
+                    content = msg.get("content", "")
+                    if isinstance(content, str) and content.strip():
+                        msg_count += 1
+                        if not first_prompt:
+                            fp = content.strip()
+                            if not fp.startswith("<") and len(fp) > 2:
+                                first_prompt = fp[:180]
+                    elif isinstance(content, list):
+                        has_tr = any(
+                            isinstance(b, dict) and b.get("type") == "tool_result"
+                            for b in content
+                        )
+                        if not has_tr:
+                            msg_count += 1
+                            if not first_prompt:
+                                texts = [
+                                    b.get("text", "")
+                                    for b in content
+                                    if isinstance(b, dict) and b.get("type") == "text"
+                                ]
+                                fp = " ".join(t for t in texts if t).strip()
+                                if fp and not fp.startswith("<") and len(fp) > 2:
+                                    first_prompt = fp[:180]
+
+                elif rtype == "assistant":
+                    msg = d.get("message", {})
+                    if isinstance(msg, dict) and msg.get("model") != "<synthetic>":
+                        msg_count += 1
+
+                elif rtype == "summary":
+                    summary = d.get("summary", "")
+
+    except OSError:
+        return None
+    if budget is not None and budget.exhausted:
+        return None
+
+    return SessionMeta(
+        session_id=session_id,
+        full_path=str(jsonl_path),
+        created=first_ts,
+        modified=last_ts,
+        message_count=msg_count,
+        git_branch=branch,
+        summary=summary,
+        first_prompt=first_prompt,
+        project_path=project_path,
+    )
+
+
+def list_sessions(scope="current", target=None, limit=50, since="", grep_pat="",
+                  budget=None, concurrency=0):
+    """
+    List sessions matching criteria.
+
+    Args:
+        scope: "current", "all", or "path".
+        target: Project path (used when scope is "path" or "current" uses cwd).
+        limit: Maximum results.
+        since: ISO date string (YYYY-MM-DD) minimum.
+        grep_pat: Case-insensitive substring filter on summary+first_prompt.
+        budget: Optional ScanBudget bounding the transcript reads needed to
+            (re)build fallback indexes; results may then be partial.
+        concurrency: Session files read ahead while (re)building fallback
+            indexes (see build_fallback_index()); 0 reads them one by one.
+
+    Returns list of SessionMeta sorted by created descending.
+    """
+    if scope == "all":
+        return load_catalog(budget=budget, concurrency=concurrency).query(
+            since=since, limit=limit, grep_pat=grep_pat)
+
+    if scope == "current":
+        target = target or os.getcwd()
+    proj_dir = find_project_dir(target)
+    if not proj_dir:
+        return []
+
+    entries = sorted(_load_project_entries(proj_dir, budget, concurrency),
+                     key=lambda e: str(e.created))
+    return _query_sorted(
+        [str(e.created) for e in entries], entries, since, limit, grep_pat,
+        lambda e: e,
+    )
+
+
+def _load_project_entries(project_dir, budget=None, concurrency=0):
+    """Load one project's sessions from sessions-index.json or the fallback index."""
+    index_path = project_dir / "sessions-index.json"
+    if index_path.exists():
+        return load_index(index_path)
+    return build_fallback_index(project_dir, budget, concurrency)
+
+
+def _query_sorted(keys, rows, since, limit, grep_pat, to_meta):
+    """
+    Newest-first scan over rows sorted ascending by created (keys[i]).
+
+    `since` bisects to the first row on or after that date; the scan walks
+    back from the end and stops after `limit` hits, so cost follows the
+    result size rather than the catalog size.
+    """
+    if limit <= 0:
+        return []
+    lo = bisect.bisect_left(keys, since) if since else 0
+    grep_lower = grep_pat.lower() if grep_pat else ""
+
+    result = []
+    for i in range(len(rows) - 1, lo - 1, -1):
+        e = to_meta(rows[i])
+        if grep_lower:
+            haystack = (str(e.summary) + " " + str(e.first_prompt)).lower()
+            if grep_lower not in haystack:
+                continue
+        result.append(e)
+        if len(result) >= limit:
+            break
+    return result
+
+
+# Seconds of clock skew allowed between record timestamps and file mtimes
+STREAM_MTIME_SLACK = 60
+
+
+def _project_created_bound(scan, project_dir):
+    """
+    Newest mtime among a project's session files and sessions-index.json.
+
+    A session file is written after its first record and the index after
+    the sessions it lists, so this bounds every created date inside. Unlike
+    the directory mtime, echo-sleuth's own cache writes (index rebuilds,
+    locks, digests, sqlite journals) do not move it. 0.0 for no sessions.
+    """
+    latest = 0.0
+    for name, entry in scan.listing(project_dir)[0].items():
+        if name.endswith(SESSION_SUFFIXES) or name == "sessions-index.json":
+            try:
+                latest = max(latest, entry.stat().st_mtime)
+            except OSError:
+                continue
+    return latest
+
+
+def stream_sessions(since="", limit=50, grep_pat="", budget=None, concurrency=0):
+    """
+    Yield sessions from every project, newest created first, as they are found.
+
+    Projects are read newest first by _project_created_bound(), the newest
+    mtime of their session files and sessions-index.json, which bounds the
+    created date of every session inside; once the next project's bound is
+    older than a pending match, no unread project can hold a newer one and
+    the match is yielded. The output equals list_sessions(scope="all", ...)
+    without loading the global catalog, and iteration stops after `limit`
+    matches, or when `since` rules out the remaining projects.
+
+    budget/concurrency are as in list_sessions(); an exhausted budget flushes
+    the matches found so far.
+    """
+    import time
+
+    if limit <= 0:
+        return
+    scan = scan_projects()
+    projects = []
+    for entry in scan.listing(scan.root)[1].values():
+        projects.append((_project_created_bound(scan, entry.path), entry.path))
+    projects.sort(reverse=True)
+    grep_lower = grep_pat.lower() if grep_pat else ""
+
+    pending = []  # (created, seq, SessionMeta), ascending; at most `limit` kept
+    seq = 0
+    for mtime, path in projects:
+        bound = time.strftime("%Y-%m-%dT%H:%M:%S",
+                              time.gmtime(mtime + STREAM_MTIME_SLACK))
+        while pending and pending[-1][0] > bound:
+            yield pending.pop()[2]
+            limit -= 1
+            if limit <= 0:
+                return
+        if since and bound < since:
+            break
+        if budget is not None and budget.exhausted:
+            break
+        for e in _load_project_entries(Path(path), budget, concurrency):
+            created = str(e.created)
+            if since and created < since:
+                continue
+            if grep_lower:
+                haystack = (str(e.summary) + " " + str(e.first_prompt)).lower()
+                if grep_lower not in haystack:
+                    continue
+            seq += 1
+            bisect.insort(pending, (created, seq, e))
+        del pending[:-limit]
+
+    while pending and limit > 0:
+        yield pending.pop()[2]
+        limit -= 1
+
+
+# ---------------------------------------------------------------------------
+# Global session catalog (all projects, sorted by created)
+# ---------------------------------------------------------------------------
+
+CATALOG_FILE = ".echo-sleuth-catalog.json"
+CATALOG_VERSION = 1
+
+
+def _project_source_signature(project_dir):
+    """
+    Cheap change detector for a project's session listing.
+
+    Projects with sessions-index.json are keyed by that file's mtime and size;
+    fallback projects by _fallback_index_signature(), exactly what
+    build_fallback_index() uses to decide whether to rebuild.
+    """
+    try:
+        st = _scan_stat(project_dir / "sessions-index.json")
+        return ["index", st.st_mtime, st.st_size]
+    except OSError:
+        pass
+
+    files, dirs = _listing(project_dir)
+    if not files and not dirs and not os.path.isdir(str(project_dir)):
+        return None
+    return ["fallback"] + _fallback_index_signature(iter_session_files(project_dir))
+
+
+class SessionCatalog:
+    """
+    Merged session catalog across all_project_dirs(), sorted by created.
+
+    Rows are stored as compact lists in ascending created order alongside a
+    parallel `keys` list, so --since is a bisect and --limit reads only the
+    newest rows. refresh() re-reads only projects whose source signature
+    changed and merges them back in; SessionMeta objects are built lazily for
+    returned rows only.
+    """
+
+    # Row layout: project dir name first, then SessionMeta fields.
+    ROW_FIELDS = ("project",) + SessionMeta.__slots__
+
+    __slots__ = ("path", "sources", "keys", "rows", "dirty")
+
+    def __init__(self, path, sources=None, rows=None):
+        self.path = Path(path)
+        self.sources = sources or {}
+        self.rows = rows or []
+        self.keys = [str(r[self._CREATED]) for r in self.rows]
+        self.dirty = False
+
+    _CREATED = ROW_FIELDS.index("created")
+
+    @classmethod
+    def load(cls, path):
+        """Load a catalog file; returns an empty catalog if missing or stale-format."""
+        data = read_cache(path, CATALOG_VERSION)
+        if data is not None:
+            return cls(path, data.get("sources", {}), data.get("rows", []))
+        return cls(path)
+
+    def refresh(self, project_dirs=None, budget=None, concurrency=0):
+        """
+        Re-read projects whose signature changed; drop projects that vanished.
+
+        Once `budget` runs out, remaining changed projects keep their old rows.
+        A project whose rebuild was cut short gets its partial rows but no
+        signature, so the next refresh reads it again.
+
+        Signatures come from cached stats, so this starts a fresh tree scan.
+        """
+        scan_projects(max_age=0)
+        if project_dirs is None:
+            project_dirs = all_project_dirs()
+
+        seen = set()
+        changed = {}
+        for project_dir in project_dirs:
+            name = project_dir.name
+            seen.add(name)
+            sig = _project_source_signature(project_dir)
+            if sig is None or sig == self.sources.get(name):
+                continue
+            if budget is not None and budget.exhausted:
+                continue
+            entries = _load_project_entries(project_dir, budget, concurrency)
+            if budget is not None and budget.exhausted:
+                sig = None
+            changed[name] = (sig, entries)
+
+        removed = set(self.sources) - seen
+        if not changed and not removed:
+            return self
+
+        drop = removed | set(changed)
+        kept = [r for r in self.rows if r[0] not in drop]
+        fresh = []
+        for name, (sig, entries) in changed.items():
+            self.sources[name] = sig
+            for e in entries:
+                fresh.append([name] + [getattr(e, k) for k in SessionMeta.__slots__])
+        for name in removed:
+            self.sources.pop(name, None)
+
+        created = self._CREATED
+        fresh.sort(key=lambda r: str(r[created]))
+        self.rows = list(heapq.merge(kept, fresh, key=lambda r: str(r[created])))
+        self.keys = [str(r[created]) for r in self.rows]
+        self.dirty = True
+        return self
+
+    def save(self):
+        """Persist the catalog if refresh() changed it. Write failure is non-fatal."""
+        if not self.dirty:
+            return
+        if write_cache(self.path, {"sources": self.sources, "rows": self.rows},
+                       CATALOG_VERSION):
+            self.dirty = False
+
+    def _to_meta(self, row):
+        return SessionMeta(**dict(zip(SessionMeta.__slots__, row[1:])))
+
+    def query(self, since="", limit=50, grep_pat=""):
+        """Return up to `limit` SessionMeta created on/after `since`, newest first."""
+        return _query_sorted(self.keys, self.rows, since, limit, grep_pat, self._to_meta)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def load_catalog(refresh=True, budget=None, concurrency=0):
+    """
+    Load the global catalog from CLAUDE_DIR, refreshing and saving it by default.
+
+    Refreshes hold a CacheLock, so concurrent callers wait for the first one
+    and then refresh the catalog it saved, which is usually a no-op.
+    """
+    path = CLAUDE_DIR / CATALOG_FILE
+    if not (refresh and CLAUDE_DIR.exists()):
+        return SessionCatalog.load(path)
+    with CacheLock(path):
+        catalog = SessionCatalog.load(path)
+        catalog.refresh(budget=budget, concurrency=concurrency)
+        catalog.save()
+    return catalog
+
+
+# ---------------------------------------------------------------------------
+# Subagent discovery
+# ---------------------------------------------------------------------------
+
+def find_subagent_files(session_jsonl_path):
+    """
+    Find subagent .jsonl files for a session.
+
+    Returns list of Paths to subagent files.
+    """
+    session_path = Path(session_jsonl_path)
+    scan = scan_projects()
+    if scan.covers(session_path):
+        return [Path(entry.path) for entry in scan.subagents(session_path)]
+    session_id = session_file_id(session_path)
+    subagent_dir = session_path.parent / session_id / "subagents"
+    if not subagent_dir.exists():
+        return []
+    return iter_session_files(subagent_dir, prefix="agent-")
+
+
+# ---------------------------------------------------------------------------
+# Session tree statistics (parent + subagents, cached, parallel)
+# ---------------------------------------------------------------------------
+
+STATS_CACHE_FILE = ".echo-sleuth-stats.json"
+STATS_CACHE_VERSION = 1
+
+# Below this many uncached bytes, process-pool startup costs more than it saves.
+_PARALLEL_MIN_BYTES = 4_000_000
+
+# Counters summed across transcripts in a tree rollup.
+_SUMMED_STATS = (
+    "user_messages", "assistant_messages", "tool_calls", "errors",
+    "input_tokens", "output_tokens", "cache_read_tokens",
+    "cache_create_tokens", "total_tokens", "compactions",
+)
+
+
+def _parallel_map(func, items, workers=0):
+    """
+    Map a module-level func over items in a process pool.
+
+    Falls back to a serial map for a single item or when process pools are
+    unavailable (restricted sandboxes, missing sem_open).
+    """
+    items = list(items)
+    if workers <= 0:
+        workers = min(len(items), os.cpu_count() or 1)
+    if workers <= 1 or len(items) <= 1:
+        return [func(x) for x in items]
+    try:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(func, items))
+    except (OSError, ImportError, NotImplementedError, RuntimeError):
+        return [func(x) for x in items]
+
+
+def cached_session_stats(paths, cache_dir, workers=0):
+    """
+    session_stats() for each path, served from a per-directory cache.
+
+    Entries in `cache_dir`/.echo-sleuth-stats.json are keyed by absolute .jsonl
+    path and validated by (mtime, raw size), so archiving a session keeps its
+    entry valid; only stale files are recomputed, in parallel when there is
+    enough work. Returns stats dicts in input order, zeroed for a path that
+    vanished or cannot be read.
+
+    Updates hold a CacheLock, so concurrent callers reuse each other's work.
+    """
+    cache_path = Path(cache_dir) / STATS_CACHE_FILE
+    with CacheLock(cache_path):
+        return _cached_session_stats(paths, cache_path, workers)
+
+
+def _stats_cache_state(paths, cache_path):
+    """(cached entries, keys of `paths`, their signatures, keys needing recomputation)."""
+    files = (read_cache(cache_path, STATS_CACHE_VERSION) or {}).get("files", {})
+
+    keys = [os.path.abspath(live_session_path(p)) for p in paths]
+    sigs = {k: session_signature(k) for k in keys}
+    stale = [
+        k for k in dict.fromkeys(keys)
+        if sigs[k] is not None and (files.get(k) or {}).get("sig") != sigs[k]
+    ]
+    return files, keys, sigs, stale
+
+
+def _cached_session_stats(paths, cache_path, workers):
+    files, keys, sigs, stale = _stats_cache_state(paths, cache_path)
+
+    if stale:
+        stale_bytes = sum(sigs[k][1] for k in stale)
+        fresh = _parallel_map(
+            _readable_session_stats, stale,
+            workers=workers if stale_bytes >= _PARALLEL_MIN_BYTES else 1,
+        )
+        for k, stats in zip(stale, fresh):
+            if stats is not None:
+                files[k] = {"sig": sigs[k], "stats": stats}
+        write_cache(cache_path, {"files": files}, STATS_CACHE_VERSION)
+
+    # A transcript that vanished or cannot be read reports zeroed stats,
+    # keeping the result aligned with `paths`
+    out = []
+    for k in keys:
+        stats = (files.get(k) or {}).get("stats") or _readable_session_stats(k)
+        out.append(stats if stats is not None else dict(_new_stats(), total_tokens=0))
+    return out
+
+
+def _readable_session_stats(path):
+    """session_stats(), or None if the transcript vanished or cannot be read."""
+    try:
+        return session_stats(path)
+    except (OSError, EOFError):
+        return None
+
+
+def merge_stats(parts):
+    """
+    Roll up a list of session_stats() dicts into one.
+
+    Counters and tokens are summed, the time span is widened to cover every
+    part, files_edited takes the maximum (snapshots track the same working
+    tree), and descriptive fields come from the first part that has them.
+    """
+    total = {k: 0 for k in _SUMMED_STATS}
+    total.update({"slug": "", "model": "", "branch": "", "started": "",
+                  "ended": "", "files_edited": 0, "summary": ""})
+    for s in parts:
+        for k in _SUMMED_STATS:
+            total[k] += s.get(k, 0)
+        for k in ("slug", "model", "branch", "summary"):
+            if not total[k]:
+                total[k] = s.get(k, "")
+        if s.get("started") and (not total["started"] or s["started"] < total["started"]):
+            total["started"] = s["started"]
+        if s.get("ended", "") > total["ended"]:
+            total["ended"] = s["ended"]
+        total["files_edited"] = max(total["files_edited"], s.get("files_edited", 0))
+    return total
+
+
+def session_tree_stats(path, workers=0):
+    """
+    Stats for a session plus all of its subagent transcripts.
+
+    Returns {"total": merged stats, "agents": [(label, stats), ...]} where the
+    parent is labelled "main" and subagents by their file stem.
+    """
+    path = Path(path)
+    files = [path] + find_subagent_files(path)
+    labels = ["main"] + [session_file_id(f) for f in files[1:]]
+    per_file = cached_session_stats(files, path.parent, workers=workers)
+    return {
+        "total": merge_stats(per_file),
+        "agents": list(zip(labels, per_file)),
+    }
+
+
+def project_stats(project_dir, dedup=False, workers=0):
+    """
+    Stats for every session in a project, rolled up with merge_stats().
+
+    Returns {"total": merged stats, "sessions": [(session_id, stats), ...]}.
+    Without dedup, per-session stats come from cached_session_stats(). With
+    dedup=True each record is counted once, in the session that first owned
+    it (see UuidRegistry), so resumed sessions do not inflate the totals.
+    """
+    files = iter_session_files(project_dir)
+    if dedup:
+        registry = UuidRegistry(project_dir)
+        try:
+            registry.update()
+            jobs = [(str(p),) + registry.first_seen(p) for p in files]
+        finally:
+            registry.close()
+        new_bytes = sum((session_signature(p) or [0, 0])[1] - start for p, start, _ in jobs)
+        per_file = _parallel_map(
+            _first_seen_stats, jobs,
+            workers=workers if new_bytes >= _PARALLEL_MIN_BYTES else 1,
+        )
+    else:
+        per_file = cached_session_stats(files, project_dir, workers=workers)
+    return {
+        "total": merge_stats(per_file),
+        "sessions": [(session_file_id(p), st) for p, st in zip(files, per_file)],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Git commit cache (one git log pass, keyed by HEAD, extended incrementally)
 # ---------------------------------------------------------------------------
 
-class StaleScore:
-    """Staleness assessment for a memory."""
-    __slots__ = ("score", "reasons", "action")
-    def __init__(self, **kwargs):
-        for k in self.__slots__:
-            setattr(self, k, kwargs.get(k))
+GIT_CACHE_FILE = "echo-sleuth-commits.json"
+GIT_CACHE_VERSION = 1
 
-class MemoryStats:
-    """Aggregate stats for one project's memories."""
-    __slots__ = ("project", "file_count", "total_bytes",
-                 "estimated_tokens", "staleness_distribution")
-    def __init__(self, **kwargs):
-        for k in self.__slots__:
-            setattr(self, k, kwargs.get(k))
+# One record per commit: \x1e starts a record, \x1f separates header fields,
+# the body is closed by \x1f and --numstat lines follow.
+_GIT_LOG_FORMAT = "%x1e%H%x1f%h%x1f%at%x1f%ct%x1f%ai%x1f%s%x1f%b%x1f"
 
-_HALF_LIVES = {
-    "project": 14, "feedback": 90, "user": 180,
-    "reference": 60, "value": 365, "unknown": 30,
+_SINCE_UNITS = {
+    "second": 1, "minute": 60, "hour": 3600, "day": 86400,
+    "week": 7 * 86400, "month": 30 * 86400, "year": 365 * 86400,
 }
 
-def staleness_score(memory):
-    """Compute type-based heuristic staleness score using exponential decay."""
+
+def _git(repo, *args):
+    """Run git in repo; returns stdout text or None on failure."""
+    import subprocess
+    try:
+        proc = subprocess.run(
+            ["git", "-C", str(repo)] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, encoding="utf-8", errors="replace",
+        )
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return proc.stdout
+
+
+def parse_since(since, now=None):
+    """
+    Convert a git-style --since value to a unix timestamp.
+
+    Understands "N <unit>s ago" and YYYY-MM-DD[ HH:MM[:SS]] (local time).
+    Returns None for empty or unrecognised values.
+    """
+    import re
     import time
-    age_days = (time.time() - memory.mtime) / 86400.0
-    half_life = _HALF_LIVES.get(memory.type, 30)
-    score = int(100 * (1 - math.exp(-age_days * math.log(2) / half_life)))
-    score = max(0, min(100, score))
-    reasons = []
-    if age_days > half_life:
-        reasons.append("older than half-life (%d days for type=%s)" % (half_life, memory.type))
-    if age_days > half_life * 3:
-        reasons.append("significantly past expiry")
-    if score < 50:
-        action = "keep"
-    elif score < 75:
-        action = "review"
+    since = (since or "").strip()
+    if not since:
+        return None
+    now = time.time() if now is None else now
+    m = re.match(r"^(\d+)\s*\.?\s*(second|minute|hour|day|week|month|year)s?\s*\.?\s*ago$",
+                 since, re.IGNORECASE)
+    if m:
+        return int(now - int(m.group(1)) * _SINCE_UNITS[m.group(2).lower()])
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return int(time.mktime(time.strptime(since, fmt)))
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_git_log(text):
+    """Parse output of `git log --pretty=format:_GIT_LOG_FORMAT --numstat`."""
+    commits = []
+    for chunk in text.split("\x1e"):
+        if not chunk.strip():
+            continue
+        parts = chunk.split("\x1f", 7)
+        if len(parts) < 8:
+            continue
+        full, short, at, ct, date, subject, body, rest = parts
+        numstat = []
+        for line in rest.splitlines():
+            cols = line.split("\t", 2)
+            if len(cols) != 3:
+                continue
+            added = int(cols[0]) if cols[0].isdigit() else None
+            deleted = int(cols[1]) if cols[1].isdigit() else None
+            numstat.append([added, deleted, cols[2]])
+        try:
+            author_ts, commit_ts = int(at), int(ct)
+        except ValueError:
+            continue
+        commits.append({
+            "hash": full, "short": short,
+            "author_ts": author_ts, "commit_ts": commit_ts, "date": date,
+            "subject": subject, "body": body.strip(), "numstat": numstat,
+        })
+    return commits
+
+
+def _git_log(repo, rev_range="HEAD", since_ts=None):
+    """One `git log --numstat` pass over rev_range; None if git fails."""
+    import time
+    args = ["log", "--no-renames", "--numstat",
+            "--pretty=format:" + _GIT_LOG_FORMAT, rev_range]
+    if since_ts is not None:
+        args.append("--since=" + time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.localtime(since_ts)))
+    out = _git(repo, *args)
+    return None if out is None else _parse_git_log(out)
+
+
+def git_commits(repo=".", since=""):
+    """
+    Parsed commits reachable from HEAD, newest first, from the per-repo cache.
+
+    The cache lives in <git-dir>/echo-sleuth-commits.json and records the HEAD
+    it was built at plus the oldest time it covers (`floor`). When HEAD moves
+    forward only `old..HEAD` is read; a rewritten history or a --since older
+    than the floor costs one full `git log` pass. Each commit is a dict with
+    hash, short, author_ts, commit_ts, date, subject, body and numstat
+    ([added, deleted, path]; counts are None for binary files).
+    """
+    since_ts = parse_since(since)
+    if since and since_ts is None:
+        # Unknown date syntax: let git interpret it, uncached.
+        out = _git(repo, "log", "--no-renames", "--numstat",
+                   "--pretty=format:" + _GIT_LOG_FORMAT, "--since=" + since)
+        return _parse_git_log(out or "")
+
+    head = (_git(repo, "rev-parse", "HEAD") or "").strip()
+    git_dir = (_git(repo, "rev-parse", "--git-dir") or "").strip()
+    if not head or not git_dir:
+        return []
+    cache_path = Path(git_dir)
+    if not cache_path.is_absolute():
+        cache_path = Path(repo) / cache_path
+    cache_path = cache_path / GIT_CACHE_FILE
+    with CacheLock(cache_path):
+        commits = _cached_git_commits(repo, head, since_ts, cache_path)
+
+    if since_ts is None:
+        return commits
+    return [c for c in commits if c["commit_ts"] >= since_ts]
+
+
+def _cached_git_commits(repo, head, since_ts, cache_path):
+    cache = read_cache(cache_path, GIT_CACHE_VERSION)
+    covered = cache is not None and (
+        cache.get("floor") is None
+        or (since_ts is not None and cache["floor"] <= since_ts))
+
+    commits = None
+    if covered and cache.get("head") == head:
+        commits = cache["commits"]
+    elif covered and _git(repo, "merge-base", "--is-ancestor", cache["head"], head) is not None:
+        newer = _git_log(repo, "{}..{}".format(cache["head"], head))
+        if newer is not None:
+            commits = newer + cache["commits"]
+    if commits is None:
+        commits = _git_log(repo, head, since_ts)
+        if commits is None:
+            return []
+        cache = {"floor": since_ts}
+
+    if cache.get("head") != head or "commits" not in cache:
+        write_cache(cache_path, {"head": head, "floor": cache.get("floor"),
+                                 "commits": commits}, GIT_CACHE_VERSION)
+    return commits
+
+
+def commit_activity(commits):
+    """Commits per day, oldest first: [(YYYY-MM-DD, count), ...]."""
+    return sorted(Counter(c["date"][:10] for c in commits).items())
+
+
+def hotspot_files(commits, top=15):
+    """Most frequently changed files: [(count, path), ...], most first."""
+    counts = Counter(row[2] for c in commits for row in c["numstat"])
+    return sorted(((n, p) for p, n in counts.items()), key=lambda x: (-x[0], x[1]))[:top]
+
+
+def cluster_commits(commits, gap=3600):
+    """
+    Group newest-first commits into work sessions split by author-time gaps.
+
+    Returns list of {date, commits: [(short, subject)], files: set}.
+    """
+    sessions = []
+    current = None
+    prev_ts = None
+    for c in commits:
+        ts = c["author_ts"]
+        if current is None or (prev_ts - ts) > gap:
+            current = {"date": c["date"][:16], "commits": [], "files": set()}
+            sessions.append(current)
+        current["commits"].append((c["short"], c["subject"]))
+        current["files"].update(row[2] for row in c["numstat"])
+        prev_ts = ts
+    return sessions
+
+
+# ---------------------------------------------------------------------------
+# Session <-> commit correlation (sorted interval join)
+# ---------------------------------------------------------------------------
+
+def iso_to_ts(value):
+    """
+    Parse an ISO-8601 timestamp ("2026-01-15T10:00:00.000Z", "+02:00" offsets
+    allowed) to unix seconds. Returns None if unparseable.
+    """
+    import calendar
+    import re
+    import time
+    m = re.match(r"^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:\.\d+)?\s*"
+                 r"(Z|[+-]\d{2}:?\d{2})?$", str(value or "").strip())
+    if not m:
+        return None
+    base = calendar.timegm(time.strptime(m.group(1) + "T" + m.group(2), "%Y-%m-%dT%H:%M:%S"))
+    tz = m.group(3)
+    if tz and tz != "Z":
+        sign = 1 if tz[0] == "+" else -1
+        digits = tz[1:].replace(":", "")
+        base -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+    return base
+
+
+def _session_file_list(path):
+    """Files touched by a session (for _parallel_map); [] if unreadable."""
+    try:
+        return [row[0] for row in extract_files_changed(path)]
+    except OSError:
+        return []
+
+
+def _path_overlap(session_files, commit_files):
+    """
+    Count commit files that the session also touched.
+
+    Snapshot paths may be absolute while git paths are repo-relative, so a
+    session path matches when it equals the commit path or ends with
+    "/<commit path>".
+    """
+    if not session_files or not commit_files:
+        return 0
+    exact = set(session_files)
+    hits = 0
+    for cf in commit_files:
+        if cf in exact or any(sf.endswith("/" + cf) for sf in session_files):
+            hits += 1
+    return hits
+
+
+def correlate_sessions(sessions, commits, slack=900, with_files=True, workers=0):
+    """
+    Join sessions to the commits made while they were active.
+
+    Commits are sorted by author time once; each session's created..modified
+    interval (extended by `slack` seconds for commits made right after the
+    last message) becomes a bisect range over that list, so the join costs
+    O((S + C) log C) plus matches. Each match is weighted by time proximity
+    (1.0 inside the interval, decaying to 0 at the edge of the slack) and,
+    when `with_files` is set, by overlap between extract_files_changed() and
+    the commit's files. Every commit is assigned to its best session.
+
+    Returns a chronological list of events:
+        {"kind": "session", "ts", "session": SessionMeta, "commits": [match]}
+        {"kind": "commit", "ts", "commit": commit}        (uncorrelated)
+    where match = {"commit", "weight", "overlap", "files"}.
+    """
+    commits = sorted(commits, key=lambda c: c["author_ts"])
+    keys = [c["author_ts"] for c in commits]
+
+    if with_files:
+        file_lists = _parallel_map(
+            _session_file_list, [s.full_path for s in sessions], workers=workers)
     else:
-        action = "prune"
-    return StaleScore(score=score, reasons=reasons, action=action)
+        file_lists = [[] for _ in sessions]
+
+    best = {}  # commit index -> (weight, session index, match)
+    spans = []
+    for si, s in enumerate(sessions):
+        start = iso_to_ts(s.created)
+        end = iso_to_ts(s.modified) or start
+        spans.append(start)
+        if start is None:
+            continue
+        lo = bisect.bisect_left(keys, start - slack)
+        hi = bisect.bisect_right(keys, end + slack)
+        for ci in range(lo, hi):
+            c = commits[ci]
+            ts = c["author_ts"]
+            if start <= ts <= end:
+                time_score = 1.0
+            else:
+                dist = start - ts if ts < start else ts - end
+                time_score = max(0.0, 1.0 - float(dist) / slack) if slack else 0.0
+            cfiles = [row[2] for row in c["numstat"]]
+            overlap = _path_overlap(file_lists[si], cfiles)
+            if with_files and cfiles:
+                weight = 0.5 * time_score + 0.5 * overlap / len(cfiles)
+            else:
+                weight = time_score
+            if weight <= 0:
+                continue
+            if ci not in best or weight > best[ci][0]:
+                best[ci] = (weight, si, {
+                    "commit": c, "weight": round(weight, 3),
+                    "overlap": overlap, "files": len(cfiles),
+                })
+
+    matched = [[] for _ in sessions]
+    for ci in sorted(best):
+        weight, si, match = best[ci]
+        matched[si].append(match)
+
+    events = []
+    for si, s in enumerate(sessions):
+        events.append({"kind": "session", "ts": spans[si] or 0,
+                       "session": s, "commits": matched[si]})
+    for ci, c in enumerate(commits):
+        if ci not in best:
+            events.append({"kind": "commit", "ts": c["author_ts"], "commit": c})
+    events.sort(key=lambda e: e["ts"])
+    return events
 
-def estimate_tokens(text):
-    """Rough token estimate: len(text) // 4."""
-    return len(text) // 4
 
-def all_memory_dirs():
-    """Scan ~/.claude/projects/ for directories containing memory/ subdirs.
-    Returns list of (encoded_project_name, memory_dir_path) tuples."""
-    result = []
-    if not CLAUDE_DIR.exists():
-        return result
-    for d in CLAUDE_DIR.iterdir():
-        if not d.is_dir():
+# ---------------------------------------------------------------------------
+# Usage warehouse (incremental sqlite3 store for cross-session analytics)
+# ---------------------------------------------------------------------------
+
+USAGE_DB_FILE = ".echo-sleuth-usage.sqlite"
+
+_USAGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    session_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    offset INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS turns (
+    file INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    cache_read_tokens INTEGER NOT NULL,
+    cache_create_tokens INTEGER NOT NULL,
+    tool_calls INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tools (
+    file INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    tool_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_error INTEGER
+);
+CREATE INDEX IF NOT EXISTS turns_ts ON turns (ts);
+CREATE INDEX IF NOT EXISTS tools_ts ON tools (ts);
+CREATE INDEX IF NOT EXISTS tools_id ON tools (file, tool_id);
+"""
+
+# Time-bucket expressions over ISO-8601 `ts` columns.
+_USAGE_BUCKETS = {
+    "none": "''",
+    "day": "substr(ts, 1, 10)",
+    "week": "strftime('%Y-W%W', substr(ts, 1, 10))",
+    "month": "substr(ts, 1, 7)",
+}
+
+_USAGE_GROUPS = {
+    "none": "''",
+    "model": "model",
+    "project": "f.project",
+    "session": "f.session_id",
+    "agent": "f.agent",
+    "tool": "name",
+}
+
+
+def iter_transcripts(project_dirs):
+    """Yield (project, session_id, agent, path) for every session and subagent file."""
+    for project_dir in project_dirs:
+        for jsonl_path in iter_session_files(project_dir):
+            session_id = session_file_id(jsonl_path)
+            yield project_dir.name, session_id, "main", jsonl_path
+            for sub in find_subagent_files(jsonl_path):
+                yield project_dir.name, session_id, session_file_id(sub), sub
+
+
+def _pending_transcripts(cur, project_dirs, reset):
+    """
+    Walk a `files` ingest-state table against the transcripts on disk.
+
+    Yields (file_id, path, offset) for every transcript with unread bytes,
+    after recording its new size and mtime; the caller stores the offset it
+    reached. A file that shrank is passed to reset(file_id) and re-read from
+    0. Archived sessions keep their .jsonl key and raw size, so archiving one
+    does not re-ingest it.
+    """
+    if project_dirs is None:
+        project_dirs = list(all_project_dirs())
+    for project, session_id, agent, path in iter_transcripts(project_dirs):
+        sig = session_signature(path)
+        if sig is None:
+            continue
+        mtime, size = sig
+        path = live_session_path(path)
+        row = cur.execute(
+            "SELECT id, offset, size, mtime FROM files WHERE path = ?",
+            (path,)).fetchone()
+        if row and row[2] == size and row[3] == mtime:
             continue
-        mem_dir = d / "memory"
-        if mem_dir.is_dir():
-            result.append((d.name, str(mem_dir)))
-    return result
 
-def memory_stats(memory_dir):
-    """Aggregate stats for one project's memories."""
-    mems = list(iter_memories(memory_dir))
-    total_bytes = sum(m.size for m in mems)
-    total_content = "".join(m.content for m in mems)
-    dist = {"fresh": 0, "aging": 0, "review": 0, "stale": 0}
-    for m in mems:
-        ss = staleness_score(m)
-        if ss.score < 25:
-            dist["fresh"] += 1
-        elif ss.score < 50:
-            dist["aging"] += 1
-        elif ss.score < 75:
-            dist["review"] += 1
+        if row and size >= row[1]:
+            file_id, offset = row[0], row[1]
         else:
-            dist["stale"] += 1
-    project_name = (os.path.basename(os.path.dirname(memory_dir))
-                    if os.path.basename(memory_dir) == "memory"
-                    else os.path.basename(memory_dir))
-    return MemoryStats(
-        project=project_name, file_count=len(mems),
-        total_bytes=total_bytes,
-        estimated_tokens=estimate_tokens(total_content),
-        staleness_distribution=dist,
-    )
+            if row:
+                file_id = row[0]
+                reset(file_id)
+            else:
+                cur.execute(
+                    "INSERT INTO files (path, session_id, project, agent) "
+                    "VALUES (?, ?, ?, ?)",
+                    (path, session_id, project, agent))
+                file_id = cur.lastrowid
+            offset = 0
+        cur.execute("UPDATE files SET size = ?, mtime = ? WHERE id = ?",
+                    (size, mtime, file_id))
+        yield file_id, path, offset
+
+
+class UsageWarehouse:
+    """
+    Condensed per-turn usage and tool-call rows for every session file.
+
+    Each .jsonl (parent or subagent) has one ingest state row in `files`
+    holding the byte offset of the last complete line read. ingest() only
+    reads bytes appended since then, so refreshing a large history costs
+    roughly the new data. A file that shrank is re-read from the start; a
+    rewrite that leaves it at least as large is not detected, as
+    transcripts are only ever appended to.
+    """
+
+    __slots__ = ("path", "conn")
+
+    def __init__(self, path=None):
+        import sqlite3
+        self.path = Path(path) if path else CLAUDE_DIR / USAGE_DB_FILE
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(_USAGE_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def ingest(self, project_dirs=None):
+        """
+        Bring the warehouse up to date. Returns (files_read, turns_added).
+
+        Ingests are serialized by a CacheLock on the database file. If another
+        process is still ingesting after CACHE_LOCK_TIMEOUT, this returns
+        (0, 0) and queries see the rows committed so far.
+        """
+        with CacheLock(self.path) as lock:
+            if not lock.held:
+                return 0, 0
+            return self._ingest(project_dirs)
+
+    def _ingest(self, project_dirs):
+        cur = self.conn.cursor()
+
+        def reset(file_id):
+            cur.execute("DELETE FROM turns WHERE file = ?", (file_id,))
+            cur.execute("DELETE FROM tools WHERE file = ?", (file_id,))
+
+        files_read = 0
+        turns_added = 0
+        for file_id, path, offset in _pending_transcripts(cur, project_dirs, reset):
+            offset, added = self._ingest_file(cur, file_id, path, offset)
+            cur.execute("UPDATE files SET offset = ? WHERE id = ?", (offset, file_id))
+            files_read += 1
+            turns_added += added
+
+        self.conn.commit()
+        return files_read, turns_added
+
+    def _ingest_file(self, cur, file_id, path, offset):
+        turns = []
+        tools = []
+        results = []
+        try:
+            f = open_session(path, offset=offset, binary=True)
+        except (OSError, EOFError):
+            return offset, 0
+        with f:
+            for n, raw in bounded_lines(f, sizes=True):
+                if not raw.endswith(b"\n"):
+                    break  # Partial trailing line: re-read it next time
+                offset += n
+                if b'"assistant"' not in raw and b'"tool_result"' not in raw:
+                    continue
+                try:
+                    d = json.loads(raw.decode("utf-8", errors="replace"))
+                except ValueError:
+                    continue
+                msg = d.get("message")
+                if not isinstance(msg, dict):
+                    continue
+                ts = d.get("timestamp", "")
+                content = msg.get("content")
+                rtype = d.get("type")
+
+                if rtype == "assistant":
+                    model = msg.get("model", "")
+                    if model == "<synthetic>":
+                        continue
+                    n_tools = 0
+                    if isinstance(content, list):
+                        for b in content:
+                            if isinstance(b, dict) and b.get("type") == "tool_use":
+                                n_tools += 1
+                                tools.append((file_id, ts, b.get("id", ""),
+                                              b.get("name", ""), None))
+                    usage = msg.get("usage")
+                    if not isinstance(usage, dict):
+                        usage = {}
+                    turns.append((
+                        file_id, ts, model,
+                        usage.get("input_tokens", 0) or 0,
+                        usage.get("output_tokens", 0) or 0,
+                        usage.get("cache_read_input_tokens", 0) or 0,
+                        usage.get("cache_creation_input_tokens", 0) or 0,
+                        n_tools,
+                    ))
+                elif rtype == "user" and isinstance(content, list):
+                    for b in content:
+                        if isinstance(b, dict) and b.get("type") == "tool_result":
+                            results.append((1 if b.get("is_error") else 0,
+                                            file_id, b.get("tool_use_id", "")))
+
+        cur.executemany("INSERT INTO turns VALUES (?, ?, ?, ?, ?, ?, ?, ?)", turns)
+        cur.executemany("INSERT INTO tools VALUES (?, ?, ?, ?, ?)", tools)
+        cur.executemany(
+            "UPDATE tools SET is_error = ? WHERE file = ? AND tool_id = ?", results)
+        return offset, len(turns)
+
+    def query(self, report="tokens", group_by="model", bucket="day",
+              since="", project=""):
+        """
+        Aggregate the warehouse. Returns (headers, rows).
+
+        report "tokens": turns and token sums per (bucket, group).
+        report "tools": calls, errors and error rate per (bucket, group).
+        group_by: none|model|project|session|agent (tokens) or
+                  none|tool|project|session|agent (tools).
+        bucket: none|day|week|month over the turn/tool timestamp.
+        """
+        if bucket not in _USAGE_BUCKETS:
+            raise ValueError("bucket must be one of: " + ", ".join(sorted(_USAGE_BUCKETS)))
+        if group_by not in _USAGE_GROUPS or (report == "tokens" and group_by == "tool") \
+                or (report == "tools" and group_by == "model"):
+            raise ValueError("unsupported group_by for {}: {}".format(report, group_by))
+
+        if report == "tokens":
+            table = "turns"
+            metrics = ("COUNT(*), SUM(input_tokens), SUM(output_tokens), "
+                       "SUM(cache_read_tokens), SUM(cache_create_tokens)")
+            metric_names = ["turns", "input_tokens", "output_tokens",
+                            "cache_read_tokens", "cache_create_tokens"]
+        elif report == "tools":
+            table = "tools"
+            metrics = ("COUNT(*), SUM(COALESCE(is_error, 0)), "
+                       "ROUND(1.0 * SUM(COALESCE(is_error, 0)) / COUNT(*), 4)")
+            metric_names = ["calls", "errors", "error_rate"]
+        else:
+            raise ValueError("report must be 'tokens' or 'tools'")
+
+        where = []
+        params = []
+        if since:
+            where.append("ts >= ?")
+            params.append(since)
+        if project:
+            where.append("f.project = ?")
+            params.append(project)
+
+        sql = "SELECT {b} AS bucket, {g} AS grp, {m} FROM {t} JOIN files f ON f.id = {t}.file".format(
+            b=_USAGE_BUCKETS[bucket], g=_USAGE_GROUPS[group_by], m=metrics, t=table)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY bucket, grp ORDER BY bucket, grp"
+
+        rows = self.conn.execute(sql, params).fetchall()
+        return [bucket, group_by] + metric_names, rows
 
 
 # ---------------------------------------------------------------------------
-# Project directory resolution
+# Ranked message search (BM25 over an incremental inverted index)
 # ---------------------------------------------------------------------------
 
-def _encode_project_path(project_path):
-    """Encode an absolute path to Claude's directory format."""
-    # /Users/joker/github/myproject -> -Users-joker-github-myproject
-    normalized = project_path.replace("/", "-")
-    if normalized.startswith("-"):
-        return normalized
-    return "-" + normalized
+SEARCH_DB_FILE = ".echo-sleuth-search.sqlite"
+
+_SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    session_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    offset INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    file INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    role TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    part INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS corpus (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    docs INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO corpus VALUES (0, 0, 0);
+CREATE INDEX IF NOT EXISTS docs_file ON docs (file);
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+"""
 
+SEARCH_INDEX_VERSION = 1
 
-def find_project_dir(target):
+_SEARCH_STOPWORDS = frozenset((
+    "the", "and", "to", "of", "in", "is", "it", "that", "for", "this", "on",
+    "with", "be", "as", "are", "at", "or", "an", "if", "we", "you", "can",
+    "not", "was", "but", "so", "do", "by", "from", "have", "has", "will",
+))
+
+# Tool inputs such as Write contents can be huge; index only their head.
+_SEARCH_MAX_CHARS = 20_000
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def search_tokens(text):
+    """Lower-cased word tokens (2+ chars, stopwords dropped) for indexing and queries."""
+    import re
+    return [t for t in re.findall(r"[a-z0-9][a-z0-9_]+", text.lower())
+            if t not in _SEARCH_STOPWORDS]
+
+
+def _search_docs(d):
     """
-    Map a project path to its Claude session directory.
+    Split one raw record dict into searchable (role, text) documents.
 
-    Returns the Path to the directory, or None if not found.
-    Uses exact encoded-path match first, then falls back to full-path matching.
+    User prompts, assistant text and each tool_use input are separate
+    documents, so a hit points at the message that actually matched.
     """
-    if not CLAUDE_DIR.exists():
-        return None
+    rec = Record(d)
+    if rec.type == "user":
+        if rec.is_meta_user() or rec.is_compact_summary() or rec.is_tool_result_message():
+            return []
+        text = rec.text_content()
+        if not text or text.startswith("<system-reminder>") or text.startswith("[Request interrupted"):
+            return []
+        return [("user", text[:_SEARCH_MAX_CHARS])]
 
-    # Exact match
-    encoded = _encode_project_path(target)
-    exact = CLAUDE_DIR / encoded
-    if exact.is_dir():
-        return exact
+    if rec.type != "assistant" or rec.is_synthetic() or not isinstance(rec.content, list):
+        return []
+    docs = []
+    text = rec.text_content()
+    if text:
+        docs.append(("assistant", text[:_SEARCH_MAX_CHARS]))
+    for b in rec.content:
+        if isinstance(b, dict) and b.get("type") == "tool_use":
+            inp = b.get("input")
+            if isinstance(inp, dict):
+                inp = " ".join(str(v) for v in inp.values())
+            docs.append(("tool:" + str(b.get("name", "?")), str(inp or "")[:_SEARCH_MAX_CHARS]))
+    return docs
+
+
+def _snippet(text, terms, width=160):
+    """A whitespace-collapsed window of `text` around the first query term."""
+    flat = " ".join(text.split())
+    low = flat.lower()
+    hits = [i for i in (low.find(t) for t in terms) if i >= 0]
+    start = max(0, min(hits) - width // 4) if hits else 0
+    out = flat[start:start + width]
+    if start:
+        out = "..." + out
+    if start + width < len(flat):
+        out += "..."
+    return out
+
+
+class SearchIndex:
+    """
+    BM25 message search over every session transcript.
+
+    Messages and tool inputs are indexed as documents in an sqlite inverted
+    index (postings plus per-term document frequencies and corpus totals).
+    ingest() keeps its own per-file byte offsets, walked like
+    UsageWarehouse's, so refreshing only tokenizes appended lines and
+    adjusts the statistics in place.
+    search() scores candidate documents and keeps the best k in a heap.
+    """
 
-    # Try without leading dash variations
-    stripped = target.rstrip("/")
-    encoded2 = _encode_project_path(stripped)
-    exact2 = CLAUDE_DIR / encoded2
-    if exact2.is_dir():
-        return exact2
+    __slots__ = ("path", "conn")
+
+    def __init__(self, path=None):
+        import sqlite3
+        self.path = Path(path) if path else CLAUDE_DIR / SEARCH_DB_FILE
+        self.conn = sqlite3.connect(str(self.path))
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SEARCH_INDEX_VERSION:
+            # Derived data: an older layout is dropped and re-read
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS terms; "
+                "DROP TABLE IF EXISTS docs; DROP TABLE IF EXISTS corpus; "
+                "DROP TABLE IF EXISTS files; "
+                "PRAGMA user_version = %d;" % SEARCH_INDEX_VERSION)
+        self.conn.executescript(_SEARCH_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def ingest(self, project_dirs=None):
+        """
+        Bring the index up to date. Returns (files_read, docs_added).
+
+        Serialized like UsageWarehouse.ingest(): (0, 0) if another process
+        is still ingesting after CACHE_LOCK_TIMEOUT.
+        """
+        with CacheLock(self.path) as lock:
+            if not lock.held:
+                return 0, 0
+            return self._ingest(project_dirs)
+
+    def _ingest(self, project_dirs):
+        cur = self.conn.cursor()
+
+        def reset(file_id):
+            self._drop_file(cur, file_id)
+
+        files_read = 0
+        docs_added = 0
+        for file_id, path, offset in _pending_transcripts(cur, project_dirs, reset):
+            offset, added = self._ingest_file(cur, file_id, path, offset)
+            cur.execute("UPDATE files SET offset = ? WHERE id = ?", (offset, file_id))
+            files_read += 1
+            docs_added += added
+
+        self.conn.commit()
+        return files_read, docs_added
+
+    def _drop_file(self, cur, file_id):
+        n, length = cur.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE file = ?",
+            (file_id,)).fetchone()
+        dfs = cur.execute(
+            "SELECT p.term, COUNT(*) FROM postings p JOIN docs d ON d.id = p.doc "
+            "WHERE d.file = ? GROUP BY p.term", (file_id,)).fetchall()
+        cur.executemany("UPDATE terms SET df = df - ? WHERE term = ?",
+                        [(c, t) for t, c in dfs])
+        cur.execute("DELETE FROM postings WHERE doc IN (SELECT id FROM docs WHERE file = ?)",
+                    (file_id,))
+        cur.execute("DELETE FROM docs WHERE file = ?", (file_id,))
+        cur.execute("UPDATE corpus SET docs = docs - ?, length = length - ?", (n, length))
+
+    def _ingest_file(self, cur, file_id, path, offset):
+        df = Counter()
+        postings = []
+        n_docs = 0
+        total_len = 0
+        try:
+            f = open_session(path, offset=offset, binary=True)
+        except (OSError, EOFError):
+            return offset, 0
+        with f:
+            for n, raw in bounded_lines(f, sizes=True):
+                if not raw.endswith(b"\n"):
+                    break  # Partial trailing line: re-read it next time
+                line_offset = offset
+                offset += n
+                if b'"user"' not in raw and b'"assistant"' not in raw:
+                    continue
+                try:
+                    d = json.loads(raw.decode("utf-8", errors="replace"))
+                except ValueError:
+                    continue
+                if not isinstance(d, dict):
+                    continue
+                for part, (role, text) in enumerate(_search_docs(d)):
+                    tokens = search_tokens(text)
+                    if not tokens:
+                        continue
+                    cur.execute(
+                        "INSERT INTO docs (file, ts, role, offset, part, length) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (file_id, d.get("timestamp", ""), role, line_offset, part, len(tokens)))
+                    doc_id = cur.lastrowid
+                    tf = Counter(tokens)
+                    postings.extend((t, doc_id, c) for t, c in tf.items())
+                    df.update(tf.keys())
+                    n_docs += 1
+                    total_len += len(tokens)
+
+        cur.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+        cur.executemany("INSERT OR IGNORE INTO terms VALUES (?, 0)", [(t,) for t in df])
+        cur.executemany("UPDATE terms SET df = df + ? WHERE term = ?",
+                        [(c, t) for t, c in df.items()])
+        cur.execute("UPDATE corpus SET docs = docs + ?, length = length + ?", (n_docs, total_len))
+        return offset, n_docs
+
+    def term_stats(self, terms):
+        """(documents, total length, {term: document frequency}) for `terms`."""
+        n_docs, total_len = self.conn.execute("SELECT docs, length FROM corpus").fetchone()
+        dfs = {}
+        for term in terms:
+            row = self.conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+            if row and row[0] > 0:
+                dfs[term] = row[0]
+        return n_docs, total_len, dfs
+
+    def search(self, query, k=10, project="", stats=None):
+        """
+        Top-k documents for `query` by BM25, best first.
+
+        Returns dicts: score, session_id, project, agent, timestamp, role,
+        snippet, path. `project` restricts hits to one project directory name.
+        `stats` replaces this index's term_stats() with totals over several
+        indexes, so their scores can be compared (see corpus_search()).
+        """
+        import operator
+
+        terms = list(dict.fromkeys(search_tokens(query)))
+        n_docs, total_len, dfs = stats if stats is not None else self.term_stats(terms)
+        if not terms or k <= 0 or not n_docs:
+            return []
+        avgdl = total_len / n_docs
 
-    # Full-path substring match: check sessions-index.json originalPath
-    for index_path in CLAUDE_DIR.glob("*/sessions-index.json"):
+        sql = "SELECT p.doc, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc"
+        if project:
+            sql += " JOIN files f ON f.id = d.file WHERE p.term = ? AND f.project = ?"
+        else:
+            sql += " WHERE p.term = ?"
+
+        scores = {}
+        for term in terms:
+            df = dfs.get(term, 0)
+            if df <= 0:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            params = (term, project) if project else (term,)
+            for doc, tf, length in self.conn.execute(sql, params):
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+        best = heapq.nlargest(k, scores.items(), key=operator.itemgetter(1))
+        return [self._hit(doc, score, terms) for doc, score in best]
+
+    def _hit(self, doc, score, terms):
+        ts, role, offset, part, path, session_id, project, agent = self.conn.execute(
+            "SELECT d.ts, d.role, d.offset, d.part, f.path, f.session_id, f.project, f.agent "
+            "FROM docs d JOIN files f ON f.id = d.file WHERE d.id = ?", (doc,)).fetchone()
+        snippet = ""
         try:
-            with open(index_path, encoding="utf-8") as f:
-                data = json.load(f)
-            orig = data.get("originalPath", "")
-            if orig and (orig == target or orig == stripped):
-                return index_path.parent
-        except (json.JSONDecodeError, OSError):
-            continue
+            with open_session(path, offset=offset, binary=True) as f:
+                d = json.loads(next(bounded_lines(f), b"").decode("utf-8", errors="replace"))
+            parts = _search_docs(d)
+            if part < len(parts):
+                snippet = _snippet(parts[part][1], terms)
+        except (OSError, EOFError, ValueError):
+            pass
+        return {
+            "score": round(score, 3), "session_id": session_id, "project": project,
+            "agent": agent, "timestamp": ts, "role": role, "snippet": snippet,
+            "path": path,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Related sessions (hashed sparse TF-IDF vectors, cosine top-k)
+# ---------------------------------------------------------------------------
+
+VECTORS_FILE = ".echo-sleuth-vectors.json"
+VECTORS_VERSION = 1
+
+# 2**18 hash buckets keeps collisions rare for conversation vocabularies.
+VECTOR_DIMS = 1 << 18
+# Per-session cap on stored features (highest term frequency wins).
+VECTOR_MAX_FEATURES = 512
+
+
+def _feature_bucket(feature):
+    import zlib
+    return zlib.crc32(feature.encode("utf-8")) % VECTOR_DIMS
+
+
+def session_vector(path):
+    """
+    Hashed sublinear term-frequency vector for one session: {bucket: weight}.
+
+    Features are message words (user, assistant and tool summaries, no
+    thinking) plus "file:" features for the last two components of every
+    edited path, so sessions touching the same files score as related.
+    Buckets are strings so the vector round-trips through JSON.
+    """
+    tf = Counter()
+    for m in extract_messages(path, thinking_limit=-1):
+        tf.update(search_tokens(m["text"]))
+    for (filepath,) in extract_files_changed(path):
+        parts = filepath.replace("\\", "/").rstrip("/").split("/")
+        tf["file:" + "/".join(parts[-2:]).lower()] += 3
+
+    vec = Counter()
+    for feature, count in tf.most_common(VECTOR_MAX_FEATURES):
+        vec[str(_feature_bucket(feature))] += 1 + math.log(count)
+    return {b: round(w, 4) for b, w in vec.items()}
+
+
+class SessionVectors:
+    """
+    Cached feature vectors for every main session, for nearest-neighbour queries.
+
+    Vectors store raw term-frequency weights keyed by .jsonl path and are
+    validated by session_signature(), so refresh() only re-reads changed
+    sessions. Document frequencies and each session's TF-IDF norm are
+    recomputed from the cached vectors whenever any vector changed, so a
+    related() query reads no transcripts and costs one sparse dot product
+    per session.
+    """
+
+    __slots__ = ("path", "sessions", "df", "norms", "dirty")
+
+    def __init__(self, path, sessions=None, df=None, norms=None):
+        self.path = Path(path)
+        self.sessions = sessions or {}
+        self.df = df or {}
+        self.norms = norms or {}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        """Load a vectors file; returns an empty store if missing or stale-format."""
+        data = read_cache(path, VECTORS_VERSION)
+        if data is not None:
+            return cls(path, data.get("sessions", {}), data.get("df", {}),
+                       data.get("norms", {}))
+        return cls(path)
+
+    def refresh(self, project_dirs=None, workers=0):
+        """Vectorize new or changed sessions (in parallel); drop vanished ones."""
+        if project_dirs is None:
+            project_dirs = all_project_dirs()
+
+        current = {}
+        for project_dir in project_dirs:
+            for path in iter_session_files(project_dir):
+                key = live_session_path(path)
+                sig = session_signature(path)
+                if sig is not None:
+                    current[key] = (project_dir.name, session_file_id(path), sig)
+
+        stale = [k for k, (_, _, sig) in current.items()
+                 if (self.sessions.get(k) or {}).get("sig") != sig]
+        removed = set(self.sessions) - set(current)
+        if not stale and not removed:
+            return self
+
+        stale_bytes = sum(current[k][2][1] for k in stale)
+        vectors = _parallel_map(
+            session_vector, stale,
+            workers=workers if stale_bytes >= _PARALLEL_MIN_BYTES else 1,
+        )
+        for k, vec in zip(stale, vectors):
+            project, session_id, sig = current[k]
+            self.sessions[k] = {"sig": sig, "project": project,
+                                "session_id": session_id, "vec": vec}
+        for k in removed:
+            self.sessions.pop(k, None)
+
+        df = Counter()
+        for entry in self.sessions.values():
+            df.update(entry["vec"].keys())
+        self.df = dict(df)
+        self.norms = {k: math.sqrt(sum(w * w for w in self._weights(e["vec"]).values()))
+                      for k, e in self.sessions.items()}
+        self.dirty = True
+        return self
+
+    def save(self):
+        """Persist the store if refresh() changed it. Write failure is non-fatal."""
+        if not self.dirty:
+            return
+        if write_cache(self.path, {"sessions": self.sessions, "df": self.df,
+                                   "norms": self.norms}, VECTORS_VERSION):
+            self.dirty = False
+
+    def _idf(self, bucket):
+        return math.log((1 + len(self.sessions)) / (1 + self.df.get(bucket, 0))) + 1
+
+    def _weights(self, vec):
+        return {b: w * self._idf(b) for b, w in vec.items()}
+
+    def related(self, path, k=10, project=""):
+        """
+        Top-k sessions most similar to `path` by cosine similarity, best first.
+
+        Returns dicts: score, session_id, project, path. The query session
+        itself is excluded; `project` restricts candidates to one project
+        directory name. A session not yet in the store is vectorized on the fly.
+        """
+        import operator
+
+        key = live_session_path(os.path.abspath(str(path)))
+        entry = self.sessions.get(key)
+        query = self._weights(entry["vec"] if entry else session_vector(key))
+        qnorm = math.sqrt(sum(w * w for w in query.values()))
+        if not qnorm or k <= 0:
+            return []
+        # Stored vectors hold raw tf weights: fold the idf into the query side
+        query = {b: w * self._idf(b) for b, w in query.items()}
 
-    # Last resort: match the full encoded path (not just basename)
-    # This handles minor encoding differences
-    target_parts = stripped.strip("/").split("/")
-    best_match = None
-    best_score = 0
+        scores = []
+        for other, e in self.sessions.items():
+            if other == key or (project and e["project"] != project):
+                continue
+            norm = self.norms.get(other)
+            if not norm:
+                continue
+            vec = e["vec"]
+            dot = 0.0
+            for b, w in query.items():
+                v = vec.get(b)
+                if v:
+                    dot += w * v
+            if dot:
+                scores.append((other, dot / (qnorm * norm)))
 
-    for d in CLAUDE_DIR.iterdir():
-        if not d.is_dir():
-            continue
-        dirname = d.name.lstrip("-")
-        dir_parts = dirname.split("-")
+        best = heapq.nlargest(k, scores, key=operator.itemgetter(1))
+        return [{"score": round(s, 4), "session_id": self.sessions[o]["session_id"],
+                 "project": self.sessions[o]["project"], "path": o} for o, s in best]
 
-        # Check if target_parts appear as a contiguous subsequence in dir_parts
-        if len(target_parts) <= len(dir_parts):
-            score = 0
-            for i in range(len(dir_parts) - len(target_parts) + 1):
-                match = all(
-                    target_parts[j] == dir_parts[i + j]
-                    for j in range(len(target_parts))
-                )
-                if match:
-                    score = len(target_parts)
-                    break
-            if score > best_score:
-                best_score = score
-                best_match = d
 
-    return best_match
+def load_session_vectors(refresh=True, workers=0):
+    """
+    Load the global vector store from CLAUDE_DIR, refreshing and saving it by
+    default. Refreshes hold a CacheLock, as in load_catalog().
+    """
+    path = CLAUDE_DIR / VECTORS_FILE
+    if not (refresh and CLAUDE_DIR.exists()):
+        return SessionVectors.load(path)
+    with CacheLock(path):
+        store = SessionVectors.load(path)
+        store.refresh(workers=workers)
+        store.save()
+    return store
 
 
-def resolve_project_root(project_dir):
+# ---------------------------------------------------------------------------
+# Resume dedup (per-project registry of record uuid owners)
+# ---------------------------------------------------------------------------
+
+UUID_REGISTRY_FILE = ".echo-sleuth-uuids.sqlite"
+UUID_REGISTRY_VERSION = 1
+
+_UUID_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    session_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    offset INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0,
+    rank TEXT
+);
+CREATE TABLE IF NOT EXISTS occ (
+    file INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    uuid TEXT NOT NULL,
+    end INTEGER NOT NULL,
+    PRIMARY KEY (file, offset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS occ_uuid ON occ (uuid);
+"""
+
+
+class UuidRegistry:
     """
-    Map a Claude encoded project directory back to its real filesystem path.
-    Returns: absolute path string, or None if unresolvable.
+    Which session file first owned each record uuid, for one project.
+
+    A resumed or continued conversation repeats earlier records, uuids
+    included, at the start of a new .jsonl. The registry stores the byte
+    offset of every uuid-bearing line per file (incrementally, like
+    UsageWarehouse), with where the line ends, and ranks files by their first timestamp, then by their
+    mtime when first seen: a uuid belongs to the lowest-ranked file holding
+    it, so the original session owns the records its resumption repeats.
+    first_seen() turns that into the offsets a scan can skip.
     """
-    project_dir = Path(project_dir) if not isinstance(project_dir, Path) else project_dir
-    if not project_dir.is_dir():
-        return None
 
-    # Strategy 1: sessions-index.json
-    index_path = project_dir / "sessions-index.json"
-    if index_path.exists():
+    __slots__ = ("project_dir", "path", "conn")
+
+    def __init__(self, project_dir, path=None):
+        import sqlite3
+        self.project_dir = Path(os.path.abspath(str(project_dir)))
+        self.path = Path(path) if path else self.project_dir / UUID_REGISTRY_FILE
+        self.conn = sqlite3.connect(str(self.path))
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != UUID_REGISTRY_VERSION:
+            # Derived data: an older layout is dropped and re-read
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS occ; DROP TABLE IF EXISTS files; "
+                "PRAGMA user_version = %d;" % UUID_REGISTRY_VERSION)
+        self.conn.executescript(_UUID_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def update(self):
+        """
+        Record uuids appended since the last update. Returns (files_read, records_added).
+
+        Serialized by a CacheLock like UsageWarehouse.ingest(); (0, 0) if
+        another process is still updating after CACHE_LOCK_TIMEOUT.
+        """
+        with CacheLock(self.path) as lock:
+            if not lock.held:
+                return 0, 0
+            return self._update()
+
+    def _update(self):
+        cur = self.conn.cursor()
+
+        def reset(file_id):
+            cur.execute("DELETE FROM occ WHERE file = ?", (file_id,))
+            cur.execute("UPDATE files SET rank = NULL WHERE id = ?", (file_id,))
+
+        files_read = 0
+        added = 0
+        for file_id, path, offset in _pending_transcripts(cur, [self.project_dir], reset):
+            rank, mtime = cur.execute(
+                "SELECT rank, mtime FROM files WHERE id = ?", (file_id,)).fetchone()
+            offset, rows, first_ts = self._scan_file(file_id, path, offset, rank is None)
+            cur.executemany("INSERT OR REPLACE INTO occ VALUES (?, ?, ?, ?)", rows)
+            if rank is None and first_ts:
+                cur.execute("UPDATE files SET rank = ? WHERE id = ?",
+                            ("{}|{:020.6f}".format(first_ts, mtime), file_id))
+            cur.execute("UPDATE files SET offset = ? WHERE id = ?", (offset, file_id))
+            files_read += 1
+            added += len(rows)
+        self.conn.commit()
+        return files_read, added
+
+    @staticmethod
+    def _scan_file(file_id, path, offset, want_ts):
+        import re
+
+        ts_re = re.compile(rb'"timestamp"\s*:\s*"([^"]+)"')
+        rows = []
+        first_ts = ""
         try:
-            with open(index_path, encoding="utf-8") as f:
-                data = json.load(f)
-            orig = data.get("originalPath", "")
-            if orig and os.path.isdir(orig):
-                return orig
-            entries = data.get("entries", [])
-            if isinstance(entries, list):
-                for s in entries:
-                    pp = s.get("projectPath", "")
-                    if pp and os.path.isdir(pp):
-                        return pp
-        except (json.JSONDecodeError, OSError, TypeError):
-            pass
+            f = open_session(path, offset=offset, binary=True)
+        except (OSError, EOFError):
+            return offset, rows, first_ts
+        with f:
+            for n, raw in bounded_lines(f, sizes=True):
+                if not raw.endswith(b"\n"):
+                    break  # Partial trailing line: read it next time
+                if b'"uuid"' in raw:
+                    try:
+                        d = json.loads(raw.decode("utf-8", errors="replace"))
+                    except ValueError:
+                        d = None
+                    uid = d.get("uuid") if isinstance(d, dict) else None
+                    if isinstance(uid, str) and uid:
+                        rows.append((file_id, offset, uid, offset + n))
+                        if want_ts and not first_ts:
+                            first_ts = str(d.get("timestamp") or "")
+                elif want_ts and not first_ts:
+                    m = ts_re.search(raw)
+                    if m:
+                        first_ts = m.group(1).decode("utf-8", errors="replace")
+                offset += n
+        return offset, rows, first_ts
+
+    def first_seen(self, path):
+        """
+        (start, skip) for scanning only records first seen in `path`.
+
+        `start` is the byte offset just past the leading run of records owned
+        by other files (the repeated prefix of a resumed session); `skip` is
+        the set of offsets of later lines owned elsewhere. The run only
+        covers adjacent lines from the start of the file, so a uuid-less
+        record (e.g. a leading summary) ends it and is still read. A file
+        the registry has not seen yields (0, empty set).
+        """
+        row = self.conn.execute(
+            "SELECT id, offset, COALESCE(rank, '~') FROM files WHERE path = ?",
+            (live_session_path(os.path.abspath(str(path))),)).fetchone()
+        if row is None:
+            return 0, frozenset()
+        file_id, end, rank = row
+        foreign = {off for (off,) in self.conn.execute(
+            "SELECT DISTINCT o.offset FROM occ o "
+            "JOIN occ p ON p.uuid = o.uuid AND p.file != o.file "
+            "JOIN files fp ON fp.id = p.file "
+            "WHERE o.file = ? AND (COALESCE(fp.rank, '~') < ? "
+            "OR (COALESCE(fp.rank, '~') = ? AND fp.id < ?))",
+            (file_id, rank, rank, file_id))}
+        if not foreign:
+            return 0, frozenset()
+        start = 0
+        for off, line_end in self.conn.execute(
+                "SELECT offset, end FROM occ WHERE file = ? ORDER BY offset", (file_id,)):
+            if off != start or off not in foreign:
+                break  # A uuid-less line or one of this file's own records
+            start = line_end
+        return start, frozenset(off for off in foreign if off >= start)
+
+
+def uuid_registry(path):
+    """The updated UuidRegistry of the project holding session file `path`."""
+    registry = UuidRegistry(_session_project_dir(path))
+    registry.update()
+    return registry
 
-    # Strategy 2: best-effort decode
-    dirname = project_dir.name
-    if dirname.startswith("-"):
-        decoded = "/" + dirname[1:].replace("-", "/")
-        if os.path.isdir(decoded):
-            return decoded
 
-    return None
+# ---------------------------------------------------------------------------
+# Schema registry (record shapes per client version, incremental)
+# ---------------------------------------------------------------------------
 
+SCHEMA_DB_FILE = ".echo-sleuth-schema.sqlite"
+# Lines whose shape tokens were already decoded are decoded every Nth time
+SCHEMA_SAMPLE_EVERY = 16
+
+_SCHEMA_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    session_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    offset INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    mtime REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS shapes (
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    field TEXT NOT NULL,
+    file INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (version, type, field)
+) WITHOUT ROWID;
+"""
 
-def all_project_dirs():
-    """Yield all project directories under ~/.claude/projects/."""
-    if not CLAUDE_DIR.exists():
-        return
-    for d in CLAUDE_DIR.iterdir():
-        if d.is_dir() and d.name != ".":
-            yield d
+
+def record_shape(d):
+    """
+    Field names describing one record's structure.
+
+    Top-level keys, plus "message.<key>" for the keys of a dict message,
+    "content.<type>" for its content block types and "subtype.<value>" for
+    a system subtype, so new block kinds and subtypes surface as new fields.
+    """
+    fields = set(d)
+    msg = d.get("message")
+    if isinstance(msg, dict):
+        fields.update("message." + k for k in msg)
+        content = msg.get("content")
+        if isinstance(content, list):
+            fields.update("content." + str(b.get("type")) for b in content
+                          if isinstance(b, dict) and b.get("type"))
+    subtype = d.get("subtype")
+    if isinstance(subtype, str) and subtype:
+        fields.add("subtype." + subtype)
+    return fields
+
+
+def _version_key(version):
+    """Sort key for client versions: "2.1.9" < "2.1.14"; "" (no version) first."""
+    parts = []
+    if not version:
+        return parts
+    for part in version.replace("-", ".").split("."):
+        parts.append((0, int(part), "") if part.isdigit() else (1, 0, part))
+    return parts
+
+
+# Shape token values and timestamp of a raw line, for SchemaRegistry's
+# prefilter (compact and ", "-separated JSON alike)
+_SHAPE_VALUES = rb'"(type|subtype|version)": ?"([^"\\]*)"'
+_SHAPE_TIMESTAMP = rb'"timestamp": ?"([^"\\]*)"'
+
+
+def _shape_sampled(tokens_seen, tokens, ts_match):
+    """Whether SchemaRegistry decodes a line with these shape tokens; counts it in tokens_seen."""
+    line_ts = ts_match.group(1) if ts_match else b"~"
+    seen = tokens_seen.get(tokens)
+    if seen is None:
+        tokens_seen[tokens] = [1, line_ts]
+        return True
+    seen[0] += 1
+    if line_ts < seen[1]:
+        seen[1] = line_ts
+        return True
+    return seen[0] % SCHEMA_SAMPLE_EVERY == 0
+
+
+class SchemaRegistry:
+    """
+    Record types and fields seen per client `version`, across every session.
+
+    Each (version, type, field) keeps where it was first seen: the file,
+    byte offset and timestamp of its earliest record. A field of "" stands
+    for the type itself. Like UsageWarehouse, update() reads only bytes
+    appended since the last update, so keeping the registry current costs
+    roughly the new data; drift() then answers from the registry alone.
+
+    Not every line is decoded. A line's shape tokens are the values of its
+    "type", "subtype" and "version" keys (record type, content block types,
+    system subtype) and its number of keys, all found without decoding.
+    Within one update a line is decoded when its tokens are new, when it is
+    older than the lines decoded with them, or as every
+    SCHEMA_SAMPLE_EVERY-th line with them. A key that replaces another
+    under the same tokens can therefore be first recorded a few records
+    late.
+    """
+
+    __slots__ = ("path", "conn")
+
+    def __init__(self, path=None):
+        import sqlite3
+        self.path = Path(path) if path else CLAUDE_DIR / SCHEMA_DB_FILE
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(_SCHEMA_DB_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, project_dirs=None):
+        """
+        Record shapes appended since the last update. Returns (files_read, shapes_added).
+
+        Serialized by a CacheLock like UsageWarehouse.ingest(); (0, 0) if
+        another process is still updating after CACHE_LOCK_TIMEOUT. Sizes
+        come from cached stats, so this starts a fresh tree scan.
+        """
+        with CacheLock(self.path) as lock:
+            if not lock.held:
+                return 0, 0
+            return self._update(project_dirs)
+
+    def _update(self, project_dirs):
+        scan_projects(max_age=0)
+        cur = self.conn.cursor()
+        first = {(v, t, f): ts for v, t, f, ts in cur.execute(
+            "SELECT version, type, field, timestamp FROM shapes")}
+        files_read = 0
+        added = 0
+        tokens_seen = {}
+        for file_id, path, offset in _pending_transcripts(cur, project_dirs, lambda _id: None):
+            offset, rows = self._scan_file(file_id, path, offset, first, tokens_seen)
+            added += sum(1 for key, _row in rows if key not in first)
+            for key, row in rows:
+                first[key] = row[-1]
+            cur.executemany("INSERT OR REPLACE INTO shapes VALUES (?, ?, ?, ?, ?, ?)",
+                            [key + row for key, row in rows])
+            cur.execute("UPDATE files SET offset = ? WHERE id = ?", (offset, file_id))
+            files_read += 1
+        self.conn.commit()
+        return files_read, added
+
+    @staticmethod
+    def _scan_file(file_id, path, offset, first, tokens_seen):
+        """
+        (end offset, [((version, type, field), (file, offset, timestamp))]) of earlier sightings.
+
+        tokens_seen maps the shape tokens met in this update to [lines,
+        earliest decoded timestamp] (see _shape_sampled()).
+        """
+        import re
+
+        value_re = re.compile(_SHAPE_VALUES)
+        ts_re = re.compile(_SHAPE_TIMESTAMP)
+        found = {}
+        try:
+            f = open_session(path, offset=offset, binary=True)
+        except (OSError, EOFError):
+            return offset, []
+        with f:
+            for n, raw in bounded_lines(f, sizes=True):
+                if not raw.endswith(b"\n"):
+                    break  # Partial trailing line: read it next time
+                if b'"type"' in raw and _shape_sampled(
+                        tokens_seen, (frozenset(value_re.findall(raw)), raw.count(b'":')),
+                        ts_re.search(raw)):
+                    try:
+                        d = json.loads(raw.decode("utf-8", errors="replace"))
+                    except ValueError:
+                        d = None
+                    if isinstance(d, dict) and isinstance(d.get("type"), str):
+                        version = str(d.get("version") or "")
+                        rtype = d["type"]
+                        ts = str(d.get("timestamp") or "~")
+                        for field in [""] + sorted(record_shape(d)):
+                            key = (version, rtype, field)
+                            seen = found[key][-1] if key in found else first.get(key)
+                            if seen is None or ts < seen:
+                                found[key] = (file_id, offset, ts)
+                offset += n
+        return offset, list(found.items())
+
+    def drift(self, since_version=""):
+        """
+        Types and fields that first appeared in each version, oldest version first.
+
+        A (type, field) counts as new in the lowest version that has it. Each
+        item is a dict: version, type, field ("" for a new record type), kind
+        ("type" or "field"), known (type is in KNOWN_TYPES), session_id, path,
+        offset and timestamp of the first record showing it. since_version
+        keeps only versions newer than it.
+        """
+        rows = self.conn.execute(
+            "SELECT s.version, s.type, s.field, s.offset, s.timestamp, f.session_id, f.path "
+            "FROM shapes s JOIN files f ON f.id = s.file").fetchall()
+        rows.sort(key=lambda r: (_version_key(r[0]), r[1], r[2]))
+        floor = _version_key(since_version) if since_version else None
+        seen = set()
+        items = []
+        for version, rtype, field, offset, ts, session_id, path in rows:
+            if (rtype, field) in seen:
+                continue
+            seen.add((rtype, field))
+            if floor is not None and _version_key(version) <= floor:
+                continue
+            items.append({
+                "version": version, "type": rtype, "field": field,
+                "kind": "field" if field else "type", "known": rtype in KNOWN_TYPES,
+                "session_id": session_id, "path": path, "offset": offset,
+                "timestamp": "" if ts == "~" else ts,
+            })
+        return items
+
+    def versions(self):
+        """{version: {type: [fields]}} of everything recorded."""
+        shapes = {}
+        for version, rtype, field in self.conn.execute(
+                "SELECT version, type, field FROM shapes ORDER BY type, field"):
+            fields = shapes.setdefault(version, {}).setdefault(rtype, [])
+            if field:
+                fields.append(field)
+        return {v: shapes[v] for v in sorted(shapes, key=_version_key)}
+
+
+def schema_registry(project_dirs=None):
+    """The updated SchemaRegistry of CLAUDE_DIR."""
+    registry = SchemaRegistry()
+    registry.update(project_dirs)
+    return registry
 
 
 # ---------------------------------------------------------------------------
-# Session listing (with fallback index building)
+# Multi-root corpus (one shard of catalog and indexes per session tree)
 # ---------------------------------------------------------------------------
 
-class SessionMeta:
-    """Lightweight session metadata."""
-
-    __slots__ = (
-        "session_id", "full_path", "created", "modified",
-        "message_count", "git_branch", "summary", "first_prompt",
-        "project_path",
-    )
+# os.pathsep-separated session trees that corpus queries fan out over, e.g.
+# projects directories collected from several machines.
+CORPUS_ROOTS_ENV = "ECHO_SLEUTH_ROOTS"
 
-    def __init__(self, **kwargs):
-        for k in self.__slots__:
-            setattr(self, k, kwargs.get(k, ""))
 
-    def to_tsv(self):
-        fields = [
-            str(self.session_id),
-            str(self.created),
-            str(self.modified),
-            str(self.message_count),
-            str(self.git_branch),
-            _sanitize_tsv(str(self.summary), 80),
-            _sanitize_tsv(str(self.first_prompt), 100),
-            str(self.project_path),
-            str(self.full_path),
-        ]
-        return "\t".join(fields)
+def corpus_roots(spec=None):
+    """
+    Session tree Paths of the corpus, without duplicates.
 
+    `spec` is a list or an os.pathsep-separated string; None reads
+    $ECHO_SLEUTH_ROOTS, and an empty setting means CLAUDE_DIR alone.
+    """
+    if spec is None:
+        spec = os.environ.get(CORPUS_ROOTS_ENV, "")
+    if isinstance(spec, str):
+        spec = spec.split(os.pathsep)
+    roots = []
+    for root in spec:
+        root = str(root).strip()
+        if not root:
+            continue
+        root = Path(os.path.abspath(os.path.expanduser(root)))
+        if root not in roots:
+            roots.append(root)
+    return roots or [CLAUDE_DIR]
 
-def _sanitize_tsv(s, max_len=0):
-    """Clean a string for TSV output."""
-    s = s.replace("\t", " ").replace("\n", " ")
-    if max_len and len(s) > max_len:
-        s = s[: max_len - 3] + "..."
-    return s
 
+def _on_shard(job):
+    """Run func(*args) of a (root, func, args) job with CLAUDE_DIR set to root."""
+    global CLAUDE_DIR
 
-def load_index(index_path):
-    """Load sessions from a sessions-index.json file. Returns list of SessionMeta."""
+    root, func, args = job
+    saved = CLAUDE_DIR
+    CLAUDE_DIR = Path(root)
     try:
-        with open(index_path, encoding="utf-8") as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, OSError):
-        return []
+        return func(*args)
+    finally:
+        CLAUDE_DIR = saved
 
-    entries = data.get("entries", [])
-    result = []
-    for e in entries:
-        result.append(SessionMeta(
-            session_id=e.get("sessionId", ""),
-            full_path=e.get("fullPath", ""),
-            created=e.get("created", ""),
-            modified=e.get("modified", ""),
-            message_count=e.get("messageCount", 0),
-            git_branch=e.get("gitBranch", ""),
-            summary=e.get("summary", ""),
-            first_prompt=e.get("firstPrompt", ""),
-            project_path=e.get("projectPath", ""),
-        ))
-    return result
 
+def _shard_sessions(since, limit, grep_pat, seconds, max_bytes, concurrency):
+    budget = ScanBudget(seconds, max_bytes) if seconds or max_bytes else None
+    rows = [[getattr(e, k) for k in SessionMeta.__slots__]
+            for e in load_catalog(budget=budget, concurrency=concurrency).query(
+                since=since, limit=limit, grep_pat=grep_pat)]
+    if budget is None:
+        return rows, 0, False
+    return rows, budget.bytes_read, budget.exhausted
 
-def build_fallback_index(project_dir):
+
+def corpus_sessions(roots=None, since="", limit=50, grep_pat="", budget=None,
+                    concurrency=0, workers=0):
     """
-    Build index entries for a project directory that has no sessions-index.json.
+    Newest-first sessions across the session trees of corpus_roots(roots).
 
-    Reads the first user message and last summary from each .jsonl file.
-    Caches the result in .echo-sleuth-index.json within the project dir.
+    Each root is a shard with its own catalog and fallback indexes, kept
+    inside it, so adding or removing a root leaves the others' caches alone.
+    Shards are queried in parallel processes for their newest `limit`
+    matches, and the per-shard lists are merged by created date.
+
+    A `budget` applies its limits to each shard; its bytes_read and
+    exhausted then report the shards' totals.
     """
-    project_dir = Path(project_dir)
-    cache_path = project_dir / ".echo-sleuth-index.json"
+    import itertools
 
-    # Check cache freshness
-    jsonl_files = sorted(project_dir.glob("*.jsonl"))
-    if not jsonl_files:
+    if limit <= 0:
         return []
+    seconds, max_bytes = (budget.seconds, budget.max_bytes) if budget is not None else (0, 0)
+    args = (since, limit, grep_pat, seconds, max_bytes, concurrency)
+    results = _parallel_map(_on_shard, [(str(root), _shard_sessions, args)
+                                        for root in corpus_roots(roots)], workers)
+
+    created = SessionMeta.__slots__.index("created")
+    for _, bytes_read, exhausted in results:
+        if budget is not None:
+            budget.bytes_read += bytes_read
+            budget.exhausted = budget.exhausted or exhausted
+    merged = heapq.merge(*[rows for rows, _, _ in results],
+                         key=lambda r: str(r[created]), reverse=True)
+    return [SessionMeta(**dict(zip(SessionMeta.__slots__, row)))
+            for row in itertools.islice(merged, limit)]
+
+
+def _shard_search_stats(terms, ingest):
+    if not CLAUDE_DIR.is_dir():
+        return (0, 0), (0, 0, {})
+    index = SearchIndex()
+    try:
+        counts = index.ingest() if ingest else (0, 0)
+        return counts, index.term_stats(terms)
+    finally:
+        index.close()
 
-    latest_mtime = max(f.stat().st_mtime for f in jsonl_files)
-
-    if cache_path.exists():
-        try:
-            cache_mtime = cache_path.stat().st_mtime
-            if cache_mtime >= latest_mtime:
-                with open(cache_path, encoding="utf-8") as f:
-                    cached = json.load(f)
-                return [SessionMeta(**e) for e in cached]
-        except (json.JSONDecodeError, OSError, TypeError):
-            pass
 
-    # Build index from raw files
-    entries = []
-    # Derive project_path from directory name
-    dir_name = project_dir.name
-    # Reverse the encoding: -Users-joker-github-myproject -> /Users/joker/github/myproject
-    # This is lossy (can't distinguish - that was / vs literal -), but best effort
-    project_path = "/" + dir_name.lstrip("-").replace("-", "/") if dir_name.startswith("-") else dir_name
+def _shard_search(query, k, stats):
+    if not CLAUDE_DIR.is_dir():
+        return []
+    index = SearchIndex()
+    try:
+        hits = index.search(query, k=k, stats=stats)
+    finally:
+        index.close()
+    for hit in hits:
+        hit["root"] = str(CLAUDE_DIR)
+    return hits
 
-    for jsonl_path in jsonl_files:
-        # Skip subagent directories
-        if "subagents" in str(jsonl_path):
-            continue
 
-        session_id = jsonl_path.stem
-        first_prompt = ""
-        summary = ""
-        first_ts = ""
-        last_ts = ""
-        msg_count = 0
-        branch = ""
+def corpus_search(query, roots=None, k=10, ingest=True, workers=0):
+    """
+    Top-k messages for `query` across the session trees of corpus_roots(roots).
+
+    Returns (hits, files_read, docs_added); hits are SearchIndex.search()
+    dicts plus "root", best first. Each root keeps its own search index. The
+    shards first report their document counts and term frequencies (after
+    ingesting, unless `ingest` is false); each is then searched with the
+    summed statistics, so scores equal those of one index over every root
+    and the per-shard top-k lists merge exactly.
+    """
+    import operator
+
+    if k <= 0:
+        return [], 0, 0
+    roots = [str(root) for root in corpus_roots(roots)]
+    terms = list(dict.fromkeys(search_tokens(query)))
+    first = _parallel_map(_on_shard, [(root, _shard_search_stats, (terms, ingest))
+                                      for root in roots], workers)
+
+    n_docs = total_len = files_read = docs_added = 0
+    dfs = Counter()
+    for (files, docs), (shard_docs, shard_len, shard_dfs) in first:
+        files_read += files
+        docs_added += docs
+        n_docs += shard_docs
+        total_len += shard_len
+        dfs.update(shard_dfs)
+    if not terms or not n_docs:
+        return [], files_read, docs_added
+
+    stats = (n_docs, total_len, dict(dfs))
+    runs = _parallel_map(_on_shard, [(root, _shard_search, (query, k, stats))
+                                     for root in roots], workers)
+    hits = heapq.nlargest(k, (h for run in runs for h in run),
+                          key=operator.itemgetter("score"))
+    return hits, files_read, docs_added
 
-        try:
-            with open(jsonl_path, encoding="utf-8", errors="replace") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
 
-                    # Quick string checks before parsing
-                    if '"progress"' in line or '"queue-operation"' in line:
-                        continue
+# ---------------------------------------------------------------------------
+# Cache warmer (refresh derived caches of recent sessions ahead of queries)
+# ---------------------------------------------------------------------------
 
-                    try:
-                        d = json.loads(line)
-                    except (json.JSONDecodeError, ValueError):
-                        continue
+WARM_LOCK_FILE = ".echo-sleuth-warm"
 
-                    rtype = d.get("type", "")
-                    ts = d.get("timestamp", "")
-
-                    if ts:
-                        if not first_ts or ts < first_ts:
-                            first_ts = ts
-                        if ts > last_ts:
-                            last_ts = ts
-
-                    if not branch:
-                        branch = d.get("gitBranch", "")
-
-                    if rtype == "user":
-                        if d.get("isMeta") or d.get("isCompactSummary"):
-                            continue
-                        msg = d.get("message", {})
-                        if not isinstance(msg, dict):
-                            continue
-                        content = msg.get("content", "")
-                        if isinstance(content, str) and content.strip():
-                            msg_count += 1
-                            if not first_prompt:
-                                fp = content.strip()
-                                if not fp.startswith("<") and len(fp) > 2:
-                                    first_prompt = fp[:180]
-                        elif isinstance(content, list):
-                            has_tr = any(
-                                isinstance(b, dict) and b.get("type") == "tool_result"
-                                for b in content
-                            )
-                            if not has_tr:
-                                msg_count += 1
-                                if not first_prompt:
-                                    texts = [
-                                        b.get("text", "")
-                                        for b in content
-                                        if isinstance(b, dict) and b.get("type") == "text"
-                                    ]
-                                    fp = " ".join(t for t in texts if t).strip()
-                                    if fp and not fp.startswith("<") and len(fp) > 2:
-                                        first_prompt = fp[:180]
-
-                    elif rtype == "assistant":
-                        msg = d.get("message", {})
-                        if isinstance(msg, dict) and msg.get("model") != "<synthetic>":
-                            msg_count += 1
+# Sessions modified within this many days are warmed
+WARM_RECENT_DAYS = 7
 
-                    elif rtype == "summary":
-                        summary = d.get("summary", "")
+WARM_KINDS = ("index", "stats", "digest", "catalog", "schema", "search", "usage")
 
-        except OSError:
-            continue
+# Corpus-wide stores: warmed only once some command has created them
+_WARM_STORES = (
+    ("schema", SCHEMA_DB_FILE, SchemaRegistry, "update"),
+    ("search", SEARCH_DB_FILE, SearchIndex, "ingest"),
+    ("usage", USAGE_DB_FILE, UsageWarehouse, "ingest"),
+)
 
-        entries.append(SessionMeta(
-            session_id=session_id,
-            full_path=str(jsonl_path),
-            created=first_ts,
-            modified=last_ts,
-            message_count=msg_count,
-            git_branch=branch,
-            summary=summary,
-            first_prompt=first_prompt,
-            project_path=project_path,
-        ))
 
-    # Cache for next time
-    try:
-        cache_data = []
-        for e in entries:
-            cache_data.append({k: getattr(e, k) for k in SessionMeta.__slots__})
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump(cache_data, f, ensure_ascii=False)
-    except OSError:
-        pass  # Cache write failure is non-fatal
+def warm_plan(project_dirs=None, recent_days=WARM_RECENT_DAYS, kinds=WARM_KINDS, now=None):
+    """
+    Missing or stale caches behind sessions modified in the last `recent_days`.
+
+    Returns (kind, target, cost) tuples, cost being the transcript bytes a
+    refresh reads. Sessions are taken newest first; each gets its "digest"
+    (sessions of DIGEST_MIN_BYTES or more) and then its "stats" cache entry
+    (session plus subagents, served from the digest when there is one),
+    preceded at a project's first session by the project's fallback
+    "index". The corpus-wide "catalog", "schema", "search" and "usage"
+    stores come last; the last three are only kept warm once a command has
+    created them.
+    """
+    import time
 
-    return entries
+    kinds = set(kinds)
+    now = time.time() if now is None else now
+    scan_projects(max_age=0)
+    if project_dirs is None:
+        project_dirs = list(all_project_dirs())
+
+    recent = []  # (mtime, size, path, project_dir)
+    for project_dir in project_dirs:
+        for path in iter_session_files(project_dir):
+            sig = session_signature(path)
+            if sig is not None and sig[0] >= now - recent_days * 86400:
+                recent.append((sig[0], sig[1], path, project_dir))
+    recent.sort(key=lambda r: r[0], reverse=True)
+
+    plan = []
+    seen = set()
+    for _mtime, size, path, project_dir in recent:
+        if project_dir not in seen:
+            seen.add(project_dir)
+            if "index" in kinds:
+                plan.extend(_warm_index_task(project_dir))
+        digested = size >= DIGEST_MIN_BYTES
+        if "digest" in kinds and digested and load_digest(path) is None:
+            plan.append(("digest", path, size))
+        if "stats" in kinds:
+            paths = [path] + find_subagent_files(path)
+            _files, keys, sigs, stale = _stats_cache_state(
+                paths, project_dir / STATS_CACHE_FILE)
+            if stale:
+                cost = sum(sigs[k][1] for k in stale if not (digested and k == keys[0]))
+                plan.append(("stats", path, cost))
+    if recent:
+        plan.extend(_warm_store_tasks(recent, kinds))
+    return plan
+
+
+def _warm_index_task(project_dir):
+    """The "index" task of a project without sessions-index.json whose fallback index is stale."""
+    if _scan_exists(project_dir / "sessions-index.json"):
+        return []
+    files = iter_session_files(project_dir)
+    sig = _fallback_index_signature(files)
+    cached = read_cache(project_dir / INDEX_CACHE_FILE, INDEX_CACHE_VERSION)
+    if cached is not None and cached.get("sig") == sig:
+        return []
+    sizes = (_file_signature(f, cached=True) for f in files)
+    return [("index", project_dir, sum(sig[1] for sig in sizes if sig is not None))]
+
+
+def _warm_store_tasks(recent, kinds):
+    tasks = []
+    if "catalog" in kinds:
+        catalog = SessionCatalog.load(CLAUDE_DIR / CATALOG_FILE)
+        changed = {r[3] for r in recent
+                   if catalog.sources.get(r[3].name) != _project_source_signature(r[3])}
+        if changed:
+            tasks.append(("catalog", CLAUDE_DIR / CATALOG_FILE,
+                          sum(r[1] for r in recent if r[3] in changed)))
+    for kind, filename, _cls, _method in _WARM_STORES:
+        if kind not in kinds:
+            continue
+        target = CLAUDE_DIR / filename
+        try:
+            written = os.stat(str(target)).st_mtime
+        except OSError:
+            continue
+        cost = sum(r[1] for r in recent if r[0] >= written)
+        if cost:
+            tasks.append((kind, target, cost))
+    return tasks
 
 
-def list_sessions(scope="current", target=None, limit=50, since="", grep_pat=""):
+def warm_caches(project_dirs=None, recent_days=WARM_RECENT_DAYS, kinds=WARM_KINDS,
+                budget=None, duty=1.0, dry_run=False):
     """
-    List sessions matching criteria.
+    Refresh what warm_plan() finds, yielding (kind, target, cost, seconds) per task.
 
-    Args:
-        scope: "current", "all", or "path".
-        target: Project path (used when scope is "path" or "current" uses cwd).
-        limit: Maximum results.
-        since: ISO date string (YYYY-MM-DD) minimum.
-        grep_pat: Case-insensitive substring filter on summary+first_prompt.
+    `budget` (a ScanBudget) bounds a run: tasks start while it has time and
+    bytes left, each charged its planned cost, and the rest is left for the
+    next run. duty < 1 throttles by sleeping after each task, so the warmer
+    is busy at most that fraction of its wall time. dry_run yields the plan
+    with seconds=0 and refreshes nothing.
 
-    Returns list of SessionMeta sorted by created descending.
+    One warmer runs per CLAUDE_DIR at a time (a CacheLock on WARM_LOCK_FILE);
+    an overlapping run, e.g. from cron, yields nothing.
     """
-    grep_lower = grep_pat.lower() if grep_pat else ""
-    all_entries = []
+    import time
 
-    if scope == "all":
-        for project_dir in all_project_dirs():
-            index_path = project_dir / "sessions-index.json"
-            if index_path.exists():
-                all_entries.extend(load_index(index_path))
-            else:
-                all_entries.extend(build_fallback_index(project_dir))
+    with CacheLock(CLAUDE_DIR / WARM_LOCK_FILE, wait=0) as lock:
+        if not lock.held:
+            return
+        for kind, target, cost in warm_plan(project_dirs, recent_days, kinds):
+            if dry_run:
+                yield kind, target, cost, 0.0
+                continue
+            if budget is not None and not budget.ok():
+                return
+            started = time.monotonic()
+            _warm_task(kind, target, project_dirs)
+            took = time.monotonic() - started
+            if budget is not None:
+                budget.bytes_read += cost
+            yield kind, target, cost, took
+            if 0 < duty < 1:
+                time.sleep(took * (1 - duty) / duty)
+
+
+def _warm_task(kind, target, project_dirs):
+    if kind == "index":
+        build_fallback_index(target)
+    elif kind == "digest":
+        build_digest(target)
+    elif kind == "stats":
+        cached_session_stats([target] + find_subagent_files(target), target.parent, workers=1)
+    elif kind == "catalog":
+        load_catalog()
     else:
-        if scope == "current":
-            target = target or os.getcwd()
-        proj_dir = find_project_dir(target)
-        if not proj_dir:
-            return []
-        index_path = proj_dir / "sessions-index.json"
-        if index_path.exists():
-            all_entries = load_index(index_path)
+        cls, method = [(c, m) for k, _f, c, m in _WARM_STORES if k == kind][0]
+        store = cls(target)
+        try:
+            getattr(store, method)(project_dirs)
+        finally:
+            store.close()
+
+
+# ---------------------------------------------------------------------------
+# Knowledge extraction (one pass per session, incremental per project)
+# ---------------------------------------------------------------------------
+
+KNOWLEDGE_STATE_FILE = ".echo-sleuth-knowledge.json"
+KNOWLEDGE_STATE_VERSION = 1
+
+# User-message heuristics: (category, triggers, pattern). Every match of a
+# pattern contains one of its lower-cased trigger substrings, so most
+# messages are settled by plain substring checks without running a regex.
+_KNOWLEDGE_PATTERNS = (
+    ("url", r"https?://[^\s\)\"'>]+"),
+    ("correction",
+     r"\b(?:no[,.]?\s+(?:don'?t|not|stop|wrong|instead)|don'?t\s+\w+|stop\s+doing"
+     r"|that'?s\s+(?:wrong|incorrect|not right))"),
+    ("approval",
+     r"\b(?:perfect|exactly|great|yes[,.]?\s+(?:that'?s|keep|do it)|works|looks good|nice)"),
+    # A word then whitespace is found from the whitespace, (?<=\w)\s+, which
+    # unlike \b\w+\s+ does not backtrack through every word of the message.
+    ("value",
+     r"(?<=\w)\s+(?:(?:is|are)\s+(?:better|more important|more valuable|preferable)"
+     r"\s+(?:than|over|to)\s"
+     r"|(?:matters?|trumps?|outweighs?|beats?)\s"
+     r"|>\s+\w)"
+     r"|\b(?:prefer\s+\w+\s+(?:over|to|instead of)\s"
+     r"|prioritize\s+\w+\s+over\s"
+     r"|choose\s+\w+\s+over\s"
+     r"|(?:the )?most (?:important|valuable|useful|durable)\s+(?:\w+\s+)?(?:is|are)\s"
+     r"|rather\s+\w+\s+than\s)"),
+)
+
+# One alternation with a named group per category, so a message is scanned
+# once; each match's lastgroup names its category. It is matched against the
+# lowercased message, which is faster than re.IGNORECASE.
+_KNOWLEDGE_PATTERN = "|".join("(?P<%s>%s)" % item for item in _KNOWLEDGE_PATTERNS)
+
+# Only decides where a correction goes, so it is searched only after one.
+_IMPERATIVE_PATTERN = r"\b(?:always|never|must|do not|don'?t ever|every time|make sure)"
+
+
+def _knowledge_item(category, content, timestamp, destination, mem_type):
+    return {
+        "category": category,
+        "content": content,
+        "timestamp": timestamp,
+        "suggested_destination": destination,
+        "suggested_type": mem_type,
+    }
+
+
+def _message_knowledge(text, timestamp, prev_assistant):
+    """Candidate items from one user message."""
+    import re
+
+    lower = text.lower()
+    found = set()
+    spans = []
+    for m in re.finditer(_KNOWLEDGE_PATTERN, lower):
+        if m.lastgroup == "url":
+            spans.append(m.span())
         else:
-            all_entries = build_fallback_index(proj_dir)
+            found.add(m.lastgroup)
+    if len(lower) == len(text):
+        urls = [text[start:end] for start, end in spans]
+    else:  # Lowercasing changed lengths: the spans do not fit the original
+        urls = re.findall(dict(_KNOWLEDGE_PATTERNS)["url"], text, re.IGNORECASE) if spans else []
+
+    items = []
+    if "value" in found:
+        items.append(_knowledge_item("value", text[:300], timestamp, "memory", "value"))
+    if "correction" in found:
+        dest = "claude_md" if re.search(_IMPERATIVE_PATTERN, text, re.IGNORECASE) else "memory"
+        items.append(_knowledge_item("correction", text[:300], timestamp, dest, "feedback"))
+    if "approval" in found and prev_assistant:
+        items.append(_knowledge_item(
+            "pattern", "Approach approved: %s" % prev_assistant[:200],
+            timestamp, "memory", "feedback"))
+    for url in urls:
+        items.append(_knowledge_item(
+            "reference", "URL mentioned: %s" % url, timestamp, "memory", "reference"))
+    return items
+
+
+def _tool_knowledge(call, status, preview):
+    """Candidate item for a finished tool call: a decision or a failure lesson."""
+    ts, name, key = call
+    if name == "AskUserQuestion":
+        return [_knowledge_item(
+            "decision", "Question: %s | Answer: %s" % (key[:200], preview[:200]),
+            ts, "memory", "project")]
+    if status == "error":
+        return [_knowledge_item(
+            "lesson", "Tool %s failed: %s" % (name, preview[:200]), ts, "skip", None)]
+    return []
+
+
+def scan_knowledge(path, offset=0, state=None, lines=None):
+    """
+    Candidate knowledge items from one session, in a single record pass.
+
+    Tool decisions and failures and the user-message heuristics come from
+    the same scan, in record order, starting at byte `offset`. `state` is
+    the dict returned by an earlier call: it carries what spans the
+    watermark (the last assistant text and tool calls still awaiting their
+    result). Returns (items, state); state["offset"] is the end of the last
+    complete line, where the next call should resume. `lines` are the
+    file's (length, bytes) lines from `offset` when already read ahead.
+    """
+    state = state or {}
+    prev = state.get("prev", "")
+    pending = dict(state.get("pending", {}))
+    if lines is not None:
+        items, offset, prev = _knowledge_pass(lines, offset, prev, pending)
+    else:
+        try:
+            f = open_session(path, offset=offset, binary=True)
+        except (OSError, EOFError):
+            return [], dict(state, offset=offset)
+        with f:
+            items, offset, prev = _knowledge_pass(
+                bounded_lines(f, sizes=True), offset, prev, pending)
+
+    return items, {"offset": offset, "prev": prev, "pending": pending}
+
 
-    # Filter
-    filtered = []
-    for e in all_entries:
-        if since and str(e.created)[:10] < since:
+def _knowledge_pass(lines, offset, prev, pending):
+    """
+    scan_knowledge()'s record pass over (length, bytes) lines starting at
+    `offset`. Updates `pending` in place; returns (items, offset, prev).
+    """
+    items = []
+    for n, raw in lines:
+        if not raw.endswith(b"\n"):
+            break  # Partial trailing line: read it next time
+        offset += n
+        if b'"user"' not in raw and b'"assistant"' not in raw:
             continue
-        if grep_lower:
-            haystack = (str(e.summary) + " " + str(e.first_prompt)).lower()
-            if grep_lower not in haystack:
-                continue
-        filtered.append(e)
+        try:
+            d = json.loads(raw.decode("utf-8", errors="replace"))
+        except ValueError:
+            continue
+        if not isinstance(d, dict):
+            continue
+        rec = Record(d)
+        content = rec.content
 
-    # Sort by created descending
-    filtered.sort(key=lambda e: str(e.created), reverse=True)
+        if rec.type == "assistant":
+            if isinstance(content, list):
+                ts = rec.timestamp[:19] if rec.timestamp else ""
+                for block in content:
+                    if not isinstance(block, dict) or block.get("type") != "tool_use":
+                        continue
+                    name = block.get("name", "")
+                    inp = block.get("input", {})
+                    if not isinstance(inp, dict):
+                        inp = {}
+                    pending[block.get("id", "")] = [ts, name, _tool_key(name, inp)]
+            text = _assistant_message_text(rec)
+            if text:
+                prev = text[:500]
+
+        elif rec.type == "user":
+            if isinstance(content, list):
+                for block in content:
+                    if not isinstance(block, dict) or block.get("type") != "tool_result":
+                        continue
+                    call = pending.pop(block.get("tool_use_id", ""), None)
+                    if call is not None:
+                        status = "error" if block.get("is_error", False) else "ok"
+                        items.extend(_tool_knowledge(
+                            call, status, _result_preview(block.get("content", ""))))
+            text = _user_message_text(rec)
+            if len(text) >= 5:
+                items.extend(_message_knowledge(text, rec.timestamp, prev))
 
-    return filtered[:limit]
+    return items, offset, prev
 
 
-# ---------------------------------------------------------------------------
-# Subagent discovery
-# ---------------------------------------------------------------------------
+def knowledge_key(item):
+    """Content hash used to deduplicate items (first 80 characters of content)."""
+    import hashlib
+    return hashlib.sha1(item["content"][:80].encode("utf-8")).hexdigest()[:16]
 
-def find_subagent_files(session_jsonl_path):
-    """
-    Find subagent .jsonl files for a session.
 
-    Returns list of Paths to subagent files.
+def _scan_knowledge_job(job):
+    path, offset, state = job
+    return scan_knowledge(path, offset, state)
+
+
+def extract_project_knowledge(project_dir, workers=0, reset=False, concurrency=0):
     """
-    session_path = Path(session_jsonl_path)
-    session_id = session_path.stem
-    subagent_dir = session_path.parent / session_id / "subagents"
-    if not subagent_dir.exists():
-        return []
-    return sorted(subagent_dir.glob("agent-*.jsonl"))
+    Knowledge candidates from every session in a project, incrementally.
+
+    <project_dir>/.echo-sleuth-knowledge.json keeps a watermark per session
+    (signature, byte offset and scan_knowledge() state) and the content
+    hashes of every item reported so far. Only sessions that changed are
+    scanned, from their watermark, in parallel when there is enough new
+    data; items whose hash was already reported, by any session in any
+    earlier run, are dropped. reset=True forgets the state first.
+
+    Returns new items in session-file order, each with a session_id key.
+    Runs hold a CacheLock on the state file, so concurrent runs never report
+    the same item twice. When the scan is serial, concurrency > 0 reads that
+    many sessions ahead (see iter_many()).
+    """
+    state_path = Path(project_dir) / KNOWLEDGE_STATE_FILE
+    with CacheLock(state_path):
+        return _extract_project_knowledge(Path(project_dir), state_path, workers, reset,
+                                          concurrency)
+
+
+def _extract_project_knowledge(project_dir, state_path, workers, reset, concurrency=0):
+    data = {} if reset else read_cache(state_path, KNOWLEDGE_STATE_VERSION) or {}
+    sessions = data.get("sessions", {})
+    seen = set(data.get("seen", []))
+
+    jobs = []
+    new_bytes = 0
+    for path in iter_session_files(project_dir):
+        sig = session_signature(path)
+        if sig is None:
+            continue
+        sid = session_file_id(path)
+        prev = sessions.get(sid) or {}
+        if prev.get("sig") == sig:
+            continue
+        scan = prev.get("scan") or {}
+        offset = scan.get("offset", 0)
+        if offset > sig[1]:
+            offset, scan = 0, {}  # Shrank: rewritten, scan it again
+        jobs.append((sid, sig, (str(path), offset, scan)))
+        new_bytes += sig[1] - offset
+
+    if concurrency > 0 and len(jobs) > 1 and (new_bytes < _PARALLEL_MIN_BYTES or workers == 1):
+        ahead = _iter_many_lines([(path, offset) for _, _, (path, offset, _) in jobs],
+                                 concurrency)
+        try:
+            results = [
+                scan_knowledge(path, offset, scan, lines if lines is not None else ())
+                for (_, _, (path, offset, scan)), (_, lines) in zip(jobs, ahead)
+            ]
+        finally:
+            ahead.close()
+    else:
+        results = _parallel_map(
+            _scan_knowledge_job, [job for _, _, job in jobs],
+            workers=workers if new_bytes >= _PARALLEL_MIN_BYTES else 1,
+        )
+
+    found = []
+    for (sid, sig, _), (items, scan) in zip(jobs, results):
+        sessions[sid] = {"sig": sig, "scan": scan}
+        for item in items:
+            key = knowledge_key(item)
+            if key in seen:
+                continue
+            seen.add(key)
+            item["session_id"] = sid
+            found.append(item)
+
+    if jobs:
+        # Write failure is non-fatal; the next run rescans
+        write_cache(state_path, {"sessions": sessions, "seen": sorted(seen)},
+                    KNOWLEDGE_STATE_VERSION)
+    return found
 
 
 # ---------------------------------------------------------------------------
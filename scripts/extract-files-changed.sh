@@ -1,21 +1,42 @@
 #!/usr/bin/env bash
 # extract-files-changed.sh — List all files edited during a session
-# Usage: extract-files-changed.sh <file.jsonl> [--with-versions]
+# Usage: extract-files-changed.sh <file.jsonl> [--with-versions | --timeline]
 #
 # Output format:
 #   FILE_PATH  [VERSION_COUNT]
 #
-# Uses reverse-read on large files to find the last snapshot efficiently.
+# Uses reverse-read on large files to find the last snapshot efficiently, or
+# the session's digest (.echo-sleuth-digests/ beside it) for sessions >= 1MB
+# when a fresh one exists; this script never builds one.
+#
+# --timeline: every version change from all snapshots, in session order:
+#   TIMESTAMP  FILE_PATH  PREVIOUS_VERSION  VERSION  MESSAGE_ID
+#   (PREVIOUS_VERSION is 0 when the file is first tracked)
 
 set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
-FILE="${1:?Usage: extract-files-changed.sh <file.jsonl> [--with-versions]}"
+FILE="${1:?Usage: extract-files-changed.sh <file.jsonl> [--with-versions | --timeline]}"
+shift
+
 WITH_VERSIONS=0
-[[ "${2:-}" == "--with-versions" ]] && WITH_VERSIONS=1
+TIMELINE=0
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --with-versions) WITH_VERSIONS=1; shift ;;
+    --timeline) TIMELINE=1; shift ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
 
-ES_FILE="$FILE" ES_VERSIONS="$WITH_VERSIONS" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+if [[ "$WITH_VERSIONS" -eq 1 && "$TIMELINE" -eq 1 ]]; then
+  echo "ERROR: --timeline cannot be combined with --with-versions" >&2
+  exit 1
+fi
+
+ES_FILE="$FILE" ES_VERSIONS="$WITH_VERSIONS" ES_TIMELINE="$TIMELINE" ES_SCRIPT_DIR="$SCRIPT_DIR" \
 python3 << 'PYEOF'
 import os, sys
 sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
@@ -24,6 +45,17 @@ import echolib
 file_path = os.environ["ES_FILE"]
 with_ver = os.environ.get("ES_VERSIONS", "0") == "1"
 
+if os.environ.get("ES_TIMELINE", "0") == "1":
+    n = 0
+    for t in echolib.extract_file_timeline(file_path):
+        print("{}\t{}\t{}\t{}\t{}".format(
+            t["timestamp"], echolib._sanitize_tsv(t["file"]),
+            t["previous"], t["version"], t["message_id"]))
+        n += 1
+    if not n:
+        print("(no files changed in this session)", file=sys.stderr)
+    sys.exit(0)
+
 files = echolib.extract_files_changed(file_path, with_versions=with_ver)
 if not files:
     print("(no files changed in this session)", file=sys.stderr)
@@ -1,135 +1,80 @@
 #!/usr/bin/env bash
-# extract-knowledge.sh — Two-pass knowledge extraction from a session
+# extract-knowledge.sh — Knowledge extraction from one session or a whole project
 # Usage: bash extract-knowledge.sh <session-jsonl-path>
+#        bash extract-knowledge.sh --project [project-path|current] [--workers N] [--reset]
+#        [--io-concurrency N]
 #
-# Runs extract_tools() and extract_messages() to identify extractable items.
+# Scans tool calls (AskUserQuestion decisions, tool errors) and user messages
+# (corrections, approvals, values, URLs) in a single pass per session.
 # Output: JSON array of candidate items.
+#
+# --project: every session in the project, scanned in parallel. A watermark
+#   per session in <project-dir>/.echo-sleuth-knowledge.json means only
+#   records appended since the last run are examined, and items already
+#   reported (by content hash, across all sessions) are not repeated. Each
+#   item gains a session_id. --reset forgets the watermarks and hashes.
+#   --io-concurrency N reads up to N sessions ahead when the scan runs in one
+#   process, overlapping opens and reads on slow or network-mounted storage.
 
 set -euo pipefail
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
-SESSION_PATH="${1:?Usage: extract-knowledge.sh <session.jsonl>}"
-
-python3 - "$SESSION_PATH" "$SCRIPT_DIR" <<'PYEOF'
-import os, sys, json, re
-session_path = sys.argv[1]
-sys.path.insert(0, sys.argv[2])
-import echolib
-
-items = []
-
-# Pass 1: Tool calls — find AskUserQuestion decisions and errors
-for tool in echolib.extract_tools(session_path):
-    if tool["name"] == "AskUserQuestion":
-        items.append({
-            "category": "decision",
-            "content": "Question: %s | Answer: %s" % (
-                tool.get("key_input", "")[:200],
-                tool.get("result_preview", "")[:200]
-            ),
-            "timestamp": tool.get("timestamp", ""),
-            "suggested_destination": "memory",
-            "suggested_type": "project",
-        })
-    elif tool.get("status") == "error":
-        items.append({
-            "category": "lesson",
-            "content": "Tool %s failed: %s" % (
-                tool["name"],
-                tool.get("result_preview", "")[:200]
-            ),
-            "timestamp": tool.get("timestamp", ""),
-            "suggested_destination": "skip",
-            "suggested_type": None,
-        })
+USAGE="Usage: extract-knowledge.sh <session.jsonl> | --project [project-path|current] [--workers N] [--reset] [--io-concurrency N]"
 
-# Pass 2: Messages — find corrections, patterns, references
-correction_patterns = re.compile(
-    r"\b(no[,.]?\s+(?:don'?t|not|stop|wrong|instead))|"
-    r"\b(don'?t\s+\w+)|"
-    r"\b(stop\s+doing)|"
-    r"\b(that'?s\s+(?:wrong|incorrect|not right))",
-    re.IGNORECASE
-)
-approval_patterns = re.compile(
-    r"\b(perfect|exactly|great|yes[,.]?\s+(?:that'?s|keep|do it)|works|looks good|nice)",
-    re.IGNORECASE
-)
-imperative_patterns = re.compile(
-    r"\b(always|never|must|do not|don'?t ever|every time|make sure)",
-    re.IGNORECASE
-)
-url_pattern = re.compile(r"https?://[^\s\)\"'>]+")
+TARGET="${1:?$USAGE}"
+shift
+PROJECT=""
+WORKERS=0
+RESET=0
+IO_CONCURRENCY=0
 
-value_patterns = re.compile(
-    r"\b(\w+\s+(?:is|are)\s+(?:better|more important|more valuable|preferable)\s+(?:than|over|to)\s+)|"
-    r"\b(prefer\s+\w+\s+(?:over|to|instead of)\s+)|"
-    r"\b(prioritize\s+\w+\s+over\s+)|"
-    r"\b(\w+\s+(?:matters?|trumps?|outweighs?|beats?)\s+(?:more than\s+)?)|"
-    r"\b(choose\s+\w+\s+over\s+)|"
-    r"\b((?:the )?most (?:important|valuable|useful|durable)\s+(?:\w+\s+)?(?:is|are)\s+)|"
-    r"\b(rather\s+\w+\s+than\s+)|"
-    r"\b(\w+\s+>\s+\w+)",
-    re.IGNORECASE
-)
+if [[ "$TARGET" == "--project" ]]; then
+  PROJECT="current"
+  if [[ $# -gt 0 && "${1}" != --* ]]; then
+    PROJECT="$1"
+    shift
+  fi
+fi
 
-prev_assistant_text = ""
-for msg in echolib.extract_messages(session_path, role="both"):
-    text = msg.get("text", "")
-    if not text or len(text) < 5:
-        if msg.get("role") == "assistant":
-            prev_assistant_text = text or ""
-        continue
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --workers) WORKERS="$2"; shift 2 ;;
+    --reset) RESET=1; shift ;;
+    --io-concurrency) IO_CONCURRENCY="$2"; shift 2 ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
 
-    if msg.get("role") == "assistant":
-        prev_assistant_text = text[:500]
-        continue
+if ! [[ "$WORKERS" =~ ^[0-9]+$ && "$IO_CONCURRENCY" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --workers and --io-concurrency must be numbers" >&2
+  exit 1
+fi
 
-    # User messages below
-    if value_patterns.search(text):
-        items.append({
-            "category": "value",
-            "content": text[:300],
-            "timestamp": msg.get("timestamp", ""),
-            "suggested_destination": "memory",
-            "suggested_type": "value",
-        })
-
-    if correction_patterns.search(text):
-        dest = "claude_md" if imperative_patterns.search(text) else "memory"
-        items.append({
-            "category": "correction",
-            "content": text[:300],
-            "timestamp": msg.get("timestamp", ""),
-            "suggested_destination": dest,
-            "suggested_type": "feedback",
-        })
-
-    if approval_patterns.search(text) and prev_assistant_text:
-        items.append({
-            "category": "pattern",
-            "content": "Approach approved: %s" % prev_assistant_text[:200],
-            "timestamp": msg.get("timestamp", ""),
-            "suggested_destination": "memory",
-            "suggested_type": "feedback",
-        })
-
-    for url in url_pattern.findall(text):
-        items.append({
-            "category": "reference",
-            "content": "URL mentioned: %s" % url,
-            "timestamp": msg.get("timestamp", ""),
-            "suggested_destination": "memory",
-            "suggested_type": "reference",
-        })
+ES_TARGET="$TARGET" ES_PROJECT="$PROJECT" ES_CWD="$(pwd)" ES_WORKERS="$WORKERS" \
+ES_RESET="$RESET" ES_IO_CONCURRENCY="$IO_CONCURRENCY" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 <<'PYEOF'
+import os, sys, json
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
 
-# Deduplicate by content prefix
-seen = set()
-unique_items = []
-for item in items:
-    key = item["content"][:80]
-    if key not in seen:
-        seen.add(key)
-        unique_items.append(item)
+project = os.environ.get("ES_PROJECT", "")
+if project:
+    target = os.environ["ES_CWD"] if project == "current" else project
+    proj_dir = echolib.find_project_dir(target)
+    if not proj_dir:
+        echolib.cli_error("No Claude session directory found for " + target)
+    items = echolib.extract_project_knowledge(
+        proj_dir, workers=int(os.environ.get("ES_WORKERS", "0")),
+        reset=os.environ.get("ES_RESET", "0") == "1",
+        concurrency=int(os.environ.get("ES_IO_CONCURRENCY", "0")))
+else:
+    # Deduplicate by content hash within the session
+    items = []
+    seen = set()
+    for item in echolib.scan_knowledge(os.environ["ES_TARGET"])[0]:
+        key = echolib.knowledge_key(item)
+        if key not in seen:
+            seen.add(key)
+            items.append(item)
 
-json.dump(unique_items, sys.stdout, indent=2)
+json.dump(items, sys.stdout, indent=2)
 PYEOF
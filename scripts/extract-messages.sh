@@ -1,11 +1,25 @@
 #!/usr/bin/env bash
 # extract-messages.sh — Extract human-readable messages from a .jsonl session file
 # Usage: extract-messages.sh <file.jsonl> [--role user|assistant|both] [--no-tools] [--limit N] [--thinking [LIMIT]]
+#        [--deadline SECONDS] [--max-bytes N] [--resume OFFSET] [--dedup]
 #
 # Output format:
 #   === [ROLE] [TIMESTAMP] ===
 #   message text
 #   ---
+#
+# --deadline / --max-bytes: stop after that much wall-clock time or that many
+#   bytes read, and print "# TRUNCATED: ... resume with --resume OFFSET" as the
+#   last line. Passing that OFFSET back continues where the scan stopped.
+#
+# --dedup: only messages first seen in this session. The history a resumed
+#   session repeats from an earlier one is skipped (per-project uuid registry
+#   in <project-dir>/.echo-sleuth-uuids.sqlite, updated incrementally).
+#
+# Sessions of 1MB or more are read from their digest (.echo-sleuth-digests/
+# beside the session) when a fresh one exists, unless --thinking, --dedup,
+# --resume or a budget is given. This script never builds one; warm-caches.sh
+# does, in the background.
 
 set -euo pipefail
 
@@ -18,6 +32,10 @@ ROLE="both"
 NO_TOOLS=0
 LIMIT=0
 THINKING_LIMIT=-1  # 0 = full, -1 = hide (default: hide)
+DEADLINE=0
+MAX_BYTES=0
+RESUME=0
+DEDUP=0
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
@@ -32,6 +50,10 @@ while [[ $# -gt 0 ]]; do
         THINKING_LIMIT=0; shift
       fi
       ;;
+    --deadline) DEADLINE="$2"; shift 2 ;;
+    --max-bytes) MAX_BYTES="$2"; shift 2 ;;
+    --resume) RESUME="$2"; shift 2 ;;
+    --dedup) DEDUP=1; shift ;;
     *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
   esac
 done
@@ -44,9 +66,14 @@ if ! [[ "$LIMIT" =~ ^[0-9]+$ ]]; then
   echo "ERROR: --limit must be a number" >&2
   exit 1
 fi
+if ! [[ "$DEADLINE" =~ ^[0-9]+(\.[0-9]+)?$ && "$MAX_BYTES" =~ ^[0-9]+$ && "$RESUME" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --deadline must be seconds; --max-bytes and --resume must be numbers" >&2
+  exit 1
+fi
 
 ES_FILE="$FILE" ES_ROLE="$ROLE" ES_NO_TOOLS="$NO_TOOLS" ES_LIMIT="$LIMIT" \
-ES_THINKING="$THINKING_LIMIT" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+ES_THINKING="$THINKING_LIMIT" ES_DEADLINE="$DEADLINE" ES_MAX_BYTES="$MAX_BYTES" \
+ES_RESUME="$RESUME" ES_DEDUP="$DEDUP" ES_SCRIPT_DIR="$SCRIPT_DIR" \
 python3 << 'PYEOF'
 import os, sys
 sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
@@ -57,10 +84,23 @@ role = os.environ.get("ES_ROLE", "both")
 no_tools = os.environ.get("ES_NO_TOOLS", "0") == "1"
 limit = int(os.environ.get("ES_LIMIT", "0"))
 thinking_limit = int(os.environ.get("ES_THINKING", "-1"))
+budget = None
+deadline = float(os.environ.get("ES_DEADLINE", "0"))
+max_bytes = int(os.environ.get("ES_MAX_BYTES", "0"))
+if deadline or max_bytes:
+    budget = echolib.ScanBudget(seconds=deadline, max_bytes=max_bytes)
+dedup = None
+if os.environ.get("ES_DEDUP", "0") == "1":
+    dedup = echolib.uuid_registry(file_path)
 
 for msg in echolib.extract_messages(file_path, role=role, no_tools=no_tools,
-                                      limit=limit, thinking_limit=thinking_limit):
+                                      limit=limit, thinking_limit=thinking_limit,
+                                      offset=int(os.environ.get("ES_RESUME", "0")),
+                                      budget=budget, dedup=dedup):
     print("=== [{}] [{}] ===".format(msg["role"], msg["timestamp"]))
     print(msg["text"])
     print("---")
+
+if budget is not None and budget.exhausted:
+    print(budget.marker())
 PYEOF
@@ -1,26 +1,66 @@
 #!/usr/bin/env bash
 # extract-tools.sh — Extract tool calls and their results from a .jsonl session
 # Usage: extract-tools.sh <file.jsonl> [--tool NAME] [--errors-only] [--limit N]
+#        [--follow [--poll SECONDS] [--idle-timeout SECONDS]]
+#        [--deadline SECONDS] [--max-bytes N] [--resume OFFSET] [--dedup] [--full-results]
 #
 # Output format (tab-separated):
 #   TIMESTAMP  TOOL_NAME  STATUS  KEY_INPUT  RESULT_PREVIEW
+#
+# --follow: watch a live session and print each call as soon as its result
+#   is appended (e.g. --follow --errors-only for new tool errors). Only new
+#   bytes are read on each poll (default every 1s); --idle-timeout exits after
+#   that many seconds without new lines (default 0 = never).
+#
+# --deadline / --max-bytes: stop after that much wall-clock time or that many
+#   bytes read, and print "# TRUNCATED: ... resume with --resume OFFSET" as the
+#   last line. Calls whose result lies past the cut-off are not printed.
+#
+# --dedup: only calls first seen in this session, skipping the history a
+#   resumed session repeats (see extract-messages.sh --dedup).
+#
+# --full-results: RESULT_PREVIEW becomes the whole result text, with
+#   backslashes, tabs and newlines escaped as \\, \t and \n.
+#
+# Sessions of 1MB or more are read from their digest (.echo-sleuth-digests/
+# beside the session) when a fresh one exists, unless --follow, --dedup,
+# --resume or a budget is given. This script never builds one; warm-caches.sh
+# does, in the background.
+# Full results served from a digest come from the project's blob store
+# (.echo-sleuth-blobs.sqlite), where each distinct result is stored once.
 
 set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
-FILE="${1:?Usage: extract-tools.sh <file.jsonl> [--tool NAME] [--errors-only] [--limit N]}"
+FILE="${1:?Usage: extract-tools.sh <file.jsonl> [--tool NAME] [--errors-only] [--limit N] [--follow]}"
 shift
 
 TOOL_FILTER=""
 ERRORS_ONLY=0
 LIMIT=0
+FOLLOW=0
+POLL=1
+IDLE_TIMEOUT=0
+DEADLINE=0
+MAX_BYTES=0
+RESUME=0
+DEDUP=0
+FULL_RESULTS=0
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
     --tool) TOOL_FILTER="$2"; shift 2 ;;
     --errors-only) ERRORS_ONLY=1; shift ;;
     --limit) LIMIT="$2"; shift 2 ;;
+    --follow) FOLLOW=1; shift ;;
+    --poll) POLL="$2"; shift 2 ;;
+    --idle-timeout) IDLE_TIMEOUT="$2"; shift 2 ;;
+    --deadline) DEADLINE="$2"; shift 2 ;;
+    --max-bytes) MAX_BYTES="$2"; shift 2 ;;
+    --resume) RESUME="$2"; shift 2 ;;
+    --dedup) DEDUP=1; shift ;;
+    --full-results) FULL_RESULTS=1; shift ;;
     *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
   esac
 done
@@ -29,9 +69,23 @@ if ! [[ "$LIMIT" =~ ^[0-9]+$ ]]; then
   echo "ERROR: --limit must be a number" >&2
   exit 1
 fi
+if ! [[ "$POLL" =~ ^[0-9]+(\.[0-9]+)?$ && "$IDLE_TIMEOUT" =~ ^[0-9]+(\.[0-9]+)?$ ]]; then
+  echo "ERROR: --poll and --idle-timeout must be numbers of seconds" >&2
+  exit 1
+fi
+if ! [[ "$DEADLINE" =~ ^[0-9]+(\.[0-9]+)?$ && "$MAX_BYTES" =~ ^[0-9]+$ && "$RESUME" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --deadline must be seconds; --max-bytes and --resume must be numbers" >&2
+  exit 1
+fi
+if [[ "$FOLLOW" -eq 1 && ( "$DEADLINE" != "0" || "$MAX_BYTES" != "0" ) ]]; then
+  echo "ERROR: --follow cannot be combined with --deadline or --max-bytes" >&2
+  exit 1
+fi
 
 ES_FILE="$FILE" ES_TOOL="$TOOL_FILTER" ES_ERRORS="$ERRORS_ONLY" ES_LIMIT="$LIMIT" \
-ES_SCRIPT_DIR="$SCRIPT_DIR" \
+ES_FOLLOW="$FOLLOW" ES_POLL="$POLL" ES_IDLE_TIMEOUT="$IDLE_TIMEOUT" \
+ES_DEADLINE="$DEADLINE" ES_MAX_BYTES="$MAX_BYTES" ES_RESUME="$RESUME" ES_DEDUP="$DEDUP" \
+ES_FULL_RESULTS="$FULL_RESULTS" ES_SCRIPT_DIR="$SCRIPT_DIR" \
 python3 << 'PYEOF'
 import os, sys
 sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
@@ -41,10 +95,35 @@ file_path = os.environ["ES_FILE"]
 tool_filter = os.environ.get("ES_TOOL", "")
 errors_only = os.environ.get("ES_ERRORS", "0") == "1"
 limit = int(os.environ.get("ES_LIMIT", "0"))
+follow = os.environ.get("ES_FOLLOW", "0") == "1"
+full_results = os.environ.get("ES_FULL_RESULTS", "0") == "1"
+budget = None
+deadline = float(os.environ.get("ES_DEADLINE", "0"))
+max_bytes = int(os.environ.get("ES_MAX_BYTES", "0"))
+if deadline or max_bytes:
+    budget = echolib.ScanBudget(seconds=deadline, max_bytes=max_bytes)
+dedup = None
+if os.environ.get("ES_DEDUP", "0") == "1":
+    dedup = echolib.uuid_registry(file_path)
+
+try:
+    for t in echolib.extract_tools(file_path, tool_filter=tool_filter,
+                                     errors_only=errors_only, limit=limit,
+                                     follow=follow,
+                                     poll=float(os.environ.get("ES_POLL", "1")),
+                                     idle_timeout=float(os.environ.get("ES_IDLE_TIMEOUT", "0")),
+                                     offset=int(os.environ.get("ES_RESUME", "0")),
+                                     budget=budget, dedup=dedup,
+                                     full_results=full_results):
+        result = t["result_preview"]
+        if full_results:
+            result = t["result"].replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+        print("{}\t{}\t{}\t{}\t{}".format(
+            t["timestamp"], t["name"], t["status"],
+            t["key_input"], result), flush=follow)
+except KeyboardInterrupt:
+    pass
 
-for t in echolib.extract_tools(file_path, tool_filter=tool_filter,
-                                 errors_only=errors_only, limit=limit):
-    print("{}\t{}\t{}\t{}\t{}".format(
-        t["timestamp"], t["name"], t["status"],
-        t["key_input"], t["result_preview"]))
+if budget is not None and budget.exhausted:
+    print(budget.marker())
 PYEOF
@@ -1,9 +1,14 @@
 #!/usr/bin/env bash
 # git-context.sh — Structured git context dump for Claude to reason about
 # Usage: git-context.sh [repo-path] [--since "7 days ago"] [--limit 30]
+#
+# All sections are served from one parsed commit list (git_commits() in
+# echolib), cached per repo in <git-dir>/echo-sleuth-commits.json keyed by HEAD.
 
 set -euo pipefail
 
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
 # Parse repo path: only consume first arg if it's not a flag
 REPO="."
 if [[ $# -gt 0 && "${1}" != --* ]]; then
@@ -43,25 +48,38 @@ echo "# Branch: $(git -C "$REPO" branch --show-current 2>/dev/null || echo 'deta
 echo "# Generated: $(date -u +%Y-%m-%dT%H:%M:%SZ)"
 echo ""
 
-echo "## Commit Activity"
-git -C "$REPO" log --pretty=format:"%ai" --since="$SINCE" 2>/dev/null | \
-  cut -c1-10 | sort | uniq -c | sort -k2 || true
-echo ""
+ES_REPO="$REPO" ES_SINCE="$SINCE" ES_LIMIT="$LIMIT" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
 
-echo ""
-echo "## Hotspot Files (most changed)"
-git -C "$REPO" log --name-only --pretty=format: --since="$SINCE" 2>/dev/null | \
-  grep -v '^$' | sort | uniq -c | sort -rn | head -15 || true
-echo ""
+limit = int(os.environ.get("ES_LIMIT", "30"))
+commits = echolib.git_commits(os.environ["ES_REPO"], since=os.environ.get("ES_SINCE", ""))
 
-echo ""
-echo "## Recent Commits"
-git -C "$REPO" log \
-  --pretty=format:"---
-hash: %h
-date: %ai
-subject: %s
-body: %b" \
-  --numstat \
-  --since="$SINCE" \
-  -n "$LIMIT" 2>/dev/null || true
+print("## Commit Activity")
+for day, n in echolib.commit_activity(commits):
+    print("{:7d} {}".format(n, day))
+print("")
+
+print("")
+print("## Hotspot Files (most changed)")
+for n, path in echolib.hotspot_files(commits, top=15):
+    print("{:7d} {}".format(n, path))
+print("")
+
+print("")
+print("## Recent Commits")
+for c in commits[:limit]:
+    print("---")
+    print("hash: {}".format(c["short"]))
+    print("date: {}".format(c["date"]))
+    print("subject: {}".format(c["subject"]))
+    print("body: {}".format(c["body"]))
+    if c["numstat"]:
+        print("")
+        for added, deleted, path in c["numstat"]:
+            print("{}\t{}\t{}".format(
+                "-" if added is None else added,
+                "-" if deleted is None else deleted, path))
+PYEOF
@@ -8,7 +8,8 @@
 #     HASH  SUBJECT
 #     FILES: file1.ext, file2.ext, ...
 #
-# Uses Python for cross-platform consistency (no awk dependency).
+# Uses Python for cross-platform consistency (no awk dependency). Commits come
+# from the same per-repo cache as git-context.sh (see git_commits() in echolib).
 
 set -euo pipefail
 
@@ -42,61 +43,16 @@ if ! git -C "$REPO" rev-parse --git-dir &>/dev/null; then
   exit 1
 fi
 
-# Save git output to temp file to avoid pipe/heredoc stdin conflict
-ES_TMPFILE=$(mktemp)
-trap 'rm -f "$ES_TMPFILE"' EXIT
+ES_REPO="$REPO" ES_SINCE="$SINCE" ES_GAP="$GAP" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
 
-git -C "$REPO" log \
-  --pretty=format:"%at%x1f%ai%x1f%h%x1f%s" \
-  --name-only \
-  --since="$SINCE" > "$ES_TMPFILE"
+gap = echolib.parse_int_or_die(os.environ.get("ES_GAP", "3600"), "--gap")
+commits = echolib.git_commits(os.environ["ES_REPO"], since=os.environ.get("ES_SINCE", ""))
 
-ES_GAP="$GAP" ES_INPUT="$ES_TMPFILE" python3 << 'PYEOF'
-import sys, os
-
-gap = int(os.environ.get("ES_GAP", "3600"))
-input_file = os.environ["ES_INPUT"]
-
-sessions = []
-current = None
-
-with open(input_file, encoding="utf-8", errors="replace") as f:
-    for raw_line in f:
-        line = raw_line.rstrip("\n")
-
-        # Commit header line (has unit separator)
-        if "\x1f" in line:
-            parts = line.split("\x1f", 3)
-            if len(parts) >= 4:
-                try:
-                    ts = int(parts[0])
-                except ValueError:
-                    continue
-                date_str = parts[1][:16]
-                hash_val = parts[2]
-                subject = parts[3]
-
-                # Check if we need a new session
-                if current is None or (current["prev_ts"] - ts) > gap:
-                    if current is not None:
-                        sessions.append(current)
-                    current = {
-                        "date": date_str,
-                        "commits": [],
-                        "files": set(),
-                        "prev_ts": ts,
-                    }
-                current["commits"].append((hash_val, subject))
-                current["prev_ts"] = ts
-        elif line.strip():
-            # File name line
-            if current is not None:
-                current["files"].add(line.strip())
-
-if current is not None:
-    sessions.append(current)
-
-for i, s in enumerate(sessions, 1):
+for i, s in enumerate(echolib.cluster_commits(commits, gap=gap), 1):
     print("--- SESSION {} ({}, {} commits) ---".format(i, s["date"], len(s["commits"])))
     for h, subj in s["commits"]:
         print("  {}  {}".format(h, subj))
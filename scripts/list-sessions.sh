@@ -1,11 +1,36 @@
 #!/usr/bin/env bash
 # list-sessions.sh — List sessions from sessions-index.json + fallback index
 # Usage: list-sessions.sh [project-path|"all"|"current"] [--limit N] [--since YYYY-MM-DD] [--grep PATTERN]
+#        [--deadline SECONDS] [--max-bytes N] [--io-concurrency N] [--stream]
+#        [--roots DIR:DIR...]
 #
 # Output format (tab-separated):
 #   SESSION_ID  CREATED  MODIFIED  MSG_COUNT  BRANCH  SUMMARY  FIRST_PROMPT  PROJECT_PATH  FULL_PATH
 #
+# MSG_COUNT counts every message in the transcript, including the history a
+# resumed session repeats (as sessions-index.json does); use
+# session-stats.sh --project --dedup for counts that take each record once.
+#
 # Now covers ALL projects — builds fallback index for projects without sessions-index.json.
+#
+# --deadline / --max-bytes: bound the transcript reads spent building fallback
+#   indexes. When the budget runs out the sessions indexed so far are listed,
+#   followed by a "# TRUNCATED: ..." line; finished work is cached, so rerunning
+#   continues from where the scan stopped.
+#
+# --io-concurrency: read up to N session files ahead while building fallback
+#   indexes, overlapping their opens and reads. Helps on slow or network-
+#   mounted home directories; the default 0 reads files one at a time.
+#
+# --stream (scope "all" only): print each session as soon as it is known to be
+#   next in newest-first order, reading projects newest first by the newest
+#   mtime of their session files and stopping after --limit rows, instead of loading every project's
+#   index into the global catalog first. Same rows, same order.
+#
+# --roots (scope "all" only; default $ECHO_SLEUTH_ROOTS): colon-separated
+#   session trees, e.g. projects directories collected from several machines.
+#   Each root keeps its own catalog and indexes; the roots are listed in
+#   parallel and their rows merged newest first. Budgets apply per root.
 
 set -euo pipefail
 
@@ -21,12 +46,22 @@ fi
 LIMIT=50
 SINCE=""
 GREP_PAT=""
+DEADLINE=0
+MAX_BYTES=0
+IO_CONCURRENCY=0
+STREAM=0
+ROOTS="${ECHO_SLEUTH_ROOTS:-}"
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
     --limit) LIMIT="$2"; shift 2 ;;
     --since) SINCE="$2"; shift 2 ;;
     --grep)  GREP_PAT="$2"; shift 2 ;;
+    --deadline) DEADLINE="$2"; shift 2 ;;
+    --max-bytes) MAX_BYTES="$2"; shift 2 ;;
+    --io-concurrency) IO_CONCURRENCY="$2"; shift 2 ;;
+    --stream) STREAM=1; shift ;;
+    --roots) ROOTS="$2"; shift 2 ;;
     *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
   esac
 done
@@ -35,9 +70,25 @@ if ! [[ "$LIMIT" =~ ^[0-9]+$ ]]; then
   echo "ERROR: --limit must be a number, got: $LIMIT" >&2
   exit 1
 fi
+if ! [[ "$DEADLINE" =~ ^[0-9]+(\.[0-9]+)?$ && "$MAX_BYTES" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --deadline must be seconds and --max-bytes a number" >&2
+  exit 1
+fi
+if ! [[ "$IO_CONCURRENCY" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --io-concurrency must be a number, got: $IO_CONCURRENCY" >&2
+  exit 1
+fi
+if [[ "$STREAM" -eq 1 && "$SCOPE" != "all" ]]; then
+  echo "ERROR: --stream requires scope 'all'" >&2
+  exit 1
+fi
+if [[ "$STREAM" -eq 1 && -n "$ROOTS" ]]; then
+  echo "ERROR: --stream reads a single root; unset --roots / ECHO_SLEUTH_ROOTS" >&2
+  exit 1
+fi
 
 ES_SCOPE="$SCOPE" ES_TARGET="$(pwd)" ES_LIMIT="$LIMIT" ES_SINCE="$SINCE" ES_GREP="$GREP_PAT" \
-ES_SCRIPT_DIR="$SCRIPT_DIR" \
+ES_DEADLINE="$DEADLINE" ES_MAX_BYTES="$MAX_BYTES" ES_IO_CONCURRENCY="$IO_CONCURRENCY" ES_STREAM="$STREAM" ES_ROOTS="$ROOTS" ES_SCRIPT_DIR="$SCRIPT_DIR" \
 python3 << 'PYEOF'
 import os, sys
 sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
@@ -48,17 +99,39 @@ target = os.environ.get("ES_TARGET", "")
 limit = int(os.environ.get("ES_LIMIT", "50"))
 since = os.environ.get("ES_SINCE", "")
 grep_pat = os.environ.get("ES_GREP", "")
+budget = None
+deadline = float(os.environ.get("ES_DEADLINE", "0"))
+max_bytes = int(os.environ.get("ES_MAX_BYTES", "0"))
+if deadline or max_bytes:
+    budget = echolib.ScanBudget(seconds=deadline, max_bytes=max_bytes)
+concurrency = int(os.environ.get("ES_IO_CONCURRENCY", "0"))
+
+if os.environ.get("ES_STREAM", "0") == "1":
+    for e in echolib.stream_sessions(since=since, limit=limit, grep_pat=grep_pat,
+                                     budget=budget, concurrency=concurrency):
+        print(e.to_tsv(), flush=True)
+    if budget is not None and budget.exhausted:
+        print(budget.marker())
+    sys.exit(0)
 
-if scope in ("current", "all"):
-    entries = echolib.list_sessions(scope=scope, target=target, limit=limit, since=since, grep_pat=grep_pat)
+if scope == "all" and os.environ.get("ES_ROOTS", ""):
+    entries = echolib.corpus_sessions(roots=os.environ["ES_ROOTS"], since=since, limit=limit,
+                                      grep_pat=grep_pat, budget=budget, concurrency=concurrency)
+elif scope in ("current", "all"):
+    entries = echolib.list_sessions(scope=scope, target=target, limit=limit, since=since,
+                                    grep_pat=grep_pat, budget=budget, concurrency=concurrency)
 else:
-    entries = echolib.list_sessions(scope="path", target=scope, limit=limit, since=since, grep_pat=grep_pat)
+    entries = echolib.list_sessions(scope="path", target=scope, limit=limit, since=since,
+                                    grep_pat=grep_pat, budget=budget, concurrency=concurrency)
 
-if not entries and scope == "current":
+if not entries and scope == "current" and not (budget is not None and budget.exhausted):
     print("ERROR: No Claude session directory found for " + target, file=sys.stderr)
     print("Hint: try 'list-sessions.sh all' to search all projects", file=sys.stderr)
     sys.exit(1)
 
 for e in entries:
     print(e.to_tsv())
+
+if budget is not None and budget.exhausted:
+    print(budget.marker())
 PYEOF
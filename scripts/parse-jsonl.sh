@@ -2,22 +2,48 @@
 # parse-jsonl.sh — High-performance JSONL parser with pre-filtering and schema awareness
 # Usage: parse-jsonl.sh <file.jsonl> [--types user,assistant] [--skip-noise] [--limit N]
 #        [--fields type,timestamp,message] [--format lines|json|tsv] [--detect-schema]
+#        [--follow [--poll SECONDS] [--idle-timeout SECONDS]]
+#        parse-jsonl.sh --schema-drift [--since-version VERSION]
 #
 # This is the canonical parser. All other extract-* scripts are convenience wrappers.
+#
+# --follow keeps polling for appended records (lines/tsv formats only) until
+# interrupted, or until --idle-timeout seconds pass without new lines.
+#
+# --schema-drift: update the cross-corpus schema registry
+#   (~/.claude/projects/.echo-sleuth-schema.sqlite; only bytes appended since
+#   the last run are read) and print each record type or field in the first
+#   client version that used it, tab-separated:
+#     VERSION  KIND  TYPE  FIELD  KNOWN  SESSION_ID  OFFSET  TIMESTAMP  FULL_PATH
+#   KIND is type|field; KNOWN is no for record types echo-sleuth does not
+#   parse; OFFSET is the byte offset of the first record showing it (lines of
+#   an already-seen shape are sampled, so rarely a few records later). VERSION
+#   is "-" for records without one. --since-version VERSION lists only newer
+#   versions.
 
 set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
-FILE="${1:?Usage: parse-jsonl.sh <file.jsonl> [options]}"
+FILE="${1:?Usage: parse-jsonl.sh <file.jsonl> [options] | --schema-drift [--since-version VERSION]}"
 shift
 
+SCHEMA_DRIFT=0
+SINCE_VERSION=""
+if [[ "$FILE" == "--schema-drift" ]]; then
+  SCHEMA_DRIFT=1
+  FILE=""
+fi
+
 TYPES=""
 SKIP_NOISE=0
 LIMIT=0
 FIELDS=""
 FORMAT="lines"
 DETECT_SCHEMA=0
+FOLLOW=0
+POLL=1
+IDLE_TIMEOUT=0
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
@@ -27,6 +53,10 @@ while [[ $# -gt 0 ]]; do
     --fields) FIELDS="$2"; shift 2 ;;
     --format) FORMAT="$2"; shift 2 ;;
     --detect-schema) DETECT_SCHEMA=1; shift ;;
+    --follow) FOLLOW=1; shift ;;
+    --poll) POLL="$2"; shift 2 ;;
+    --idle-timeout) IDLE_TIMEOUT="$2"; shift 2 ;;
+    --since-version) SINCE_VERSION="$2"; shift 2 ;;
     *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
   esac
 done
@@ -35,10 +65,19 @@ if [[ "$LIMIT" != "0" ]] && ! [[ "$LIMIT" =~ ^[0-9]+$ ]]; then
   echo "ERROR: --limit must be a number" >&2
   exit 1
 fi
+if [[ "$FOLLOW" -eq 1 && "$FORMAT" == "json" ]]; then
+  echo "ERROR: --follow cannot be combined with --format json" >&2
+  exit 1
+fi
+if ! [[ "$POLL" =~ ^[0-9]+(\.[0-9]+)?$ && "$IDLE_TIMEOUT" =~ ^[0-9]+(\.[0-9]+)?$ ]]; then
+  echo "ERROR: --poll and --idle-timeout must be numbers of seconds" >&2
+  exit 1
+fi
 
 ES_FILE="$FILE" ES_TYPES="$TYPES" ES_SKIP_NOISE="$SKIP_NOISE" ES_LIMIT="$LIMIT" \
 ES_FIELDS="$FIELDS" ES_FORMAT="$FORMAT" ES_DETECT_SCHEMA="$DETECT_SCHEMA" \
-ES_SCRIPT_DIR="$SCRIPT_DIR" \
+ES_FOLLOW="$FOLLOW" ES_POLL="$POLL" ES_IDLE_TIMEOUT="$IDLE_TIMEOUT" \
+ES_SCHEMA_DRIFT="$SCHEMA_DRIFT" ES_SINCE_VERSION="$SINCE_VERSION" ES_SCRIPT_DIR="$SCRIPT_DIR" \
 python3 << 'PYEOF'
 import json, sys, os
 sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
@@ -51,6 +90,20 @@ limit = int(os.environ.get('ES_LIMIT', '0'))
 field_list = [f.strip() for f in os.environ.get('ES_FIELDS', '').split(',') if f.strip()]
 fmt = os.environ.get('ES_FORMAT', 'lines')
 detect_schema = os.environ.get('ES_DETECT_SCHEMA', '0') == '1'
+follow = os.environ.get('ES_FOLLOW', '0') == '1'
+
+if os.environ.get('ES_SCHEMA_DRIFT', '0') == '1':
+    if not echolib.CLAUDE_DIR.exists():
+        echolib.cli_error("No Claude projects directory at " + str(echolib.CLAUDE_DIR))
+    registry = echolib.schema_registry()
+    for item in registry.drift(since_version=os.environ.get('ES_SINCE_VERSION', '')):
+        print("\t".join([
+            item["version"] or "-", item["kind"], item["type"], item["field"],
+            "yes" if item["known"] else "no", item["session_id"], str(item["offset"]),
+            item["timestamp"], item["path"],
+        ]))
+    registry.close()
+    sys.exit(0)
 
 if detect_schema:
     schema = echolib.detect_schema(file_path)
@@ -76,30 +129,38 @@ count = 0
 if fmt == 'json':
     print('[')
 
-for rec in echolib.iter_records(file_path, types=type_filter or None,
-                                  skip_noise=skip_noise, limit=limit):
-    d = rec.raw
-    if field_list:
-        d = {k: d[k] for k in field_list if k in d}
-
-    if fmt == 'tsv':
-        values = []
-        for f_name in (field_list or sorted(d.keys())):
-            v = d.get(f_name, '')
-            if isinstance(v, (dict, list)):
-                v = json.dumps(v, ensure_ascii=False)
-            else:
-                v = str(v)
-            v = v.replace('\t', ' ').replace('\n', ' ')
-            values.append(v)
-        print('\t'.join(values))
-    elif fmt == 'json':
-        prefix = '  ' if count == 0 else ', '
-        print(prefix + json.dumps(d, ensure_ascii=False))
-    else:
-        print(json.dumps(d, ensure_ascii=False))
-
-    count += 1
+records = echolib.iter_records(file_path, types=type_filter or None,
+                               skip_noise=skip_noise, limit=limit, follow=follow,
+                               poll=float(os.environ.get('ES_POLL', '1')),
+                               idle_timeout=float(os.environ.get('ES_IDLE_TIMEOUT', '0')))
+try:
+    for rec in records:
+        d = rec.raw
+        if field_list:
+            d = {k: d[k] for k in field_list if k in d}
+
+        if fmt == 'tsv':
+            values = []
+            for f_name in (field_list or sorted(d.keys())):
+                v = d.get(f_name, '')
+                if isinstance(v, (dict, list)):
+                    v = json.dumps(v, ensure_ascii=False)
+                else:
+                    v = str(v)
+                v = v.replace('\t', ' ').replace('\n', ' ')
+                values.append(v)
+            print('\t'.join(values))
+        elif fmt == 'json':
+            prefix = '  ' if count == 0 else ', '
+            print(prefix + json.dumps(d, ensure_ascii=False))
+        else:
+            print(json.dumps(d, ensure_ascii=False))
+
+        count += 1
+        if follow:
+            sys.stdout.flush()
+except KeyboardInterrupt:
+    pass
 
 if fmt == 'json':
     print(']')
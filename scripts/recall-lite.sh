@@ -8,20 +8,30 @@
 # raw matches without synthesis.
 #
 # Usage:
-#   recall-lite.sh <keyword> [--scope current|all] [--limit N] [--deep]
+#   recall-lite.sh <keyword> [--scope current|all] [--limit N] [--deep] [--ranked]
 #
 #   <keyword>          Single search term. Use the most distinctive word from
 #                      your question. Substring match, case-insensitive at the
 #                      index level. Required.
 #   --scope current    Search only the current project's sessions (default).
 #   --scope all        Search across every project under ~/.claude/projects.
+#                      Projects are read newest first and each match is
+#                      printed as soon as it is known to be the next newest,
+#                      so the first result appears without a full scan.
 #   --limit N          Number of matching sessions to deep-dive into. Default 5.
 #   --deep             Also dump full conversation excerpts (--thinking off,
 #                      role both, up to 30 messages) instead of only user
 #                      messages and tool errors. Slower; produces more output.
+#   --ranked           Rank individual messages and tool inputs by BM25
+#                      relevance (search-messages.sh) instead of matching
+#                      session summaries, and deep-dive into the sessions
+#                      holding the best hits. Multi-word queries work here.
 #
 # Output:
-#   1. A header listing matching sessions (tab-separated, 9 fields).
+#   1. A header listing matching sessions (tab-separated, 9 fields), or with
+#      --ranked the best message hits (SCORE SESSION_ID TIMESTAMP ROLE SNIPPET
+#      FULL_PATH). With --scope all (streamed) there is no header; each
+#      session's block names its project instead.
 #   2. For each of the top N matches: session metadata, the user-side messages,
 #      and any tool errors. With --deep, also a full message excerpt.
 #
@@ -42,12 +52,14 @@ shift
 SCOPE="current"
 LIMIT=5
 DEEP=0
+RANKED=0
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
     --scope) SCOPE="$2"; shift 2 ;;
     --limit) LIMIT="$2"; shift 2 ;;
     --deep)  DEEP=1; shift ;;
+    --ranked) RANKED=1; shift ;;
     *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
   esac
 done
@@ -65,6 +77,97 @@ fi
 echo "=== recall-lite: query='$QUERY' scope=$SCOPE limit=$LIMIT ==="
 echo
 
+# Evidence for one session: user intent, tool errors, optional excerpt.
+dump_session() {
+  local full_path="$1"
+  echo "--- User messages (intent) ---"
+  "$SCRIPT_DIR/extract-messages.sh" "$full_path" --role user --no-tools --limit 15 2>/dev/null || \
+    echo "(extract-messages failed)"
+  echo
+  echo "--- Tool errors (if any) ---"
+  "$SCRIPT_DIR/extract-tools.sh" "$full_path" --errors-only --limit 20 2>/dev/null || \
+    echo "(extract-tools failed)"
+  echo
+  if [[ "$DEEP" -eq 1 ]]; then
+    echo "--- Full excerpt (both roles, up to 30 messages) ---"
+    "$SCRIPT_DIR/extract-messages.sh" "$full_path" --role both --limit 30 2>/dev/null || \
+      echo "(extract-messages failed)"
+    echo
+  fi
+}
+
+if [[ "$RANKED" -eq 1 ]]; then
+  # Several hits usually come from one session; over-fetch so LIMIT distinct
+  # sessions survive the dedup below.
+  if ! HITS="$("$SCRIPT_DIR/search-messages.sh" "$QUERY" "$SCOPE" --limit $((LIMIT * 5)) 2>/dev/null)"; then
+    echo "No matching messages found for '$QUERY' in scope '$SCOPE'."
+    exit 0
+  fi
+  if [[ -z "$HITS" ]]; then
+    echo "No matching messages found for '$QUERY' in scope '$SCOPE'."
+    [[ "$SCOPE" == "current" ]] && echo "Hint: try --scope all to search every project."
+    exit 0
+  fi
+
+  echo "--- Best message hits (SCORE  SESSION_ID  TIMESTAMP  ROLE  SNIPPET  FULL_PATH) ---"
+  echo "$HITS"
+  echo
+
+  i=0
+  while IFS=$'\x1f' read -r score session_id timestamp role snippet full_path; do
+    [[ $i -ge $LIMIT ]] && break
+    i=$((i + 1))
+    echo "============================================================"
+    echo "Session $i/$LIMIT"
+    echo "  Session : $session_id"
+    echo "  Best hit: $timestamp ($role, score $score)"
+    echo "  Path    : $full_path"
+    echo "============================================================"
+    echo
+    dump_session "$full_path"
+  done < <(printf '%s\n' "$HITS" | tr '\t' $'\x1f' | awk -F $'\x1f' '!seen[$6]++')
+
+  echo "=== recall-lite done. $i session(s) inspected. ==="
+  exit 0
+fi
+
+# One matching session: metadata block followed by its evidence.
+dump_match() {
+  local summary="$1" created="$2" modified="$3" branch="$4" msg_count="$5" full_path="$6" project_path="${7:-}"
+  echo "============================================================"
+  echo "Session $i/$LIMIT"
+  echo "  Summary : $summary"
+  echo "  Created : $created"
+  echo "  Modified: $modified"
+  echo "  Branch  : $branch"
+  echo "  Messages: $msg_count"
+  [[ -n "$project_path" ]] && echo "  Project : $project_path"
+  echo "  Path    : $full_path"
+  echo "============================================================"
+  echo
+  dump_session "$full_path"
+}
+
+if [[ "$SCOPE" == "all" ]]; then
+  # Streamed newest first (list-sessions.sh --stream): evidence for the newest
+  # match is printed before older projects have even been read. Tabs become
+  # \x1f for `read` (see the note on IFS below).
+  i=0
+  while IFS=$'\x1f' read -r session_id created modified msg_count branch summary first_prompt project_path full_path; do
+    [[ -z "${full_path:-}" ]] && continue
+    [[ ! -f "$full_path" && ! -f "$full_path.gz" && ! -f "$full_path.xz" ]] && continue
+    i=$((i + 1))
+    dump_match "$summary" "$created" "$modified" "$branch" "$msg_count" "$full_path" "$project_path"
+  done < <("$SCRIPT_DIR/list-sessions.sh" all --stream --grep "$QUERY" --limit "$LIMIT" | tr '\t' $'\x1f')
+
+  if [[ $i -eq 0 ]]; then
+    echo "No matching sessions found for '$QUERY' in scope '$SCOPE'."
+    exit 0
+  fi
+  echo "=== recall-lite done. $i session(s) inspected. ==="
+  exit 0
+fi
+
 # list-sessions.sh exits 1 when no entries match, even if sessions exist for
 # the project — that's a known quirk. Capture stderr so we can distinguish
 # "no matches" (benign) from a real failure (fatal).
@@ -106,32 +209,10 @@ echo
 i=0
 while IFS=$'\x1f' read -r session_id created modified msg_count branch summary first_prompt project_path full_path; do
   [[ -z "${full_path:-}" ]] && continue
-  [[ ! -f "$full_path" ]] && continue
+  # Archived sessions (archive-sessions.sh) live at <id>.jsonl.gz|.xz
+  [[ ! -f "$full_path" && ! -f "$full_path.gz" && ! -f "$full_path.xz" ]] && continue
   i=$((i + 1))
-  echo "============================================================"
-  echo "Session $i/$LIMIT"
-  echo "  Summary : $summary"
-  echo "  Created : $created"
-  echo "  Modified: $modified"
-  echo "  Branch  : $branch"
-  echo "  Messages: $msg_count"
-  echo "  Path    : $full_path"
-  echo "============================================================"
-  echo
-  echo "--- User messages (intent) ---"
-  "$SCRIPT_DIR/extract-messages.sh" "$full_path" --role user --no-tools --limit 15 2>/dev/null || \
-    echo "(extract-messages failed)"
-  echo
-  echo "--- Tool errors (if any) ---"
-  "$SCRIPT_DIR/extract-tools.sh" "$full_path" --errors-only --limit 20 2>/dev/null || \
-    echo "(extract-tools failed)"
-  echo
-  if [[ "$DEEP" -eq 1 ]]; then
-    echo "--- Full excerpt (both roles, up to 30 messages) ---"
-    "$SCRIPT_DIR/extract-messages.sh" "$full_path" --role both --limit 30 2>/dev/null || \
-      echo "(extract-messages failed)"
-    echo
-  fi
+  dump_match "$summary" "$created" "$modified" "$branch" "$msg_count" "$full_path"
 done < <(printf '%s\n' "$MATCHES" | tr '\t' $'\x1f')
 
 echo "=== recall-lite done. $i session(s) inspected. ==="
@@ -0,0 +1,71 @@
+#!/usr/bin/env bash
+# related-sessions.sh — Sessions most similar to a given session (TF-IDF cosine)
+# Usage: related-sessions.sh <file.jsonl|session-id> [--scope all|current] [--limit N]
+#
+# Compares hashed TF-IDF vectors built from each session's messages and the
+# files it edited. Vectors are cached in ~/.claude/projects/.echo-sleuth-vectors.json
+# and rebuilt only for sessions whose transcript changed, so queries do not
+# re-read transcripts. --scope current restricts candidates to the current
+# project (default: all projects). --limit defaults to 10.
+#
+# Output format (tab-separated, most similar first):
+#   SCORE  SESSION_ID  PROJECT  FULL_PATH
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+TARGET="${1:?Usage: related-sessions.sh <file.jsonl|session-id> [--scope all|current] [--limit N]}"
+shift
+
+SCOPE="all"
+LIMIT=10
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --scope) SCOPE="$2"; shift 2 ;;
+    --limit) LIMIT="$2"; shift 2 ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+if ! [[ "$LIMIT" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --limit must be a number, got: $LIMIT" >&2
+  exit 1
+fi
+if [[ "$SCOPE" != "current" && "$SCOPE" != "all" ]]; then
+  echo "ERROR: --scope must be 'current' or 'all', got: $SCOPE" >&2
+  exit 1
+fi
+
+ES_TARGET="$TARGET" ES_SCOPE="$SCOPE" ES_CWD="$(pwd)" ES_LIMIT="$LIMIT" \
+ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
+
+target = os.environ["ES_TARGET"]
+path = echolib.resolve_session_path(target)
+if not os.path.exists(path):
+    # Bare session id: look for <id>.jsonl in every project
+    path = ""
+    for project_dir in echolib.all_project_dirs():
+        candidate = echolib.resolve_session_path(str(project_dir / (target + ".jsonl")))
+        if os.path.exists(candidate):
+            path = candidate
+            break
+    if not path:
+        echolib.cli_error("No session file or session id found for " + target)
+
+project = ""
+if os.environ.get("ES_SCOPE") == "current":
+    proj_dir = echolib.find_project_dir(os.environ["ES_CWD"])
+    if not proj_dir:
+        echolib.cli_error("No Claude session directory found for " + os.environ["ES_CWD"])
+    project = proj_dir.name
+
+store = echolib.load_session_vectors()
+for r in store.related(path, k=int(os.environ.get("ES_LIMIT", "10")), project=project):
+    print("\t".join([str(r["score"]), r["session_id"], r["project"], r["path"]]))
+PYEOF
@@ -0,0 +1,100 @@
+#!/usr/bin/env bash
+# search-messages.sh — Relevance-ranked (BM25) search over individual messages
+# Usage: search-messages.sh <query> [project-path|"all"|"current"] [--limit N] [--no-ingest]
+#        [--roots DIR:DIR...]
+#
+# Scores every user prompt, assistant reply and tool input against the query
+# words and prints the best --limit hits (default 10), best first. The
+# inverted index lives in ~/.claude/projects/.echo-sleuth-search.sqlite and
+# is refreshed with only the bytes appended since the last run; --no-ingest
+# searches it as-is.
+#
+# Output format (tab-separated):
+#   SCORE  SESSION_ID  TIMESTAMP  ROLE  SNIPPET  FULL_PATH
+#
+# ROLE is user, assistant or tool:<Name>. FULL_PATH is the session .jsonl.
+#
+# --roots (scope "all" only; default $ECHO_SLEUTH_ROOTS): colon-separated
+#   session trees searched together, each with its own index inside it.
+#   Scores use document statistics summed over every root, so the merged
+#   ranking matches a single index over all of them.
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+QUERY="${1:?Usage: search-messages.sh <query> [project-path|all|current] [--limit N] [--no-ingest]}"
+shift
+
+SCOPE="current"
+if [[ $# -gt 0 && "${1}" != --* ]]; then
+  SCOPE="$1"
+  shift
+fi
+
+LIMIT=10
+INGEST=1
+ROOTS="${ECHO_SLEUTH_ROOTS:-}"
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --limit) LIMIT="$2"; shift 2 ;;
+    --no-ingest) INGEST=0; shift ;;
+    --roots) ROOTS="$2"; shift 2 ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+if ! [[ "$LIMIT" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --limit must be a number, got: $LIMIT" >&2
+  exit 1
+fi
+
+ES_QUERY="$QUERY" ES_SCOPE="$SCOPE" ES_TARGET="$(pwd)" ES_LIMIT="$LIMIT" \
+ES_INGEST="$INGEST" ES_ROOTS="$ROOTS" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
+
+scope = os.environ["ES_SCOPE"]
+query = os.environ["ES_QUERY"]
+limit = int(os.environ.get("ES_LIMIT", "10"))
+ingest = os.environ.get("ES_INGEST", "1") == "1"
+
+
+def search_root():
+    if scope == "all":
+        project_dirs = list(echolib.all_project_dirs())
+        project = ""
+    else:
+        target = os.environ["ES_TARGET"] if scope == "current" else scope
+        proj_dir = echolib.find_project_dir(target)
+        if not proj_dir:
+            echolib.cli_error("No Claude session directory found for " + target)
+        project_dirs = [proj_dir]
+        project = proj_dir.name
+
+    index = echolib.SearchIndex()
+    try:
+        files_read, docs_added = index.ingest(project_dirs) if ingest else (0, 0)
+        return index.search(query, k=limit, project=project), files_read, docs_added
+    finally:
+        index.close()
+
+
+if scope == "all" and os.environ.get("ES_ROOTS", ""):
+    hits, files_read, docs_added = echolib.corpus_search(
+        query, roots=os.environ["ES_ROOTS"], k=limit, ingest=ingest)
+else:
+    hits, files_read, docs_added = search_root()
+if ingest:
+    print("# indexed {} file(s), {} new message(s)".format(files_read, docs_added),
+          file=sys.stderr)
+
+for h in hits:
+    print("\t".join([
+        str(h["score"]), h["session_id"], h["timestamp"], h["role"],
+        echolib._sanitize_tsv(h["snippet"], 200), h["path"],
+    ]))
+PYEOF
@@ -1,39 +1,157 @@
 #!/usr/bin/env bash
 # session-stats.sh — Quick statistics for a .jsonl session file (single-pass)
-# Usage: session-stats.sh <file.jsonl>
+# Usage: session-stats.sh <file.jsonl> [--with-subagents | --dedup]
+#        session-stats.sh <file.jsonl> --follow [--poll SECONDS] [--idle-timeout SECONDS]
+#        session-stats.sh --project [project-path|current] [--dedup] [--workers N]
 #
 # Output: key=value pairs
+#
+# --with-subagents: include <session>/subagents/agent-*.jsonl transcripts.
+#   The key=value block becomes the rollup across all transcripts, followed by
+#   subagents=N and one "agent=LABEL key=value ..." line per transcript.
+#   Per-file results are cached in .echo-sleuth-stats.json beside the session.
+#
+# --follow: watch a live session. The key=value block is printed again, after
+#   a "---" line, each time lines are appended; only the new bytes are read.
+#   --poll sets the interval (default 1s); --idle-timeout exits after that
+#   many seconds without new lines (default 0 = never).
+#
+# --dedup: count only records first seen in this session, so a resumed
+#   session's totals exclude the history it repeats from an earlier one.
+#   Owners come from <project-dir>/.echo-sleuth-uuids.sqlite (incremental).
+#
+# --project: totals over every session in the project, then sessions=N and
+#   one "session=ID key=value ..." line per session. With --dedup each
+#   record counts once, in the session that first owned it.
 
 set -euo pipefail
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
-FILE="${1:?Usage: session-stats.sh <file.jsonl>}"
+FILE="${1:?Usage: session-stats.sh <file.jsonl> [--with-subagents | --dedup] [--follow] | --project [path|current] [--dedup]}"
+shift
+
+PROJECT=""
+WITH_SUBAGENTS=0
+FOLLOW=0
+POLL=1
+IDLE_TIMEOUT=0
+DEDUP=0
+WORKERS=0
+
+if [[ "$FILE" == "--project" ]]; then
+  PROJECT="current"
+  if [[ $# -gt 0 && "${1}" != --* ]]; then
+    PROJECT="$1"
+    shift
+  fi
+fi
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --with-subagents) WITH_SUBAGENTS=1; shift ;;
+    --follow) FOLLOW=1; shift ;;
+    --poll) POLL="$2"; shift 2 ;;
+    --idle-timeout) IDLE_TIMEOUT="$2"; shift 2 ;;
+    --dedup) DEDUP=1; shift ;;
+    --workers) WORKERS="$2"; shift 2 ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
 
-ES_FILE="$FILE" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+if [[ "$FOLLOW" -eq 1 && ( "$WITH_SUBAGENTS" -eq 1 || "$DEDUP" -eq 1 || -n "$PROJECT" ) ]]; then
+  echo "ERROR: --follow cannot be combined with --with-subagents, --dedup or --project" >&2
+  exit 1
+fi
+if [[ "$DEDUP" -eq 1 && "$WITH_SUBAGENTS" -eq 1 ]]; then
+  echo "ERROR: --dedup cannot be combined with --with-subagents" >&2
+  exit 1
+fi
+if ! [[ "$WORKERS" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --workers must be a number, got: $WORKERS" >&2
+  exit 1
+fi
+if ! [[ "$POLL" =~ ^[0-9]+(\.[0-9]+)?$ && "$IDLE_TIMEOUT" =~ ^[0-9]+(\.[0-9]+)?$ ]]; then
+  echo "ERROR: --poll and --idle-timeout must be numbers of seconds" >&2
+  exit 1
+fi
+
+ES_FILE="$FILE" ES_SUBAGENTS="$WITH_SUBAGENTS" ES_FOLLOW="$FOLLOW" ES_POLL="$POLL" \
+ES_IDLE_TIMEOUT="$IDLE_TIMEOUT" ES_DEDUP="$DEDUP" ES_PROJECT="$PROJECT" ES_CWD="$(pwd)" \
+ES_WORKERS="$WORKERS" ES_SCRIPT_DIR="$SCRIPT_DIR" \
 python3 << 'PYEOF'
 import os, sys
 sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
 import echolib
 
-stats = echolib.session_stats(os.environ["ES_FILE"])
-
-print("slug={}".format(stats["slug"]))
-print("model={}".format(stats["model"]))
-print("branch={}".format(stats["branch"]))
-print("started={}".format(stats["started"]))
-print("ended={}".format(stats["ended"]))
-print("user_messages={}".format(stats["user_messages"]))
-print("assistant_messages={}".format(stats["assistant_messages"]))
-print("tool_calls={}".format(stats["tool_calls"]))
-print("files_edited={}".format(stats["files_edited"]))
-print("errors={}".format(stats["errors"]))
-print("input_tokens={}".format(stats["input_tokens"]))
-print("output_tokens={}".format(stats["output_tokens"]))
-print("cache_read_tokens={}".format(stats["cache_read_tokens"]))
-print("cache_create_tokens={}".format(stats["cache_create_tokens"]))
-print("total_tokens={}".format(stats["total_tokens"]))
-print("compactions={}".format(stats["compactions"]))
-if stats["summary"]:
-    print("summary={}".format(stats["summary"]))
+with_subagents = os.environ.get("ES_SUBAGENTS", "0") == "1"
+dedup = os.environ.get("ES_DEDUP", "0") == "1"
+project = os.environ.get("ES_PROJECT", "")
+
+
+def print_stats(stats):
+    print("slug={}".format(stats["slug"]))
+    print("model={}".format(stats["model"]))
+    print("branch={}".format(stats["branch"]))
+    print("started={}".format(stats["started"]))
+    print("ended={}".format(stats["ended"]))
+    print("user_messages={}".format(stats["user_messages"]))
+    print("assistant_messages={}".format(stats["assistant_messages"]))
+    print("tool_calls={}".format(stats["tool_calls"]))
+    print("files_edited={}".format(stats["files_edited"]))
+    print("errors={}".format(stats["errors"]))
+    print("input_tokens={}".format(stats["input_tokens"]))
+    print("output_tokens={}".format(stats["output_tokens"]))
+    print("cache_read_tokens={}".format(stats["cache_read_tokens"]))
+    print("cache_create_tokens={}".format(stats["cache_create_tokens"]))
+    print("total_tokens={}".format(stats["total_tokens"]))
+    print("compactions={}".format(stats["compactions"]))
+    if stats["summary"]:
+        print("summary={}".format(stats["summary"]))
+
+
+if os.environ.get("ES_FOLLOW", "0") == "1":
+    updates = echolib.session_stats(
+        os.environ["ES_FILE"], follow=True,
+        poll=float(os.environ.get("ES_POLL", "1")),
+        idle_timeout=float(os.environ.get("ES_IDLE_TIMEOUT", "0")),
+    )
+    try:
+        for i, stats in enumerate(updates):
+            if i:
+                print("---")
+            print_stats(stats)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    sys.exit(0)
+
+if project:
+    target = os.environ["ES_CWD"] if project == "current" else project
+    proj_dir = echolib.find_project_dir(target)
+    if not proj_dir:
+        echolib.cli_error("No Claude session directory found for " + target)
+    result = echolib.project_stats(proj_dir, dedup=dedup,
+                                   workers=int(os.environ.get("ES_WORKERS", "0")))
+    print_stats(result["total"])
+    print("sessions={}".format(len(result["sessions"])))
+    for sid, s in result["sessions"]:
+        print("session={} user_messages={} assistant_messages={} tool_calls={} errors={} "
+              "input_tokens={} output_tokens={} total_tokens={}".format(
+                  sid, s["user_messages"], s["assistant_messages"], s["tool_calls"],
+                  s["errors"], s["input_tokens"], s["output_tokens"], s["total_tokens"]))
+elif with_subagents:
+    tree = echolib.session_tree_stats(os.environ["ES_FILE"])
+    print_stats(tree["total"])
+    print("subagents={}".format(len(tree["agents"]) - 1))
+    for label, s in tree["agents"]:
+        print("agent={} assistant_messages={} tool_calls={} errors={} "
+              "input_tokens={} output_tokens={} total_tokens={}".format(
+                  label, s["assistant_messages"], s["tool_calls"], s["errors"],
+                  s["input_tokens"], s["output_tokens"], s["total_tokens"]))
+elif dedup:
+    print_stats(echolib.session_stats(
+        os.environ["ES_FILE"], dedup=echolib.uuid_registry(os.environ["ES_FILE"])))
+else:
+    print_stats(echolib.session_stats(os.environ["ES_FILE"]))
 PYEOF
@@ -0,0 +1,101 @@
+#!/usr/bin/env bash
+# timeline.sh — Chronological project timeline with sessions pre-correlated to commits
+# Usage: timeline.sh [project-path] [--repo PATH] [--limit N] [--since YYYY-MM-DD]
+#        [--slack SECONDS] [--no-files]
+#
+# Joins each session's created..modified interval (plus --slack seconds,
+# default 900) with git commits by author time, and weights each match by how
+# many of the commit's files the session also edited. Every commit is shown
+# under its best-matching session; the rest are listed on their own.
+#
+# Output format:
+#   --- YYYY-MM-DD HH:MM SESSION <session_id> (N msgs, BRANCH) ---
+#     <summary or first prompt>
+#     + <hash> <date> [w=<weight> files=<overlap>/<total>] <subject>
+#   --- YYYY-MM-DD HH:MM COMMIT <hash> <subject> ---
+#
+# --no-files skips reading session transcripts and weights by time only.
+# Without a git repository, only sessions are listed.
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+# Parse project path: only consume first arg if it's not a flag
+PROJECT="$(pwd)"
+if [[ $# -gt 0 && "${1}" != --* ]]; then
+  PROJECT="$1"
+  shift
+fi
+
+REPO=""
+LIMIT=50
+SINCE=""
+SLACK=900
+WITH_FILES=1
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --repo)  REPO="$2"; shift 2 ;;
+    --limit) LIMIT="$2"; shift 2 ;;
+    --since) SINCE="$2"; shift 2 ;;
+    --slack) SLACK="$2"; shift 2 ;;
+    --no-files) WITH_FILES=0; shift ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+if ! [[ "$LIMIT" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --limit must be a number, got: $LIMIT" >&2
+  exit 1
+fi
+if ! [[ "$SLACK" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --slack must be a number, got: $SLACK" >&2
+  exit 1
+fi
+
+REPO="${REPO:-$PROJECT}"
+
+ES_PROJECT="$PROJECT" ES_REPO="$REPO" ES_LIMIT="$LIMIT" ES_SINCE="$SINCE" \
+ES_SLACK="$SLACK" ES_FILES="$WITH_FILES" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys, time
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
+
+since = os.environ.get("ES_SINCE", "")
+sessions = echolib.list_sessions(scope="path", target=os.environ["ES_PROJECT"],
+                                 limit=int(os.environ.get("ES_LIMIT", "50")), since=since)
+commits = echolib.git_commits(os.environ["ES_REPO"], since=since)
+
+if not sessions and not commits:
+    echolib.cli_error("No sessions or commits found for " + os.environ["ES_PROJECT"])
+
+events = echolib.correlate_sessions(
+    sessions, commits,
+    slack=int(os.environ.get("ES_SLACK", "900")),
+    with_files=os.environ.get("ES_FILES", "1") == "1",
+)
+
+def fmt_ts(ts):
+    return time.strftime("%Y-%m-%d %H:%M", time.gmtime(ts)) if ts else "????-??-?? ??:??"
+
+print("# Timeline: {} sessions, {} commits".format(len(sessions), len(commits)))
+print("")
+for ev in events:
+    if ev["kind"] == "session":
+        s = ev["session"]
+        print("--- {} SESSION {} ({} msgs, {}) ---".format(
+            fmt_ts(ev["ts"]), s.session_id, s.message_count, s.git_branch or "-"))
+        label = s.summary or s.first_prompt
+        if label:
+            print("  " + echolib._sanitize_tsv(str(label), 120))
+        for m in ev["commits"]:
+            c = m["commit"]
+            print("  + {} {} [w={} files={}/{}] {}".format(
+                c["short"], c["date"][:16], m["weight"], m["overlap"], m["files"],
+                c["subject"]))
+    else:
+        c = ev["commit"]
+        print("--- {} COMMIT {} {} ---".format(fmt_ts(ev["ts"]), c["short"], c["subject"]))
+PYEOF
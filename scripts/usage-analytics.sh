@@ -0,0 +1,91 @@
+#!/usr/bin/env bash
+# usage-analytics.sh — Cross-session token and tool analytics from the usage warehouse
+# Usage: usage-analytics.sh [tokens|tools] [--group-by FIELD] [--bucket day|week|month|none]
+#        [--since YYYY-MM-DD] [--project NAME] [--no-ingest]
+#
+# tokens (default): turns and token sums per bucket and group.
+#   --group-by model|project|session|agent|none   (default: model)
+# tools: calls, errors and error rate per bucket and group.
+#   --group-by tool|project|session|agent|none    (default: tool)
+#
+# Before querying, new bytes appended to every session since the last run are
+# ingested into ~/.claude/projects/.echo-sleuth-usage.sqlite. --no-ingest
+# queries the warehouse as-is.
+#
+# Output format (tab-separated, header first):
+#   BUCKET  GROUP  METRIC...
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+REPORT="tokens"
+if [[ $# -gt 0 && "${1}" != --* ]]; then
+  REPORT="$1"
+  shift
+fi
+
+GROUP_BY=""
+BUCKET="day"
+SINCE=""
+PROJECT=""
+INGEST=1
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --group-by) GROUP_BY="$2"; shift 2 ;;
+    --bucket) BUCKET="$2"; shift 2 ;;
+    --since) SINCE="$2"; shift 2 ;;
+    --project) PROJECT="$2"; shift 2 ;;
+    --no-ingest) INGEST=0; shift ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+if [[ "$REPORT" != "tokens" && "$REPORT" != "tools" ]]; then
+  echo "ERROR: report must be 'tokens' or 'tools', got: $REPORT" >&2
+  exit 1
+fi
+
+case "$BUCKET" in
+  day|week|month|none) ;;
+  *) echo "ERROR: bucket must be one of: day, month, none, week" >&2; exit 1 ;;
+esac
+
+if [[ -z "$GROUP_BY" ]]; then
+  if [[ "$REPORT" == "tools" ]]; then GROUP_BY="tool"; else GROUP_BY="model"; fi
+fi
+
+ES_REPORT="$REPORT" ES_GROUP_BY="$GROUP_BY" ES_BUCKET="$BUCKET" ES_SINCE="$SINCE" \
+ES_PROJECT="$PROJECT" ES_INGEST="$INGEST" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
+
+if not echolib.CLAUDE_DIR.exists():
+    echolib.cli_error("No Claude projects directory at " + str(echolib.CLAUDE_DIR))
+
+wh = echolib.UsageWarehouse()
+try:
+    if os.environ.get("ES_INGEST", "1") == "1":
+        files_read, turns_added = wh.ingest()
+        print("# ingested {} file(s), {} new turn(s)".format(files_read, turns_added),
+              file=sys.stderr)
+    try:
+        headers, rows = wh.query(
+            report=os.environ["ES_REPORT"],
+            group_by=os.environ["ES_GROUP_BY"],
+            bucket=os.environ["ES_BUCKET"],
+            since=os.environ.get("ES_SINCE", ""),
+            project=os.environ.get("ES_PROJECT", ""),
+        )
+    except ValueError as e:
+        echolib.cli_error(str(e))
+finally:
+    wh.close()
+
+print("\t".join(h.upper() for h in headers))
+for row in rows:
+    print("\t".join("" if v is None else str(v) for v in row))
+PYEOF
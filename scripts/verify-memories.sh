@@ -0,0 +1,69 @@
+#!/usr/bin/env bash
+# verify-memories.sh — Batch-verify file and identifier claims in memories
+# Usage: bash verify-memories.sh [--project NAME] [--missing-only]
+#
+# Extracts file paths and backticked identifiers from every memory body,
+# resolves each project's root once and checks all of its claims against
+# one snapshot of the project (git ls-files or a directory walk, plus the
+# identifiers defined in its text files by def, class, function, const,
+# let or var). No per-claim shell calls.
+#
+# Output format (tab-separated), one line per memory:
+#   PROJECT  MEMORY_FILE  TYPE  HEURISTIC  SCORE  VERIFIED  MISSING  DETAIL
+#
+# HEURISTIC is staleness_score(); SCORE adds +20 if any referenced file is
+# missing and +30 if any identifier is, capped at 100. DETAIL lists the
+# missing claims as kind:value, or "root unresolved" when the project root
+# could not be found (claims unchecked). URLs, branches and packages are
+# not checked here.
+#
+# --project: only projects whose encoded name contains NAME.
+# --missing-only: only memories with missing claims or an unresolved root.
+
+set -euo pipefail
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+PROJECT_FILTER=""
+MISSING_ONLY=0
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --project) PROJECT_FILTER="$2"; shift 2 ;;
+    --missing-only) MISSING_ONLY=1; shift ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+ES_PROJECT="$PROJECT_FILTER" ES_MISSING_ONLY="$MISSING_ONLY" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+python3 << 'PYEOF'
+import os, sys
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
+
+project_filter = os.environ.get("ES_PROJECT", "")
+missing_only = os.environ.get("ES_MISSING_ONLY", "0") == "1"
+
+memories = []
+for name, mem_dir in sorted(echolib.all_memory_dirs()):
+    if project_filter and project_filter not in name:
+        continue
+    memories.extend(echolib.iter_memories(mem_dir))
+if not memories:
+    print("No memories found.", file=sys.stderr)
+    sys.exit(0)
+
+for report in echolib.verify_memories(memories):
+    m = report.memory
+    if report.root is None:
+        detail = "root unresolved"
+    else:
+        detail = ", ".join("{}:{}".format(kind, value) for kind, value in report.missing)
+    if missing_only and report.root is not None and not report.missing:
+        continue
+    print("\t".join([
+        m.project, os.path.basename(m.path), str(m.type),
+        str(echolib.staleness_score(m).score), str(report.score),
+        str(len(report.verified)), str(len(report.missing)),
+        echolib._sanitize_tsv(detail, 300),
+    ]))
+PYEOF
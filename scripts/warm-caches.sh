@@ -0,0 +1,122 @@
+#!/usr/bin/env bash
+# warm-caches.sh — Refresh stale derived caches of recent sessions, newest first
+# Usage: warm-caches.sh [project-path|"all"] [--days N] [--only KIND,KIND...]
+#        [--deadline SECONDS] [--max-bytes N] [--duty FRACTION] [--nice N] [--dry-run]
+#
+# Finds sessions modified in the last --days (default 7) whose caches are
+# missing or stale and rebuilds them, so interactive commands hit warm caches:
+#   index    fallback session index of the project (list-sessions.sh)
+#   digest   session digest of sessions >= 1MB (stats, messages, tool joins, files)
+#   stats    stats cache entry of the session and its subagents
+#   catalog  global session catalog (list-sessions.sh all)
+#   schema / search / usage  the sqlite stores behind --schema-drift,
+#            search-messages.sh and usage-analytics.sh, once they exist
+#
+# Output format (tab-separated), one line per refreshed cache:
+#   KIND  SECONDS  BYTES  TARGET
+# followed by "# warmed N cache(s) ..." (or "# planned ..." with --dry-run).
+#
+# Throttling: runs under `nice -n N` (default 10) and, where available,
+# `ionice -c 3` (idle I/O class). --duty F (default 0.5) sleeps after each
+# task so the warmer is busy at most that fraction of its wall time.
+# --deadline / --max-bytes bound one run; the remaining work is left for the
+# next run and a "# TRUNCATED: ..." line is printed. Overlapping runs (e.g.
+# from cron) exit at once. Example crontab line:
+#   */15 * * * * bash /path/to/warm-caches.sh --deadline 60 >/dev/null 2>&1
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+SCOPE="all"
+if [[ $# -gt 0 && "${1}" != --* ]]; then
+  SCOPE="$1"
+  shift
+fi
+
+DAYS=7
+ONLY=""
+DEADLINE=0
+MAX_BYTES=0
+DUTY=0.5
+NICE=10
+DRY_RUN=0
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --days) DAYS="$2"; shift 2 ;;
+    --only) ONLY="$2"; shift 2 ;;
+    --deadline) DEADLINE="$2"; shift 2 ;;
+    --max-bytes) MAX_BYTES="$2"; shift 2 ;;
+    --duty) DUTY="$2"; shift 2 ;;
+    --nice) NICE="$2"; shift 2 ;;
+    --dry-run) DRY_RUN=1; shift ;;
+    *) echo "ERROR: Unknown option: $1" >&2; exit 1 ;;
+  esac
+done
+
+if ! [[ "$DAYS" =~ ^[0-9]+(\.[0-9]+)?$ && "$DEADLINE" =~ ^[0-9]+(\.[0-9]+)?$ && "$MAX_BYTES" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --days and --deadline must be numbers of days/seconds; --max-bytes a number" >&2
+  exit 1
+fi
+if ! [[ "$DUTY" =~ ^(0?\.[0-9]*[1-9][0-9]*|1(\.0*)?)$ ]]; then
+  echo "ERROR: --duty must be a fraction in (0, 1], got: $DUTY" >&2
+  exit 1
+fi
+if ! [[ "$NICE" =~ ^[0-9]+$ ]]; then
+  echo "ERROR: --nice must be a number, got: $NICE" >&2
+  exit 1
+fi
+
+THROTTLE="nice -n $NICE"
+if command -v ionice >/dev/null 2>&1 && ionice -c 3 true >/dev/null 2>&1; then
+  THROTTLE="$THROTTLE ionice -c 3"
+fi
+
+ES_SCOPE="$SCOPE" ES_DAYS="$DAYS" ES_ONLY="$ONLY" ES_DEADLINE="$DEADLINE" \
+ES_MAX_BYTES="$MAX_BYTES" ES_DUTY="$DUTY" ES_DRY_RUN="$DRY_RUN" ES_SCRIPT_DIR="$SCRIPT_DIR" \
+$THROTTLE python3 << 'PYEOF'
+import os, sys, time
+sys.path.insert(0, os.environ["ES_SCRIPT_DIR"])
+import echolib
+
+kinds = echolib.WARM_KINDS
+if os.environ.get("ES_ONLY", ""):
+    kinds = [k.strip() for k in os.environ["ES_ONLY"].split(",") if k.strip()]
+    unknown = sorted(set(kinds) - set(echolib.WARM_KINDS))
+    if unknown:
+        echolib.cli_error("Unknown cache kind(s): {} (choose from {})".format(
+            ", ".join(unknown), ", ".join(echolib.WARM_KINDS)))
+
+scope = os.environ.get("ES_SCOPE", "all")
+project_dirs = None
+if scope != "all":
+    proj_dir = echolib.find_project_dir(scope)
+    if not proj_dir:
+        echolib.cli_error("No Claude session directory found for " + scope)
+    project_dirs = [proj_dir]
+elif not echolib.CLAUDE_DIR.exists():
+    echolib.cli_error("No Claude projects directory at " + str(echolib.CLAUDE_DIR))
+
+budget = None
+deadline = float(os.environ.get("ES_DEADLINE", "0"))
+max_bytes = int(os.environ.get("ES_MAX_BYTES", "0"))
+if deadline or max_bytes:
+    budget = echolib.ScanBudget(seconds=deadline, max_bytes=max_bytes)
+dry_run = os.environ.get("ES_DRY_RUN", "0") == "1"
+
+started = time.monotonic()
+count = 0
+total = 0
+for kind, target, cost, seconds in echolib.warm_caches(
+        project_dirs, recent_days=float(os.environ.get("ES_DAYS", "7")), kinds=kinds,
+        budget=budget, duty=float(os.environ.get("ES_DUTY", "1")), dry_run=dry_run):
+    print("{}\t{:.2f}\t{}\t{}".format(kind, seconds, cost, target), flush=True)
+    count += 1
+    total += cost
+
+print("# {} {} cache(s), {} transcript bytes, in {:.1f}s".format(
+    "planned" if dry_run else "warmed", count, total, time.monotonic() - started))
+if budget is not None and budget.exhausted:
+    print(budget.marker())
+PYEOF
@@ -217,6 +217,20 @@ for f in echolib.extract_files_changed(os.environ['ES_FILE'], with_versions=True
 assert_contains "$output" "src/login.ts	3" "files: login.ts has version 3"
 assert_contains "$output" "src/middleware.ts	1" "files: middleware.ts has version 1"
 
+echo ""
+echo "--- extract_file_timeline ---"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_FILE="$SAMPLE" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+for t in echolib.extract_file_timeline(os.environ['ES_FILE']):
+    print('%s %s %d->%d %s' % (t['timestamp'], t['file'], t['previous'], t['version'], t['message_id']))
+")
+assert_count "$output" 5 "timeline: one transition per version change across snapshots"
+assert_contains "$output" "2026-01-15T10:00:15.000Z src/login.ts 0->2 a4" "timeline: first appearance from version 0"
+assert_contains "$output" "2026-01-15T10:02:00.000Z src/login.ts 2->3 a5" "timeline: later transition with triggering message"
+assert_contains "$(echo "$output" | head -1)" "src/login.ts" "timeline: transitions in time order"
+
 echo ""
 echo "--- detect_schema ---"
 output=$(ES_FILE="$SAMPLE" ES_SCRIPT_DIR="$SCRIPT_DIR" python3 -c "
@@ -312,6 +326,13 @@ echo "--- extract-files-changed.sh --with-versions ---"
 output=$(bash "$SCRIPT_DIR/extract-files-changed.sh" "$SAMPLE" --with-versions)
 assert_contains "$output" "src/login.ts	3" "wrapper: files-changed version count"
 
+echo ""
+echo "--- extract-files-changed.sh --timeline ---"
+output=$(bash "$SCRIPT_DIR/extract-files-changed.sh" "$SAMPLE" --timeline)
+assert_contains "$output" "2026-01-15T10:02:10.000Z	src/middleware.ts	0	1	a5" "wrapper: files-changed timeline row"
+output=$(bash "$SCRIPT_DIR/extract-files-changed.sh" "$SAMPLE" --timeline --with-versions 2>&1 || true)
+assert_contains "$output" "ERROR: --timeline cannot be combined" "wrapper: files-changed --timeline excludes --with-versions"
+
 echo ""
 echo "--- parse-jsonl.sh --detect-schema ---"
 output=$(bash "$SCRIPT_DIR/parse-jsonl.sh" "$SAMPLE" --detect-schema)
@@ -623,6 +644,1317 @@ assert_contains "$output" "file_count=3" "memory_stats: counts 3 files in layout
 assert_contains "$output" "has_tokens=True" "memory_stats: has positive token count"
 assert_contains "$output" "has_dist=True" "memory_stats: has 4-bucket distribution"
 
+echo ""
+echo "--- session catalog (scope=all) ---"
+
+CATALOG_ROOT=$(mktemp -d)
+mkdir -p "$CATALOG_ROOT/-proj-a" "$CATALOG_ROOT/-proj-b"
+cp "$SAMPLE" "$CATALOG_ROOT/-proj-a/sess-a.jsonl"
+cat > "$CATALOG_ROOT/-proj-b/sessions-index.json" <<'JSONEOF'
+{"entries": [
+  {"sessionId": "b-old", "created": "2025-12-01T09:00:00Z", "summary": "old work"},
+  {"sessionId": "b-new", "created": "2026-02-01T09:00:00Z", "summary": "new work"}
+]}
+JSONEOF
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$CATALOG_ROOT" python3 -c "
+import os, sys, json
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+print('all=' + ','.join(e.session_id for e in echolib.list_sessions(scope='all', limit=10)))
+print('top1=' + ','.join(e.session_id for e in echolib.list_sessions(scope='all', limit=1)))
+print('since=' + ','.join(e.session_id for e in echolib.list_sessions(scope='all', since='2026-01-01')))
+print('grep=' + ','.join(e.session_id for e in echolib.list_sessions(scope='all', grep_pat='OLD')))
+idx = echolib.CLAUDE_DIR / '-proj-b' / 'sessions-index.json'
+data = json.loads(idx.read_text())
+data['entries'].append({'sessionId': 'b-newest', 'created': '2026-03-01T00:00:00Z'})
+idx.write_text(json.dumps(data))
+os.utime(str(idx), (1, 1))
+print('refreshed=' + ','.join(e.session_id for e in echolib.list_sessions(scope='all', limit=2)))
+print('rows=%d' % len(echolib.load_catalog(refresh=False)))
+")
+assert_contains "$output" "all=b-new,sess-a,b-old" "catalog: merged across projects, newest first"
+assert_contains "$output" "top1=b-new" "catalog: limit returns newest only"
+assert_contains "$output" "since=b-new,sess-a" "catalog: since range query"
+assert_contains "$output" "grep=b-old" "catalog: grep filter case-insensitive"
+assert_contains "$output" "refreshed=b-newest,b-new" "catalog: changed index picked up incrementally"
+assert_contains "$output" "rows=4" "catalog: persisted catalog holds all sessions"
+rm -rf "$CATALOG_ROOT"
+
+echo ""
+echo "--- streaming all-project listing (newest projects first) ---"
+
+STREAM_ROOT=$(mktemp -d)
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$STREAM_ROOT" python3 -c "
+import os, sys, json, calendar, time
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+projects = {
+    '-proj-new': ['2026-03-0%dT09:00:00Z' % d for d in (1, 3, 5)],
+    '-proj-mid': ['2026-02-0%dT09:00:00Z' % d for d in (2, 4)] + ['2026-03-02T09:00:00Z'],
+    '-proj-old': ['2025-12-0%dT09:00:00Z' % d for d in (1, 2)],
+}
+for name, dates in projects.items():
+    d = echolib.CLAUDE_DIR / name
+    d.mkdir()
+    entries = [{'sessionId': '%s-%d' % (name[6:], i), 'created': c,
+                'summary': 'fix bug' if i % 2 else 'docs'} for i, c in enumerate(dates)]
+    (d / 'sessions-index.json').write_text(json.dumps({'entries': entries}))
+    newest = calendar.timegm(time.strptime(max(dates), '%Y-%m-%dT%H:%M:%SZ'))
+    os.utime(str(d / 'sessions-index.json'), (newest, newest))
+
+loaded = []
+real_load = echolib._load_project_entries
+def spy(project_dir, *args):
+    loaded.append(project_dir.name)
+    return real_load(project_dir, *args)
+echolib._load_project_entries = spy
+ids = lambda es: ','.join(e.session_id for e in es)
+ok = True
+for kw in ({}, {'limit': 2}, {'since': '2026-02-03'}, {'grep_pat': 'BUG'}, {'limit': 0}):
+    ok = ok and ids(echolib.stream_sessions(**kw)) == ids(echolib.list_sessions(scope='all', **kw))
+print('same=%s' % ok)
+print('order=' + ids(echolib.stream_sessions(limit=4)))
+del loaded[:]
+gen = echolib.stream_sessions(limit=1)
+first = next(gen)
+print('first=%s:%s' % (first.session_id, ','.join(loaded)))
+del loaded[:]
+list(echolib.stream_sessions(since='2026-01-01'))
+print('pruned=' + ','.join(loaded))
+")
+assert_contains "$output" "same=True" "stream_sessions: same rows and order as the catalog"
+assert_contains "$output" "order=new-2,new-1,mid-2,new-0" "stream_sessions: interleaves projects by created"
+assert_contains "$output" "first=new-2:-proj-new" "stream_sessions: yields before reading older projects"
+assert_contains "$output" "pruned=-proj-new,-proj-mid" "stream_sessions: since skips projects older than the cut-off"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$STREAM_ROOT" python3 -c "
+import os, sys, json, calendar, time
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT']) / 'fallback'
+for i in range(4):
+    d = echolib.CLAUDE_DIR / ('-fb-%d' % (3 - i))
+    d.mkdir(parents=True)
+    ts = '2026-03-0%dT09:00:00Z' % (i + 1)
+    rec = {'type': 'user', 'timestamp': ts, 'message': {'role': 'user', 'content': 'task %d' % i}}
+    path = d / ('s%d.jsonl' % i)
+    path.write_text(json.dumps(rec) + '\\n')
+    when = calendar.timegm(time.strptime(ts, '%Y-%m-%dT%H:%M:%SZ'))
+    os.utime(str(path), (when, when))
+    os.utime(str(d), (when, when))
+echolib.list_sessions(scope='all', limit=10)
+loaded = []
+real_load = echolib._load_project_entries
+def spy(project_dir, *args):
+    loaded.append(project_dir.name)
+    return real_load(project_dir, *args)
+echolib._load_project_entries = spy
+echolib.invalidate_scan()
+first = next(echolib.stream_sessions(limit=1))
+print('warm_first=%s:%s' % (first.session_id, ','.join(loaded)))
+")
+assert_contains "$output" "warm_first=s3:-fb-0" "stream_sessions: cache writes do not reorder projects"
+output=$(HOME="$STREAM_ROOT" bash "$SCRIPT_DIR/list-sessions.sh" current --stream 2>&1 || true)
+assert_contains "$output" "requires scope 'all'" "wrapper: list-sessions --stream only for scope all"
+rm -rf "$STREAM_ROOT"
+echo ""
+echo "--- projects tree scan (shared listings) ---"
+
+SCAN_ROOT=$(mktemp -d)
+mkdir -p "$SCAN_ROOT/-proj-a/s1/subagents" "$SCAN_ROOT/-proj-a/memory" "$SCAN_ROOT/-proj-b"
+cp "$SAMPLE" "$SCAN_ROOT/-proj-a/s1.jsonl"
+cp "$SAMPLE" "$SCAN_ROOT/-proj-a/s2.jsonl"
+cp "$SAMPLE" "$SCAN_ROOT/-proj-a/s1/subagents/agent-x.jsonl"
+printf -- '---\nname: m\ntype: user\n---\nbody\n' > "$SCAN_ROOT/-proj-a/memory/m.md"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$SCAN_ROOT" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+proj = echolib.CLAUDE_DIR / '-proj-a'
+print('projects=' + ','.join(sorted(d.name for d in echolib.all_project_dirs())))
+print('sessions=' + ','.join(p.name for p in echolib.iter_session_files(proj)))
+print('subagents=' + ','.join(p.name for p in echolib.find_subagent_files(proj / 's1.jsonl')))
+print('no_subagents=%d' % len(echolib.find_subagent_files(proj / 's2.jsonl')))
+print('memdirs=' + ','.join(n for n, _ in echolib.all_memory_dirs()))
+print('memories=%d' % len(list(echolib.iter_memories(proj / 'memory'))))
+calls = []
+real = os.scandir
+os.scandir = lambda p='.': calls.append(p) or real(p)
+list(echolib.all_project_dirs()); echolib.iter_session_files(proj)
+echolib.find_subagent_files(proj / 's1.jsonl'); list(echolib.iter_memories(proj / 'memory'))
+print('rescans=%d' % len(calls))
+scan = echolib.scan_projects()
+print('stat_cached=%s' % (scan.stat(proj / 's1.jsonl') is scan.stat(proj / 's1.jsonl')))
+os.mkdir(str(echolib.CLAUDE_DIR / '-proj-c'))
+print('stale=%d' % len(list(echolib.all_project_dirs())))
+echolib.invalidate_scan()
+print('fresh=%d' % len(list(echolib.all_project_dirs())))
+echolib.archive_session(str(proj / 's2.jsonl'))
+print('after_archive=' + ','.join(p.name for p in echolib.iter_session_files(proj)))
+print('missing=%d' % len(echolib.iter_session_files(echolib.CLAUDE_DIR / '-nope')))
+")
+assert_contains "$output" "projects=-proj-a,-proj-b" "scan: project directories listed"
+assert_contains "$output" "sessions=s1.jsonl,s2.jsonl" "scan: session files listed"
+assert_contains "$output" "subagents=agent-x.jsonl" "scan: subagent files found"
+assert_contains "$output" "no_subagents=0" "scan: session without subagent dir"
+assert_contains "$output" "memdirs=-proj-a" "scan: memory dirs found"
+assert_contains "$output" "memories=1" "scan: memories read from shared listing"
+assert_contains "$output" "rescans=0" "scan: repeated lookups reuse listings"
+assert_contains "$output" "stat_cached=True" "scan: stat results cached"
+assert_contains "$output" "stale=2" "scan: listing shared within max age"
+assert_contains "$output" "fresh=3" "scan: invalidate_scan picks up new dirs"
+assert_contains "$output" "after_archive=s1.jsonl,s2.jsonl.gz" "scan: archiving invalidates listings"
+assert_contains "$output" "missing=0" "scan: missing directory lists nothing"
+rm -rf "$SCAN_ROOT"
+echo ""
+echo "--- shared caches (atomic writes, locking) ---"
+
+LOCK_ROOT=$(mktemp -d)
+mkdir -p "$LOCK_ROOT/-proj-l"
+for n in 1 2 3 4; do cp "$SAMPLE" "$LOCK_ROOT/-proj-l/s$n.jsonl"; done
+output=$(umask 022; ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$LOCK_ROOT" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+root = Path(os.environ['ES_ROOT'])
+path = root / 'c.json'
+print('written=%s' % echolib.write_cache(path, {'a': 1}, 3))
+print('read=%s' % echolib.read_cache(path, 3))
+print('other_version=%s' % echolib.read_cache(path, 4))
+print('leftovers=%d' % len([n for n in os.listdir(str(root)) if n.endswith('.tmp')]))
+print('mode=%o' % (os.stat(str(path)).st_mode & 0o777))
+path.write_text('{\"version\": 3, \"a\"')
+print('torn=%s' % echolib.read_cache(path, 3))
+with echolib.CacheLock(path) as first:
+    with echolib.CacheLock(path, wait=0) as second:
+        print('exclusive=%s,%s' % (first.held, second.held))
+with echolib.CacheLock(path, wait=0) as again:
+    print('released=%s' % again.held)
+d = root / '-proj-l'
+echolib.build_fallback_index(d)
+print('stale_sig=%s' % (echolib.read_cache(d / echolib.INDEX_CACHE_FILE, echolib.INDEX_CACHE_VERSION)['sig'][1]))
+os.utime(str(d / 's1.jsonl'), None)
+echolib.invalidate_scan()
+calls = []
+orig = echolib._fallback_entry
+echolib._fallback_entry = lambda *a: calls.append(a) or orig(*a)
+with echolib.CacheLock(d / echolib.INDEX_CACHE_FILE):
+    n = len(echolib.build_fallback_index(d))
+print('stale_served=%d rebuilt=%d' % (n, len(calls)))
+print('rebuilt_unlocked=%d' % len(echolib.build_fallback_index(d)) + ' calls=%d' % len(calls))
+listed = echolib.iter_session_files
+echolib.iter_session_files = lambda p: listed(p) + [p / 'archived-meanwhile.jsonl']
+print('vanished=%d sig=%d' % (len(echolib.build_fallback_index(d)),
+                              echolib._project_source_signature(d)[2]))
+print('vanished_warm=%d' % len(echolib._warm_index_task(d)))
+echolib.iter_session_files = listed
+")
+assert_contains "$output" "written=True" "cache: write_cache succeeds"
+assert_contains "$output" "mode=644" "cache: written with the umask's mode, not mkstemp's 0600"
+assert_contains "$output" "read={'version': 3, 'a': 1}" "cache: version header stored with payload"
+assert_contains "$output" "other_version=None" "cache: other format version ignored"
+assert_contains "$output" "leftovers=0" "cache: no temp files left behind"
+assert_contains "$output" "torn=None" "cache: truncated file treated as missing"
+assert_contains "$output" "exclusive=True,False" "cache: lock is exclusive"
+assert_contains "$output" "released=True" "cache: lock released on exit"
+assert_contains "$output" "stale_sig=4" "cache: fallback index records session count"
+assert_contains "$output" "stale_served=4 rebuilt=0" "cache: stale index served while another process rebuilds"
+assert_contains "$output" "rebuilt_unlocked=4 calls=4" "cache: stale index rebuilt once unlocked"
+assert_contains "$output" "vanished=4 sig=4" "cache: file removed between listing and stat is skipped"
+assert_contains "$output" "vanished_warm=0" "cache: warm-caches plan tolerates a vanished file"
+
+rm -f "$LOCK_ROOT/-proj-l/.echo-sleuth-index.json" "$LOCK_ROOT/calls.log"
+for n in 1 2 3 4; do
+  ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$LOCK_ROOT" python3 -c "
+import os, sys, time
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+root = Path(os.environ['ES_ROOT'])
+orig = echolib._fallback_entry
+def entry(*a):
+    with open(str(root / 'calls.log'), 'a') as f:
+        f.write('x\n')
+    time.sleep(0.05)
+    return orig(*a)
+echolib._fallback_entry = entry
+print(len(echolib.build_fallback_index(root / '-proj-l')))
+" > "$LOCK_ROOT/out.$n" &
+done
+wait
+assert_equals "$(cat "$LOCK_ROOT"/out.* | sort -u | tr '\n' ' ')" "4 " "cache: concurrent builders all get the full index"
+assert_equals "$(wc -l < "$LOCK_ROOT/calls.log" | tr -d ' ')" "4" "cache: concurrent builders rebuild only once"
+rm -rf "$LOCK_ROOT"
+
+echo ""
+echo "--- session_tree_stats (subagents) ---"
+
+TREE_DIR=$(mktemp -d)
+cp "$SAMPLE" "$TREE_DIR/sess.jsonl"
+mkdir -p "$TREE_DIR/sess/subagents"
+cp "$SAMPLE" "$TREE_DIR/sess/subagents/agent-one.jsonl"
+cp "$SAMPLE" "$TREE_DIR/sess/subagents/agent-two.jsonl"
+output=$(bash "$SCRIPT_DIR/session-stats.sh" "$TREE_DIR/sess.jsonl" --with-subagents)
+assert_contains "$output" "tool_calls=9" "tree: tool calls summed across parent + 2 subagents"
+assert_contains "$output" "input_tokens=27000" "tree: input tokens summed"
+assert_contains "$output" "subagents=2" "tree: subagent count"
+assert_contains "$output" "agent=agent-two" "tree: per-agent rollup line"
+assert_contains "$output" "files_edited=3" "tree: files_edited is max, not sum"
+if [[ -f "$TREE_DIR/.echo-sleuth-stats.json" ]]; then
+  pass "tree: per-file stats cache written"
+else
+  fail "tree: per-file stats cache written" "missing .echo-sleuth-stats.json"
+fi
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$TREE_DIR" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+calls = []
+orig = echolib.session_stats
+echolib.session_stats = lambda p: calls.append(p) or orig(p)
+tree = echolib.session_tree_stats(os.path.join(os.environ['ES_DIR'], 'sess.jsonl'))
+print('recomputed=%d' % len(calls))
+print('errors=%d' % tree['total']['errors'])
+echolib.session_stats = orig
+d = os.environ['ES_DIR']
+parts = echolib.cached_session_stats([os.path.join(d, 'sess.jsonl'), os.path.join(d, 'archived-meanwhile.jsonl')], d)
+print('vanished=%d,%d' % (parts[0]['errors'], parts[1]['total_tokens']))
+")
+assert_contains "$output" "recomputed=0" "tree: unchanged files served from cache"
+assert_contains "$output" "errors=3" "tree: cached stats still merged"
+assert_contains "$output" "vanished=1,0" "tree: vanished transcript reports zeroed stats"
+rm -rf "$TREE_DIR"
+
+echo ""
+echo "--- UsageWarehouse ---"
+
+WH_ROOT=$(mktemp -d)
+mkdir -p "$WH_ROOT/-proj-a"
+head -5 "$SAMPLE" > "$WH_ROOT/-proj-a/sess.jsonl"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$WH_ROOT" ES_SAMPLE="$SAMPLE" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+wh = echolib.UsageWarehouse()
+print('first=%d,%d' % wh.ingest())
+print('again=%d,%d' % wh.ingest())
+with open(os.environ['ES_SAMPLE']) as src, open(str(echolib.CLAUDE_DIR / '-proj-a' / 'sess.jsonl'), 'a') as dst:
+    dst.writelines(src.readlines()[5:])
+print('append=%d,%d' % wh.ingest())
+h, rows = wh.query('tokens', group_by='model', bucket='day')
+for r in rows:
+    print('tokens=' + '|'.join(str(v) for v in r))
+h, rows = wh.query('tools', group_by='tool', bucket='none')
+for r in rows:
+    print('tools=' + '|'.join(str(v) for v in r))
+wh.close()
+")
+assert_contains "$output" "first=1,2" "warehouse: initial ingest reads 2 turns"
+assert_contains "$output" "again=0,0" "warehouse: unchanged file skipped"
+assert_contains "$output" "append=1,2" "warehouse: only appended turns ingested"
+assert_contains "$output" "tokens=2026-01-15|claude-sonnet-4-5-20250514|4|9000|680|26000|200" "warehouse: tokens per model per day"
+assert_contains "$output" "tools=|Bash|1|1|1.0" "warehouse: tool error joined across ingests"
+assert_contains "$output" "tools=|Read|1|0|0.0" "warehouse: ok tool result"
+output=$(bash "$SCRIPT_DIR/usage-analytics.sh" tools --bucket sideways 2>&1 || true)
+assert_contains "$output" "ERROR: bucket must be one of" "warehouse: bad bucket rejected"
+rm -rf "$WH_ROOT"
+
+echo ""
+echo "--- git_commits cache ---"
+
+if command -v git &>/dev/null; then
+  GIT_REPO=$(mktemp -d)
+  gitc() { git -C "$GIT_REPO" -c user.name=t -c user.email=t@t "$@" >/dev/null; }
+  gitc init -q
+  echo one > "$GIT_REPO/a.txt"; gitc add a.txt
+  GIT_AUTHOR_DATE="2026-01-15T10:00:00" GIT_COMMITTER_DATE="2026-01-15T10:00:00" gitc commit -qm "first"
+  echo two >> "$GIT_REPO/a.txt"; echo b > "$GIT_REPO/b.txt"; gitc add a.txt b.txt
+  GIT_AUTHOR_DATE="2026-01-15T10:10:00" GIT_COMMITTER_DATE="2026-01-15T10:10:00" gitc commit -qm "second"
+  output=$(bash "$SCRIPT_DIR/git-sessions.sh" "$GIT_REPO" --since "2026-01-01")
+  assert_contains "$output" "2 commits" "git: commits clustered into one session"
+  assert_contains "$output" "FILES: a.txt, b.txt" "git: session file list from numstat"
+  echo c > "$GIT_REPO/c.txt"; gitc add c.txt
+  GIT_AUTHOR_DATE="2026-01-16T10:00:00" GIT_COMMITTER_DATE="2026-01-16T10:00:00" gitc commit -qm "third"
+  output=$(bash "$SCRIPT_DIR/git-context.sh" "$GIT_REPO" --since "2026-01-01")
+  assert_contains "$output" "subject: third" "git: new commit picked up after HEAD moved"
+  assert_contains "$output" "      2 a.txt" "git: hotspot counts from cached numstat"
+  assert_contains "$output" "      2 2026-01-15" "git: daily activity"
+  output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_REPO="$GIT_REPO" python3 -c "
+import os, sys, json, subprocess
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+repo = os.environ['ES_REPO']
+cache = json.load(open(os.path.join(repo, '.git', echolib.GIT_CACHE_FILE)))
+head = subprocess.check_output(['git', '-C', repo, 'rev-parse', 'HEAD'], universal_newlines=True).strip()
+print('head_match=%s' % (cache['head'] == head))
+print('cached=%d' % len(cache['commits']))
+")
+  assert_contains "$output" "head_match=True" "git: cache keyed by current HEAD"
+  assert_contains "$output" "cached=3" "git: cache extended incrementally"
+  rm -rf "$GIT_REPO"
+else
+  pass "git: skipped (git not installed)"
+fi
+
+echo ""
+echo "--- correlate_sessions ---"
+
+CORR_DIR=$(mktemp -d)
+cp "$SAMPLE" "$CORR_DIR/sess.jsonl"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_FILE="$CORR_DIR/sess.jsonl" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+t0 = echolib.iso_to_ts('2026-01-15T10:00:00.000Z')
+print('iso_offset=%s' % (echolib.iso_to_ts('2026-01-15T12:00:00+02:00') == t0))
+s1 = echolib.SessionMeta(session_id='s1', full_path=os.environ['ES_FILE'],
+                         created='2026-01-15T10:00:00.000Z', modified='2026-01-15T10:30:00.000Z')
+s2 = echolib.SessionMeta(session_id='s2', full_path='/nonexistent.jsonl',
+                         created='2026-01-15T10:20:00.000Z', modified='2026-01-15T11:00:00.000Z')
+def commit(short, offset, files):
+    return {'short': short, 'subject': short, 'date': '', 'author_ts': t0 + offset,
+            'numstat': [[1, 0, f] for f in files]}
+commits = [commit('inside', 600, ['src/login.ts']),
+           commit('shared', 1500, ['src/auth.ts']),
+           commit('other', 3000, ['docs/readme.md']),
+           commit('late', 7200, ['x'])]
+for ev in echolib.correlate_sessions([s1, s2], commits):
+    if ev['kind'] == 'session':
+        print('%s=%s;' % (ev['session'].session_id,
+              ','.join('%s:%s' % (m['commit']['short'], m['weight']) for m in ev['commits'])))
+    else:
+        print('loose=' + ev['commit']['short'])
+")
+assert_contains "$output" "iso_offset=True" "correlate: ISO offsets normalised to UTC"
+assert_contains "$output" "s1=inside:1.0,shared:1.0;" "correlate: file overlap picks the session that edited the files"
+assert_contains "$output" "s2=other:0.5;" "correlate: time-only match when no files overlap"
+assert_contains "$output" "loose=late" "correlate: commits outside every window stay uncorrelated"
+rm -rf "$CORR_DIR"
+
+echo ""
+echo "--- compressed session archives ---"
+
+ARCH_DIR=$(mktemp -d)
+mkdir -p "$ARCH_DIR/-proj-a"
+cp "$SAMPLE" "$ARCH_DIR/-proj-a/sess.jsonl"
+touch -d "2020-01-01" "$ARCH_DIR/-proj-a/sess.jsonl"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$ARCH_DIR/-proj-a" ES_SAMPLE="$SAMPLE" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+d = os.environ['ES_DIR']
+live = os.path.join(d, 'sess.jsonl')
+before = echolib.session_stats(live)
+files_before = echolib.extract_files_changed(live)
+dest, raw, comp = echolib.archive_session(live, codec='gz', block_size=1024)
+idx = echolib.load_block_index(dest)
+print('blocks=%d' % (len(idx['blocks']) > 1))
+print('raw_size=%s' % (raw == os.path.getsize(os.environ['ES_SAMPLE'])))
+print('live_gone=%s' % (not os.path.exists(live)))
+print('stats_equal=%s' % (echolib.session_stats(live) == before))
+print('files_equal=%s' % (echolib.extract_files_changed(live) == files_before))
+print('reverse=%s' % ('file-history-snapshot' in echolib._reverse_find(live, 'file-history-snapshot')))
+with open(os.environ['ES_SAMPLE'], 'rb') as f:
+    f.seek(3000)
+    want = f.read()
+with echolib.open_session(live, offset=3000, binary=True) as f:
+    print('offset_read=%s' % (f.read() == want))
+print('ids=' + ','.join(echolib.session_file_id(p) for p in echolib.iter_session_files(d)))
+print('fallback=' + ','.join(e.session_id for e in echolib.build_fallback_index(d)))
+restored = echolib.restore_session(dest)
+print('restored=%s' % (echolib.session_stats(restored) == before and not os.path.exists(dest + '.idx')))
+")
+assert_contains "$output" "blocks=1" "archive: small block size yields multiple blocks"
+assert_contains "$output" "raw_size=True" "archive: index records raw size"
+assert_contains "$output" "live_gone=True" "archive: original .jsonl removed"
+assert_contains "$output" "stats_equal=True" "archive: stats read through .jsonl path match"
+assert_contains "$output" "files_equal=True" "archive: files-changed via reverse block scan"
+assert_contains "$output" "reverse=True" "archive: _reverse_find over blocks"
+assert_contains "$output" "offset_read=True" "archive: seek to raw offset via block index"
+assert_contains "$output" "ids=sess" "archive: session id strips .jsonl.gz"
+assert_contains "$output" "fallback=sess" "archive: fallback index lists archived session"
+assert_contains "$output" "restored=True" "archive: restore round-trips"
+
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$ARCH_DIR" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+wh = echolib.UsageWarehouse()
+print('ingest=%d,%d' % wh.ingest())
+done = echolib.archive_cold_sessions(list(echolib.all_project_dirs()), codec='xz')
+print('archived=%d' % len(done))
+print('after=%d,%d' % wh.ingest())
+print('recent=%d' % len(echolib.archive_cold_sessions(list(echolib.all_project_dirs()), codec='xz')))
+")
+assert_contains "$output" "archived=1" "archive: cold session archived"
+assert_contains "$output" "after=0,0" "archive: warehouse does not re-ingest archived session"
+assert_contains "$output" "recent=0" "archive: already-archived files skipped"
+rm -rf "$ARCH_DIR"
+
+echo ""
+echo "--- SearchIndex (BM25) ---"
+
+SEARCH_ROOT=$(mktemp -d)
+mkdir -p "$SEARCH_ROOT/-proj-a" "$SEARCH_ROOT/-proj-b"
+head -5 "$SAMPLE" > "$SEARCH_ROOT/-proj-a/sess.jsonl"
+cp "$SAMPLE" "$SEARCH_ROOT/-proj-b/other.jsonl"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$SEARCH_ROOT" ES_SAMPLE="$SAMPLE" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+ix = echolib.SearchIndex()
+ix.ingest()
+print('again=%d,%d' % ix.ingest())
+hits = ix.search('authentication bug', k=2)
+print('k=%d' % len(hits))
+print('top=%s|%s|%s' % (hits[0]['role'], hits[0]['timestamp'], hits[0]['snippet']))
+print('ordered=%s' % (hits[0]['score'] >= hits[1]['score']))
+print('npm_a=%d' % len(ix.search('npm', project='-proj-a')))
+before = ix.conn.execute('SELECT df FROM terms WHERE term = ?', ('npm',)).fetchone()[0]
+with open(os.environ['ES_SAMPLE']) as src, open(str(echolib.CLAUDE_DIR / '-proj-a' / 'sess.jsonl'), 'a') as dst:
+    dst.writelines(src.readlines()[5:])
+print('append=%d' % ix.ingest()[0])
+after = ix.conn.execute('SELECT df FROM terms WHERE term = ?', ('npm',)).fetchone()[0]
+print('df=%d->%d' % (before, after))
+print('npm_a2=%s' % ix.search('npm', project='-proj-a')[0]['role'])
+print('none=%d' % len(ix.search('zzzunmatched')))
+plan = ix.conn.execute('EXPLAIN QUERY PLAN DELETE FROM postings WHERE doc IN (SELECT id FROM docs WHERE file = 1)').fetchall()
+print('drop_indexed=%s' % any('postings_doc' in str(row) for row in plan))
+ix.conn.execute('PRAGMA user_version = 0')
+ix.conn.commit()
+ix.close()
+ix = echolib.SearchIndex()
+print('old_layout_reread=%d' % ix.ingest()[0])
+")
+assert_contains "$output" "again=0,0" "search: unchanged files not re-indexed"
+assert_contains "$output" "k=2" "search: top-k bounds the result"
+assert_contains "$output" "top=user|2026-01-15T10:00:00.000Z|fix the authentication bug in login.ts" "search: best message with timestamp and snippet"
+assert_contains "$output" "ordered=True" "search: hits sorted by score"
+assert_contains "$output" "npm_a=0" "search: project filter"
+assert_contains "$output" "append=1" "search: appended bytes indexed incrementally"
+assert_contains "$output" "df=1->2" "search: document frequency updated in place"
+assert_contains "$output" "npm_a2=tool:Bash" "search: tool inputs are searchable"
+assert_contains "$output" "none=0" "search: unknown term yields no hits"
+assert_contains "$output" "drop_indexed=True" "search: dropping a file's postings uses the doc index"
+assert_contains "$output" "old_layout_reread=2" "search: index from an older schema version rebuilt"
+rm -rf "$SEARCH_ROOT"
+
+echo ""
+echo "--- SessionVectors (related sessions) ---"
+
+VEC_ROOT=$(mktemp -d)
+mkdir -p "$VEC_ROOT/-proj-a" "$VEC_ROOT/-proj-b"
+cp "$SAMPLE" "$VEC_ROOT/-proj-a/s1.jsonl"
+cp "$SAMPLE" "$VEC_ROOT/-proj-b/twin.jsonl"
+cat > "$VEC_ROOT/-proj-b/garden.jsonl" <<'JSONEOF'
+{"type":"user","timestamp":"2026-01-01T00:00:00Z","message":{"role":"user","content":"write a poem about gardening and tomatoes"}}
+JSONEOF
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$VEC_ROOT" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+s1 = str(echolib.CLAUDE_DIR / '-proj-a' / 's1.jsonl')
+store = echolib.load_session_vectors()
+hits = store.related(s1, k=5)
+print('hits=' + ','.join('%s:%s' % (h['session_id'], h['score']) for h in hits))
+print('self_excluded=%s' % all(h['path'] != s1 for h in hits))
+print('scoped=%d' % len(store.related(s1, project='-proj-a')))
+calls = []
+orig = echolib.session_vector
+echolib.session_vector = lambda p: calls.append(p) or orig(p)
+store = echolib.load_session_vectors()
+print('revectorized=%d' % len(calls))
+print('cached=' + ','.join(h['session_id'] for h in store.related(s1, k=1)))
+")
+assert_contains "$output" "hits=twin:1.0" "related: identical session ranks first with cosine 1.0"
+assert_not_contains "$output" "garden" "related: unrelated session has no overlap"
+assert_contains "$output" "self_excluded=True" "related: query session excluded"
+assert_contains "$output" "scoped=0" "related: project filter"
+assert_contains "$output" "revectorized=0" "related: unchanged sessions served from cache"
+assert_contains "$output" "cached=twin" "related: query from cache without re-reading"
+rm -rf "$VEC_ROOT"
+
+echo ""
+echo "--- follow mode (SessionTail) ---"
+
+FOLLOW_DIR=$(mktemp -d)
+head -3 "$SAMPLE" > "$FOLLOW_DIR/live.jsonl"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_FILE="$FOLLOW_DIR/live.jsonl" ES_SAMPLE="$SAMPLE" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+path = os.environ['ES_FILE']
+rest = open(os.environ['ES_SAMPLE'], 'rb').read().split(b'\n', 3)[3]
+tail = echolib.SessionTail(path)
+print('initial=%d' % len(tail.read_new()))
+with open(path, 'ab') as f:
+    f.write(rest[:40])
+print('partial=%d' % len(tail.read_new()))
+with open(path, 'ab') as f:
+    f.write(rest[40:])
+print('completed=%d' % len(tail.read_new()))
+print('offset_ok=%s' % (tail.offset == os.path.getsize(path)))
+with open(path, 'wb') as f:
+    f.write(rest.split(b'\n', 1)[0] + b'\n')
+print('truncated=%d' % len(tail.read_new()))
+with open(path, 'wb') as f:
+    f.write(open(os.environ['ES_SAMPLE'], 'rb').read())
+snaps = list(echolib.session_stats(path, follow=True, poll=0.05, idle_timeout=0.2))
+print('stats_match=%s' % (snaps[-1] == echolib.session_stats(path)))
+followed = list(echolib.extract_tools(path, follow=True, poll=0.05, idle_timeout=0.2))
+print('tools_match=%s' % (sorted(t['key_input'] for t in followed) == sorted(t['key_input'] for t in echolib.extract_tools(path))))
+print('errors_only=%d' % len(list(echolib.extract_tools(path, errors_only=True, follow=True, poll=0.05, idle_timeout=0.2))))
+print('records=%d' % len(list(echolib.iter_records(path, skip_noise=False, follow=True, poll=0.05, idle_timeout=0.2))))
+print('restarts=%d' % tail.restarts)
+live = echolib.session_stats(path, follow=True, poll=0.05, idle_timeout=5)
+next(live)
+sample = open(os.environ['ES_SAMPLE'], 'rb').read().split(b'\n')
+with open(path, 'wb') as f:
+    f.write(b'\n'.join(sample[:8]) + b'\n')
+rewritten = next(live)
+live.close()
+print('rewrite_stats=%s' % (rewritten == echolib.session_stats(path)))
+")
+assert_contains "$output" "initial=3" "follow: existing lines read first"
+assert_contains "$output" "partial=0" "follow: partial trailing line held back"
+assert_contains "$output" "completed=18" "follow: completed line picked up with the rest"
+assert_contains "$output" "offset_ok=True" "follow: offset tracks last complete line"
+assert_contains "$output" "truncated=1" "follow: rewritten file re-read from start"
+assert_contains "$output" "restarts=1" "follow: restart from 0 signalled"
+assert_contains "$output" "rewrite_stats=True" "follow: stats start over when the file is rewritten"
+assert_contains "$output" "stats_match=True" "follow: incremental stats match a full pass"
+assert_contains "$output" "tools_match=True" "follow: tool calls emitted as results arrive"
+assert_contains "$output" "errors_only=1" "follow: errors-only filter"
+assert_contains "$output" "records=$(bash "$SCRIPT_DIR/parse-jsonl.sh" "$SAMPLE" --format tsv --fields type | wc -l | tr -d ' ')" "follow: iter_records follow yields every record"
+output=$(bash "$SCRIPT_DIR/extract-tools.sh" "$FOLLOW_DIR/live.jsonl" --follow --errors-only --poll 0.05 --idle-timeout 0.2)
+assert_contains "$output" "error" "follow: extract-tools.sh --follow exits on idle timeout"
+rm -rf "$FOLLOW_DIR"
+
+echo ""
+echo "--- scan budgets (partial results) ---"
+
+BUDGET_DIR=$(mktemp -d)
+mkdir -p "$BUDGET_DIR/-proj-b"
+for n in 1 2 3; do cp "$SAMPLE" "$BUDGET_DIR/-proj-b/s$n.jsonl"; done
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$BUDGET_DIR/-proj-b" ES_SAMPLE="$SAMPLE" python3 -c "
+import json, os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+path = os.environ['ES_SAMPLE']
+full = [r.raw for r in echolib.iter_records(path, skip_noise=False)]
+budget = echolib.ScanBudget(max_bytes=2000)
+head = [r.raw for r in echolib.iter_records(path, skip_noise=False, budget=budget)]
+print('byte_truncated=%s' % (budget.exhausted and 0 < len(head) < len(full)))
+rest = [r.raw for r in echolib.iter_records(path, skip_noise=False, offset=budget.resume)]
+print('resumed=%s' % (head + rest == full))
+print('marker=%s' % budget.marker())
+budget = echolib.ScanBudget(seconds=1e-9)
+print('deadline_records=%d' % len(list(echolib.iter_records(path, budget=budget))))
+d = Path(os.environ['ES_DIR'])
+size = os.path.getsize(path)
+budget = echolib.ScanBudget(max_bytes=size + 1)
+print('partial_entries=%d' % len(echolib.build_fallback_index(d, budget)))
+print('partial_cached=%s' % (d / echolib.PARTIAL_INDEX_FILE).exists())
+print('main_cache=%s' % (d / '.echo-sleuth-index.json').exists())
+budget = echolib.ScanBudget(max_bytes=size + 1)
+print('second_entries=%d' % len(echolib.build_fallback_index(d, budget)))
+budget = echolib.ScanBudget(max_bytes=size + 1)
+print('final_entries=%d exhausted=%s' % (len(echolib.build_fallback_index(d, budget)), budget.exhausted))
+print('partial_removed=%s' % (not (d / echolib.PARTIAL_INDEX_FILE).exists()))
+u = d.parent / '-proj-u'
+u.mkdir()
+text = open(path, encoding='utf-8').read()
+for name in ('u1', 'u2'):
+    (u / (name + '.jsonl')).write_text(
+        text + '\n  \n' + json.dumps({'type': 'summary', 'summary': 'caf\u00e9 \u2014 r\u00e9sum\u00e9'}) + '\n',
+        encoding='utf-8')
+raw_size = sum(os.path.getsize(str(p)) for p in u.iterdir())
+charged = []
+for concurrency in (0, 2):
+    for p in u.glob('.echo-sleuth-index*'):
+        p.unlink()
+    budget = echolib.ScanBudget(max_bytes=10 ** 9)
+    echolib.build_fallback_index(u, budget, concurrency)
+    charged.append(budget.bytes_read)
+print('charged_raw=%s' % (charged == [raw_size, raw_size]))
+")
+assert_contains "$output" "byte_truncated=True" "budget: max_bytes stops iter_records early"
+assert_contains "$output" "resumed=True" "budget: resume offset yields exactly the remaining records"
+assert_contains "$output" "marker=# TRUNCATED: scan budget exhausted after" "budget: truncation marker"
+assert_contains "$output" "deadline_records=0" "budget: expired deadline returns nothing"
+assert_contains "$output" "partial_entries=1" "budget: fallback index returns finished sessions"
+assert_contains "$output" "partial_cached=True" "budget: finished sessions saved for the next run"
+assert_contains "$output" "main_cache=False" "budget: partial index not cached as complete"
+assert_contains "$output" "second_entries=2" "budget: rerun continues from cached sessions"
+assert_contains "$output" "final_entries=3 exhausted=False" "budget: index completes across runs"
+assert_contains "$output" "partial_removed=True" "budget: partial sidecar removed once complete"
+assert_contains "$output" "charged_raw=True" "budget: fallback index charges raw bytes read"
+
+output=$(bash "$SCRIPT_DIR/extract-tools.sh" "$SAMPLE" --max-bytes 3000)
+assert_contains "$(echo "$output" | tail -1)" "# TRUNCATED:" "budget: extract-tools.sh prints marker last"
+resume=$(echo "$output" | tail -1 | sed 's/.*--resume //')
+total=$(bash "$SCRIPT_DIR/extract-tools.sh" "$SAMPLE" | wc -l | tr -d ' ')
+first=$(echo "$output" | grep -vc '^# TRUNCATED' || true)
+rest=$(bash "$SCRIPT_DIR/extract-tools.sh" "$SAMPLE" --resume "$resume" | wc -l | tr -d ' ')
+assert_equals "$((first + rest))" "$total" "budget: extract-tools.sh --resume continues the scan"
+output=$(bash "$SCRIPT_DIR/extract-messages.sh" "$SAMPLE" --deadline 0.000001)
+assert_contains "$output" "# TRUNCATED:" "budget: extract-messages.sh --deadline"
+rm -rf "$BUDGET_DIR"
+
+echo ""
+echo "--- giant single-line records (bounded decode) ---"
+
+GIANT_DIR=$(mktemp -d)
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$GIANT_DIR" ES_SAMPLE="$SAMPLE" python3 -c "
+import io, json, os, sys, tracemalloc
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+path = os.path.join(os.environ['ES_DIR'], 'giant.jsonl')
+giant = {'type': 'user', 'uuid': 'g1', 'timestamp': '2026-01-15T10:00:30.000Z',
+         'message': {'role': 'user', 'content': [{'type': 'tool_result', 'tool_use_id': 'toolu_g',
+                     'is_error': True, 'content': 'line \\u00e9 "quoted"\\n' * 200000}]}}
+with open(os.environ['ES_SAMPLE'], 'rb') as f:
+    sample = f.read()
+with open(path, 'wb') as f:
+    f.write(sample + json.dumps(giant).encode() + b'\\n' + sample)
+recs = list(echolib.iter_records(path, max_line_bytes=65536))
+big = [r for r in recs if r.uuid == 'g1'][0]
+block = big.content[0]
+print('routing=%s' % (big.type == 'user' and block['tool_use_id'] == 'toolu_g' and block['is_error']))
+print('preview=%d truncated=%s' % (len(block['content'].split('...')[0]), '... [truncated from' in block['content']))
+print('marked_raw=%s' % block['content'].endswith('[truncated from %d chars of JSON]' % (len(json.dumps(giant['message']['content'][0]['content'])) - 2)))
+print('neighbours=%s' % (len(recs) == 2 * len(list(echolib.iter_records(os.environ['ES_SAMPLE']))) + 1))
+print('stats_errors=%s' % (echolib.session_stats(path)['errors'] == 2 * echolib.session_stats(os.environ['ES_SAMPLE'])['errors'] + 1))
+with open(path, 'rb') as f:
+    sizes = [n for n, _ in echolib.bounded_lines(f, 65536, sizes=True)]
+print('offsets_exact=%s' % (sum(sizes) == os.path.getsize(path)))
+tracemalloc.start()
+with open(path, 'rb') as f:
+    for _ in echolib.bounded_lines(f, 65536):
+        pass
+print('peak_bounded=%s' % (tracemalloc.get_traced_memory()[1] < 1000000))
+with open(path, 'rb') as f:
+    partial = f.read()[:len(sample) + 3000000]
+print('partial=%r' % [raw[-1:] for raw in echolib.bounded_lines(io.BytesIO(partial), 65536)][-1])
+print('invalid=%r' % list(echolib.bounded_lines(io.StringIO('{"a": ' + 'x' * 200000 + '}\\n'), 65536)))
+")
+assert_contains "$output" "routing=True" "giant line: routing fields survive bounded decode"
+assert_contains "$output" "preview=2048 truncated=True" "giant line: long strings cut to a preview"
+assert_contains "$output" "marked_raw=True" "giant line: marker counts the string's escaped JSON length"
+assert_contains "$output" "neighbours=True" "giant line: surrounding records unaffected"
+assert_contains "$output" "stats_errors=True" "giant line: session_stats still counts its error"
+assert_contains "$output" "offsets_exact=True" "giant line: sizes keep byte offsets exact"
+assert_contains "$output" "peak_bounded=True" "giant line: peak memory independent of line size"
+assert_contains "$output" "partial=b''" "giant line: partial trailing line yields no newline"
+assert_contains "$output" "invalid=['\\n']" "giant line: invalid oversized line comes back empty"
+rm -rf "$GIANT_DIR"
+
+echo ""
+echo "--- knowledge extraction (batch, incremental) ---"
+
+KN_DIR=$(mktemp -d)
+mkdir -p "$KN_DIR/-proj-k"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$KN_DIR/-proj-k" python3 -c "
+import json, os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+d = os.environ['ES_DIR']
+def user(text, ts):
+    return {'type': 'user', 'timestamp': ts, 'message': {'role': 'user', 'content': text}}
+def assistant(text, ts, tool=None):
+    content = [{'type': 'text', 'text': text}]
+    if tool:
+        content.append({'type': 'tool_use', 'id': tool, 'name': 'AskUserQuestion', 'input': {}})
+    return {'type': 'assistant', 'timestamp': ts, 'message': {'role': 'assistant', 'content': content}}
+def answer(tool, text, ts):
+    return {'type': 'user', 'timestamp': ts, 'message': {'role': 'user', 'content': [
+        {'type': 'tool_result', 'tool_use_id': tool, 'content': text}]}}
+def write(name, recs, mode='w'):
+    with open(os.path.join(d, name), mode) as f:
+        for r in recs:
+            f.write(json.dumps(r) + '\\n')
+shared = 'No, don\\'t mock the database, always use the real one'
+write('a.jsonl', [assistant('I will mock the db', '2026-01-01T00:00:00Z'),
+                  user(shared, '2026-01-01T00:01:00Z'),
+                  assistant('Which style?', '2026-01-01T00:02:00Z', tool='t1')])
+write('b.jsonl', [user(shared, '2026-01-02T00:00:00Z'),
+                  user('See https://example.com/spec for details', '2026-01-02T00:01:00Z')])
+first = echolib.extract_project_knowledge(d, workers=1)
+print('first=' + ','.join(sorted(i['category'] for i in first)))
+print('claude_md=%s' % any(i['suggested_destination'] == 'claude_md' for i in first))
+print('rerun=%d' % len(echolib.extract_project_knowledge(d, workers=1)))
+write('a.jsonl', [answer('t1', 'Tabs', '2026-01-01T00:03:00Z'),
+                  assistant('Using tabs now', '2026-01-01T00:04:00Z'),
+                  user('Perfect, that works', '2026-01-01T00:05:00Z')], mode='a')
+new = echolib.extract_project_knowledge(d, workers=1)
+print('incremental=' + ','.join(sorted(i['category'] for i in new)))
+print('carried=%s' % ([i['content'] for i in new if i['category'] == 'pattern'] == ['Approach approved: Using tabs now']))
+print('session=' + ','.join(sorted(set(i['session_id'] for i in new))))
+state = json.load(open(os.path.join(d, echolib.KNOWLEDGE_STATE_FILE)))
+print('watermark=%s' % (state['sessions']['a']['scan']['offset'] == os.path.getsize(os.path.join(d, 'a.jsonl'))))
+print('reset=%d' % len(echolib.extract_project_knowledge(d, workers=1, reset=True)))
+mixed = echolib._message_knowledge(
+    'No, stop. Speed is more important than size, see HTTPS://Example.com/A', 'ts', 'prev')
+print('mixed=' + ','.join(i['category'] for i in mixed) + ' ' + mixed[-1]['content'])
+")
+assert_contains "$output" "first=correction,reference" "knowledge: batch finds items across sessions"
+assert_contains "$output" "claude_md=True" "knowledge: imperative correction suggests CLAUDE.md"
+assert_contains "$output" "rerun=0" "knowledge: unchanged sessions and reported items skipped"
+assert_contains "$output" "incremental=decision,pattern" "knowledge: only appended records examined"
+assert_contains "$output" "carried=True" "knowledge: context carried across the watermark"
+assert_contains "$output" "session=a" "knowledge: items tagged with session id"
+assert_contains "$output" "watermark=True" "knowledge: watermark at end of last complete line"
+assert_contains "$output" "reset=4" "knowledge: --reset rescans everything"
+assert_contains "$output" "mixed=value,correction,reference URL mentioned: HTTPS://Example.com/A" "knowledge: every category found in one scan"
+output=$(cd "$KN_DIR" && bash "$SCRIPT_DIR/extract-knowledge.sh" "$KN_DIR/-proj-k/b.jsonl")
+assert_contains "$output" '"URL mentioned: https://example.com/spec"' "knowledge: single-session mode"
+rm -rf "$KN_DIR"
+
+echo ""
+echo "--- resume dedup (uuid registry) ---"
+
+DD_DIR=$(mktemp -d)
+mkdir -p "$DD_DIR/-proj-d"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$DD_DIR/-proj-d" python3 -c "
+import json, os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+d = os.environ['ES_DIR']
+def user(uid, text, ts):
+    return {'type': 'user', 'uuid': uid, 'timestamp': ts, 'message': {'role': 'user', 'content': text}}
+def assistant(uid, text, ts):
+    return {'type': 'assistant', 'uuid': uid, 'timestamp': ts, 'message': {
+        'role': 'assistant', 'content': [{'type': 'text', 'text': text}],
+        'usage': {'input_tokens': 40, 'output_tokens': 10}}}
+def write(name, recs):
+    with open(os.path.join(d, name), 'w') as f:
+        for r in recs:
+            f.write(json.dumps(r) + '\\n')
+history = [user('u1', 'first question', '2026-01-01T00:00:00Z'),
+           assistant('u2', 'first answer', '2026-01-01T00:01:00Z'),
+           user('u3', 'second question', '2026-01-01T00:02:00Z'),
+           assistant('u4', 'second answer', '2026-01-01T00:03:00Z')]
+write('orig.jsonl', history)
+write('resumed.jsonl', [{'type': 'summary', 'summary': 'Earlier work', 'leafUuid': 'u4'}] + history +
+      [user('u5', 'resumed question', '2026-01-02T00:00:00Z'),
+       assistant('u6', 'resumed answer', '2026-01-02T00:01:00Z')])
+reg = echolib.UuidRegistry(d)
+print('update=%d,%d' % reg.update())
+print('again=%d,%d' % reg.update())
+print('orig_start=%s' % (reg.first_seen(os.path.join(d, 'orig.jsonl')) == (0, frozenset())))
+start, skip = reg.first_seen(os.path.join(d, 'resumed.jsonl'))
+print('resumed_skip=%s' % (start == 0 and len(skip) == 4))
+reg.close()
+e = os.path.join(os.path.dirname(d), '-proj-e')
+os.mkdir(e)
+d, d_resumed = e, d
+write('orig.jsonl', history)
+write('cont.jsonl', history + [user('u5', 'continued question', '2026-01-02T00:00:00Z')])
+reg = echolib.UuidRegistry(e)
+reg.update()
+start, skip = reg.first_seen(os.path.join(e, 'cont.jsonl'))
+print('cont_start=%s' % (start == os.path.getsize(os.path.join(e, 'orig.jsonl')) and not skip))
+reg.close()
+d = d_resumed
+reg = echolib.uuid_registry(os.path.join(d, 'resumed.jsonl'))
+msgs = echolib.extract_messages(os.path.join(d, 'resumed.jsonl'), dedup=reg)
+print('messages=' + ','.join(m['text'] for m in msgs))
+full = echolib.session_stats(os.path.join(d, 'resumed.jsonl'))
+own = echolib.session_stats(os.path.join(d, 'resumed.jsonl'), dedup=reg)
+print('session_tokens=%d/%d' % (own['total_tokens'], full['total_tokens']))
+print('summary=' + own['summary'])
+plain = echolib.project_stats(d)['total']
+deduped = echolib.project_stats(d, dedup=True, workers=1)
+print('project_tokens=%d/%d' % (deduped['total']['total_tokens'], plain['total_tokens']))
+print('sessions=%d' % len(deduped['sessions']))
+")
+assert_contains "$output" "update=2,10" "dedup: registry records every uuid-bearing line"
+assert_contains "$output" "again=0,0" "dedup: unchanged transcripts not re-read"
+assert_contains "$output" "orig_start=True" "dedup: original session owns its records"
+assert_contains "$output" "resumed_skip=True" "dedup: repeated history after a leading summary skipped by offset"
+assert_contains "$output" "cont_start=True" "dedup: continued session starts after repeated history"
+assert_contains "$output" "messages=resumed question,resumed answer" "dedup: messages only first seen in session"
+assert_contains "$output" "session_tokens=50/150" "dedup: session stats exclude repeated history"
+assert_contains "$output" "summary=Earlier work" "dedup: uuid-less records before repeated history kept"
+assert_contains "$output" "project_tokens=150/250" "dedup: project totals count each record once"
+assert_contains "$output" "sessions=2" "dedup: per-session breakdown"
+output=$(bash "$SCRIPT_DIR/session-stats.sh" "$DD_DIR/-proj-d/resumed.jsonl" --dedup)
+assert_contains "$output" "assistant_messages=1" "wrapper: session-stats --dedup"
+output=$(bash "$SCRIPT_DIR/session-stats.sh" "$DD_DIR/-proj-d/resumed.jsonl" --dedup --follow 2>&1 || true)
+assert_contains "$output" "ERROR: --follow cannot be combined" "wrapper: session-stats --dedup excludes --follow"
+output=$(bash "$SCRIPT_DIR/extract-messages.sh" "$DD_DIR/-proj-d/resumed.jsonl" --dedup)
+assert_not_contains "$output" "first question" "wrapper: extract-messages --dedup"
+rm -rf "$DD_DIR"
+
+echo ""
+echo "--- session digests ---"
+
+DG_DIR=$(mktemp -d)
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$DG_DIR" ES_SAMPLE="$SAMPLE" python3 -c "
+import os, sys, time
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+d = os.environ['ES_DIR']
+small = os.path.join(d, 'small.jsonl')
+big = os.path.join(d, 'big.jsonl')
+sample = open(os.environ['ES_SAMPLE']).read()
+open(small, 'w').write(sample)
+with open(big, 'w') as f:
+    while f.tell() < echolib.DIGEST_MIN_BYTES:
+        f.write(sample)
+settle = lambda: os.utime(big, (1, time.time() - 3600))
+print('small=%s' % (echolib.session_digest(small) is None and not os.path.exists(str(echolib.digest_path(small)))))
+views = lambda digest: (
+    [list(echolib.extract_messages(big, role=r, no_tools=n, limit=l, thinking_limit=-1, digest=digest))
+     for r in ('both', 'user', 'assistant') for n in (False, True) for l in (0, 3)],
+    [list(echolib.extract_tools(big, tool_filter=t, errors_only=e, limit=l, digest=digest))
+     for t in ('', 'Bash') for e in (False, True) for l in (0, 2)],
+    echolib.extract_files_changed(big, with_versions=True, digest=digest),
+    echolib.session_stats(big, digest=digest))
+raw = views(False)
+settle()
+views(True)
+list(echolib.extract_messages(big, limit=5))
+list(echolib.extract_file_timeline(big))
+print('reads_unbuilt=%s' % (echolib.load_digest(big) is None and echolib.session_digest(big) is None))
+dg = echolib.build_digest(big)
+print('built=%s' % (dg is not None and echolib.digest_path(big).name == 'big.digest'))
+print('same=%s' % (views(True) == raw))
+print('compact=%s' % (os.path.getsize(str(echolib.digest_path(big))) * 4 < os.path.getsize(big)))
+with open(big, 'a') as f:
+    f.write(sample)
+print('stale=%s' % (echolib.load_digest(big) is None))
+settle()
+n = len(list(echolib.extract_tools(big)))
+print('stale_read=%s' % (echolib.load_digest(big) is None and n == len(list(echolib.extract_tools(big, digest=False)))))
+echolib.build_digest(big)
+n = len(list(echolib.extract_tools(big)))
+print('refreshed=%s' % (echolib.load_digest(big) is not None and n == len(list(echolib.extract_tools(big, digest=False)))))
+")
+assert_contains "$output" "small=True" "digest: small sessions are read directly"
+assert_contains "$output" "reads_unbuilt=True" "digest: reads never build one"
+assert_contains "$output" "built=True" "digest: written beside the session"
+assert_contains "$output" "same=True" "digest: views match the raw .jsonl"
+assert_contains "$output" "compact=True" "digest: much smaller than the session"
+assert_contains "$output" "stale=True" "digest: stale after the session grows"
+assert_contains "$output" "stale_read=True" "digest: stale digest ignored, session read directly"
+assert_contains "$output" "refreshed=True" "digest: served again once rebuilt"
+# A plain file where the digest directory belongs forces a raw read
+rm -rf "$DG_DIR/.echo-sleuth-digests" && touch "$DG_DIR/.echo-sleuth-digests"
+expected=$(bash "$SCRIPT_DIR/extract-tools.sh" "$DG_DIR/big.jsonl" --errors-only)
+rm -f "$DG_DIR/.echo-sleuth-digests"
+bash "$SCRIPT_DIR/extract-messages.sh" "$DG_DIR/big.jsonl" --limit 5 >/dev/null
+assert_equals "$(ls "$DG_DIR/.echo-sleuth-digests" 2>/dev/null | grep -c "^big.digest$")" "0" "wrapper: extract-messages does not build the digest"
+ES_SCRIPT_DIR="$SCRIPT_DIR" ES_FILE="$DG_DIR/big.jsonl" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.build_digest(os.environ['ES_FILE'])
+"
+output=$(bash "$SCRIPT_DIR/extract-tools.sh" "$DG_DIR/big.jsonl" --errors-only)
+assert_equals "$output" "$expected" "wrapper: extract-tools output unchanged via digest"
+rm -rf "$DG_DIR"
+
+echo ""
+echo "--- blob store (content-addressed payloads) ---"
+
+BS_DIR=$(mktemp -d)
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$BS_DIR" ES_SAMPLE="$SAMPLE" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+d = os.environ['ES_DIR']
+store = echolib.BlobStore(os.path.join(d, 'blobs.sqlite'), max_bytes=1 << 20)
+b = store.put(os.urandom(600000), 'two')
+store.commit()
+a = store.put('x' * 5000, 'one')
+print('same_hash=%s' % (store.put(b'x' * 5000, 'two') == a == echolib.blob_hash(b'x' * 5000)))
+store.commit()
+st = store.stats()
+print('dedup=%d,%d,%d' % (st['blobs'], st['refs'], st['referenced']))
+print('compressed=%s' % (st['stored_bytes'] < st['raw_bytes']))
+print('get=%s' % (store.get(a) == b'x' * 5000))
+store.release('one')
+store.release('two')
+c = store.put(os.urandom(600000), 'three')
+print('evicted=%d' % store.evict())
+print('kept=%s,%s,%s' % (store.get(a) is not None, store.get(b) is None, store.get(c) is not None))
+store.close()
+
+big = os.path.join(d, 'big.jsonl')
+sample = open(os.environ['ES_SAMPLE']).read()
+with open(big, 'w') as f:
+    while f.tell() < echolib.DIGEST_MIN_BYTES:
+        f.write(sample)
+raw_full = list(echolib.extract_tools(big, full_results=True, digest=False))
+raw_timeline = list(echolib.extract_file_timeline(big, digest=False))
+echolib.build_digest(big)
+print('full=%s' % (list(echolib.extract_tools(big, full_results=True)) == raw_full))
+print('timeline=%s' % (list(echolib.extract_file_timeline(big)) == raw_timeline))
+store = echolib.project_blob_store(big)
+st = store.stats()
+print('shared=%s' % (0 < st['blobs'] < st['refs'] or st['blobs'] < len(raw_full)))
+store.max_bytes = 0
+store.evict()
+store.close()
+print('fallback=%s,%s' % (list(echolib.extract_tools(big, full_results=True)) == raw_full,
+                          list(echolib.extract_file_timeline(big)) == raw_timeline))
+")
+assert_contains "$output" "same_hash=True" "blobs: identical payloads share one hash"
+assert_contains "$output" "dedup=2,3,2" "blobs: stored once, one reference per owner"
+assert_contains "$output" "compressed=True" "blobs: payloads compressed"
+assert_contains "$output" "get=True" "blobs: payload round-trips"
+assert_contains "$output" "evicted=1" "blobs: evicts to stay within max_bytes"
+assert_contains "$output" "kept=True,True,True" "blobs: least recently stored unreferenced blob goes first"
+assert_contains "$output" "full=True" "blobs: full results served from digest"
+assert_contains "$output" "timeline=True" "blobs: timeline served from digest"
+assert_contains "$output" "shared=True" "blobs: repeated results stored once"
+assert_contains "$output" "fallback=True,True" "blobs: evicted blobs fall back to the transcript"
+output=$(bash "$SCRIPT_DIR/extract-tools.sh" "$SAMPLE" --full-results --tool Read)
+assert_contains "$output" '\n' "wrapper: extract-tools --full-results escapes newlines"
+rm -rf "$BS_DIR"
+
+echo ""
+echo "--- multi-file read-ahead (iter_many) ---"
+
+IM_DIR=$(mktemp -d)
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$IM_DIR" ES_SAMPLE="$SAMPLE" python3 -c "
+import os, sys, time, shutil
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+d = os.path.join(os.environ['ES_DIR'], '-tmp-im')
+os.makedirs(d)
+paths = []
+for i in range(12):
+    paths.append(os.path.join(d, 'sess-%02d.jsonl' % i))
+    shutil.copy(os.environ['ES_SAMPLE'], paths[-1])
+
+# Simulate a high-latency filesystem: every open waits 50ms
+real_open = echolib.open_session
+def slow_open(*args, **kwargs):
+    time.sleep(0.05)
+    return real_open(*args, **kwargs)
+echolib.open_session = slow_open
+
+t = time.time()
+serial = [(p, r) for p in paths for r in echolib.iter_records(p)]
+serial_t = time.time() - t
+t = time.time()
+ahead = list(echolib.iter_many(paths[:6] + [os.path.join(d, 'missing.jsonl')] + paths[6:]))
+ahead_t = time.time() - t
+print('same=%s' % ([(p, r.uuid, r.type) for p, r in ahead] == [(p, r.uuid, r.type) for p, r in serial]))
+print('faster=%s' % (ahead_t < serial_t / 2))
+gen = echolib.iter_many(paths, types={'user'})
+first = next(gen)
+gen.close()
+print('closed=%s' % (first[0] == paths[0] and first[1].type == 'user'))
+
+plain = echolib.build_fallback_index(d)
+os.remove(os.path.join(d, echolib.INDEX_CACHE_FILE))
+fetched = echolib.build_fallback_index(d, concurrency=4)
+print('index=%s' % ([e.to_tsv() for e in plain] == [e.to_tsv() for e in fetched] and len(plain) == 12))
+items = echolib.extract_project_knowledge(d, workers=1, concurrency=4)
+serial = echolib.extract_project_knowledge(d, workers=1, reset=True)
+print('knowledge=%s' % (items == serial and len(items) > 0))
+")
+assert_contains "$output" "same=True" "iter_many: same records, in path order, missing files skipped"
+assert_contains "$output" "faster=True" "iter_many: overlaps slow opens across files"
+assert_contains "$output" "closed=True" "iter_many: closing early stops the readers"
+assert_contains "$output" "index=True" "iter_many: read-ahead fallback index matches serial build"
+assert_contains "$output" "knowledge=True" "iter_many: read-ahead knowledge scan matches serial scan"
+rm -rf "$IM_DIR"
+
+echo ""
+echo "--- schema registry (drift across versions) ---"
+
+SR_DIR=$(mktemp -d)
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$SR_DIR" python3 -c "
+import os, sys, json
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+def rec(version, rtype, ts, **extra):
+    d = dict(type=rtype, version=version, timestamp=ts, uuid='u-' + ts, **extra)
+    return json.dumps(d) + '\\n'
+proj = echolib.CLAUDE_DIR / '-proj-a'
+proj.mkdir()
+old = [rec('2.1.9', 'user', '2026-01-01T00:00:00Z', message={'role': 'user', 'content': 'hi'}),
+       rec('2.1.9', 'assistant', '2026-01-01T00:00:01Z',
+           message={'role': 'assistant', 'content': [{'type': 'text', 'text': 'x'}]})]
+(proj / 'a.jsonl').write_text(''.join(old))
+registry = echolib.SchemaRegistry()
+print('first=%d,%d' % registry.update())
+new = [rec('2.1.14', 'user', '2026-02-01T00:00:00Z', message={'role': 'user', 'content': 'yo'}),
+       rec('2.1.14', 'assistant', '2026-02-01T00:00:01Z', effort='high',
+           message={'role': 'assistant', 'content': [{'type': 'thinking', 'thinking': ''}]}),
+       rec('2.1.14', 'hook-log', '2026-02-01T00:00:02Z')]
+with open(str(proj / 'a.jsonl'), 'a') as f:
+    f.write(''.join(new[:2]))
+(proj / 'b.jsonl').write_text(new[2])
+print('again=%d,%d' % registry.update())
+print('idle=%d,%d' % registry.update())
+drift = registry.drift(since_version='2.1.9')
+print('drift=' + ','.join('%s:%s' % (d['type'], d['field']) for d in drift))
+effort = [d for d in drift if d['field'] == 'effort'][0]
+raw = open(str(proj / 'a.jsonl'), 'rb').read()
+print('offset=%s' % (effort['offset'] == len(''.join(old + new[:1]).encode()) and effort['session_id'] == 'a'))
+print('unknown=' + ','.join(d['type'] for d in drift if d['kind'] == 'type' and not d['known']))
+print('versions=' + ','.join(registry.versions()))
+print('baseline=%d' % len([d for d in registry.drift() if d['version'] == '2.1.9']))
+loads = json.loads
+decoded = []
+def counting_loads(s, *args, **kwargs):
+    decoded.append(s)
+    return loads(s, *args, **kwargs)
+json.loads = counting_loads
+same = [rec('2.1.20', 'assistant', '2026-03-01T00:00:%02dZ' % i,
+            message={'role': 'assistant', 'content': [{'type': 'text', 'text': 'x' * i}]})
+        for i in range(40)]
+later = [rec('2.1.20', 'assistant', '2026-03-01T00:01:00Z',
+             message={'role': 'assistant', 'content': [{'type': 'image', 'text': 'x'}]}),
+         rec('2.1.20', 'assistant', '2026-03-01T00:01:01Z', stop='end',
+             message={'role': 'assistant', 'content': [{'type': 'text', 'text': 'x'}]})]
+(proj / 'c.jsonl').write_text(''.join(same + later))
+registry.update()
+json.loads = loads
+print('decoded=%d/%d' % (len(decoded), len(same + later)))
+print('sampled=' + ','.join(d['field'] for d in registry.drift(since_version='2.1.14')))
+")
+assert_contains "$output" "first=1," "schema registry: first update reads the session"
+assert_contains "$output" "again=2,23" "schema registry: only appended records and new files read"
+assert_contains "$output" "idle=0,0" "schema registry: unchanged corpus costs nothing"
+assert_contains "$output" "drift=assistant:content.thinking,assistant:effort,hook-log:,hook-log:timestamp,hook-log:type,hook-log:uuid,hook-log:version" "schema registry: new types and fields per version"
+assert_contains "$output" "offset=True" "schema registry: first sighting located by session and offset"
+assert_contains "$output" "unknown=hook-log" "schema registry: unknown record types flagged"
+assert_contains "$output" "versions=2.1.9,2.1.14" "schema registry: versions in numeric order"
+assert_not_contains "$output" "baseline=0" "schema registry: oldest version's shapes all reported"
+assert_contains "$output" "decoded=5/42" "schema registry: lines of known shape not decoded"
+assert_contains "$output" "sampled=content.image,stop" "schema registry: new block types and keys still found"
+output=$(HOME="$SR_DIR" bash "$SCRIPT_DIR/parse-jsonl.sh" --schema-drift 2>&1 || true)
+assert_contains "$output" "No Claude projects directory" "wrapper: parse-jsonl --schema-drift without a corpus"
+rm -rf "$SR_DIR"
+
+echo ""
+echo "--- multi-root corpus (sharded catalog and search) ---"
+
+MR_DIR=$(mktemp -d)
+mkdir -p "$MR_DIR/one/-proj-a" "$MR_DIR/two/-proj-b" "$MR_DIR/both/-proj-a" "$MR_DIR/both/-proj-b"
+head -5 "$SAMPLE" > "$MR_DIR/one/-proj-a/sess-a.jsonl"
+cp "$SAMPLE" "$MR_DIR/two/-proj-b/sess-b.jsonl"
+cat > "$MR_DIR/two/-proj-b/sessions-index.json" <<'JSONEOF'
+{"entries": [
+  {"sessionId": "b-old", "created": "2025-12-01T09:00:00Z", "summary": "old work"},
+  {"sessionId": "b-new", "created": "2026-02-01T09:00:00Z", "summary": "new work"}
+]}
+JSONEOF
+cp -p "$MR_DIR/one/-proj-a/"* "$MR_DIR/both/-proj-a/"
+cp -p "$MR_DIR/two/-proj-b/"* "$MR_DIR/both/-proj-b/"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$MR_DIR" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+base = Path(os.environ['ES_DIR'])
+roots = os.pathsep.join([str(base / 'one'), str(base / 'two'), str(base / 'one')])
+print('roots=%d' % len(echolib.corpus_roots(roots)))
+os.environ[echolib.CORPUS_ROOTS_ENV] = ''
+print('default=%s' % (echolib.corpus_roots() == [echolib.CLAUDE_DIR]))
+ids = lambda es: ','.join(e.session_id for e in es)
+echolib.CLAUDE_DIR = base / 'both'
+whole = ids(echolib.list_sessions(scope='all', limit=10))
+ix = echolib.SearchIndex()
+ix.ingest()
+single = sorted((h['score'], h['path'].replace('/both/', '/')) for h in ix.search('authentication bug npm', k=50))
+ix.close()
+echolib.CLAUDE_DIR = base / 'nowhere'
+print('sessions=%s' % (ids(echolib.corpus_sessions(roots, limit=10, workers=2)) == whole))
+print('top1=' + ids(echolib.corpus_sessions(roots, limit=1)))
+print('grep=' + ids(echolib.corpus_sessions(roots, grep_pat='OLD')))
+print('restored=%s' % (echolib.CLAUDE_DIR == base / 'nowhere'))
+hits, files_read, docs_added = echolib.corpus_search('authentication bug npm', roots, k=50, workers=2)
+print('indexed=%d' % files_read)
+print('search=%s' % (sorted((h['score'], h['path'].replace('/one/', '/').replace('/two/', '/'))
+                            for h in hits) == single))
+print('top=%s' % (len(echolib.corpus_search('authentication bug npm', roots, k=3)[0]) == 3))
+print('root=%s' % sorted(set(os.path.basename(h['root']) for h in hits)))
+catalog = base / 'one' / echolib.CATALOG_FILE
+before = catalog.stat().st_mtime_ns
+(base / 'three' / '-proj-c').mkdir(parents=True)
+echolib.corpus_sessions(roots + os.pathsep + str(base / 'three'))
+print('untouched=%s' % (catalog.stat().st_mtime_ns == before))
+print('again=%d' % echolib.corpus_search('npm', roots)[1])
+")
+assert_contains "$output" "roots=2" "corpus: duplicate roots dropped"
+assert_contains "$output" "default=True" "corpus: CLAUDE_DIR when no roots configured"
+assert_contains "$output" "sessions=True" "corpus: sharded listing equals one catalog over every root"
+assert_contains "$output" "top1=b-new" "corpus: limit keeps the newest across shards"
+assert_contains "$output" "grep=b-old" "corpus: filters applied in each shard"
+assert_contains "$output" "restored=True" "corpus: CLAUDE_DIR restored after serial shards"
+assert_contains "$output" "indexed=2" "corpus: each shard ingests its own transcripts"
+assert_contains "$output" "search=True" "corpus: merged scores equal one index over every root"
+assert_contains "$output" "top=True" "corpus: top-k bounds the merged hits"
+assert_contains "$output" "root=['one', 'two']" "corpus: hits name their root"
+assert_contains "$output" "untouched=True" "corpus: adding a root leaves other shards' caches alone"
+assert_contains "$output" "again=0" "corpus: shard indexes are incremental"
+output=$(HOME="$MR_DIR" bash "$SCRIPT_DIR/list-sessions.sh" all --roots "$MR_DIR/one:$MR_DIR/two" --limit 2 2>&1)
+assert_contains "$output" "b-new" "wrapper: list-sessions --roots lists every root"
+output=$(HOME="$MR_DIR" ECHO_SLEUTH_ROOTS="$MR_DIR/one:$MR_DIR/two" bash "$SCRIPT_DIR/search-messages.sh" npm all --no-ingest 2>&1)
+assert_contains "$output" "tool:Bash" "wrapper: search-messages reads ECHO_SLEUTH_ROOTS"
+output=$(HOME="$MR_DIR" bash "$SCRIPT_DIR/list-sessions.sh" all --stream --roots "$MR_DIR/one" 2>&1 || true)
+assert_contains "$output" "single root" "wrapper: --stream rejects multiple roots"
+rm -rf "$MR_DIR"
+
+echo ""
+echo "--- cache warmer (recent sessions, budgeted) ---"
+
+WARM_ROOT=$(mktemp -d)
+mkdir -p "$WARM_ROOT/.claude/projects/-proj-a" "$WARM_ROOT/.claude/projects/-proj-b"
+cp "$SAMPLE" "$WARM_ROOT/.claude/projects/-proj-a/new.jsonl"
+cp "$SAMPLE" "$WARM_ROOT/.claude/projects/-proj-a/old.jsonl"
+cp "$SAMPLE" "$WARM_ROOT/.claude/projects/-proj-b/mid.jsonl"
+touch -d "30 days ago" "$WARM_ROOT/.claude/projects/-proj-a/old.jsonl"
+touch -d "1 hour ago" "$WARM_ROOT/.claude/projects/-proj-b/mid.jsonl"
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_ROOT="$WARM_ROOT/.claude/projects" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_ROOT'])
+echolib.DIGEST_MIN_BYTES = 0
+name = lambda t: t.name if t.suffix != '.jsonl' else t.stem
+plan = echolib.warm_plan()
+print('plan=' + ','.join('%s:%s' % (k, name(t)) for k, t, _ in plan))
+print('stats_cost=%s' % [c for k, t, c in plan if k == 'stats'])
+budget = echolib.ScanBudget(max_bytes=1)
+print('budget=' + ','.join(k for k, *_ in echolib.warm_caches(budget=budget)) + ' %s' % budget.exhausted)
+with echolib.CacheLock(echolib.CLAUDE_DIR / echolib.WARM_LOCK_FILE):
+    print('locked=%d' % len(list(echolib.warm_caches())))
+done = list(echolib.warm_caches(duty=0.9))
+print('done=' + ','.join(k for k, *_ in done))
+print('again=%d' % len(echolib.warm_plan()))
+new = echolib.CLAUDE_DIR / '-proj-a' / 'new.jsonl'
+print('warm=%s,%s' % (echolib.load_digest(new) is not None,
+                      echolib._stats_cache_state([new], new.parent / echolib.STATS_CACHE_FILE)[3] == []))
+echolib.SchemaRegistry().update()
+with open(str(new), 'a') as f:
+    f.write(open(str(new)).readline())
+os.utime(str(new), None)
+print('appended=' + ','.join(k for k, *_ in echolib.warm_caches()))
+print('only=[%s]' % ','.join(k for k, *_ in echolib.warm_caches(kinds=('index',), recent_days=60)))
+")
+assert_contains "$output" "plan=index:-proj-a,digest:new,stats:new,index:-proj-b,digest:mid,stats:mid,catalog:.echo-sleuth-catalog.json" "warmer: stale caches of recent sessions, newest first"
+assert_contains "$output" "stats_cost=[0, 0]" "warmer: stats of digested sessions cost no transcript reads"
+assert_contains "$output" "budget=index True" "warmer: byte budget stops the run after the first task"
+assert_contains "$output" "locked=0" "warmer: overlapping run does nothing"
+assert_contains "$output" "done=digest,stats,index,digest,stats,catalog" "warmer: remaining work done on the next run"
+assert_contains "$output" "again=0" "warmer: warm tree plans nothing"
+assert_contains "$output" "warm=True,True" "warmer: digest and stats cache are fresh"
+assert_contains "$output" "appended=index,digest,stats,catalog,schema" "warmer: existing sqlite stores kept warm"
+assert_contains "$output" "only=[]" "warmer: kinds restrict the plan"
+output=$(HOME="$WARM_ROOT" bash "$SCRIPT_DIR/warm-caches.sh" --dry-run --days 60 --nice 0 2>&1)
+assert_contains "$output" "# planned" "wrapper: warm-caches --dry-run reports the plan"
+output=$(HOME="$WARM_ROOT" bash "$SCRIPT_DIR/warm-caches.sh" --only bogus 2>&1 || true)
+assert_contains "$output" "Unknown cache kind(s): bogus" "wrapper: warm-caches rejects unknown kinds"
+rm -rf "$WARM_ROOT"
+
+echo ""
+echo "--- batch memory claim verification ---"
+
+VM_DIR=$(mktemp -d)
+mkdir -p "$VM_DIR/repo/src/app" "$VM_DIR/repo/ignored" "$VM_DIR/projects/-repo/memory" "$VM_DIR/projects/-gone/memory"
+printf 'def load_config():\n    return SessionCache()\n\n\nclass SessionCache:\n    pass\n' > "$VM_DIR/repo/src/app/main.py"
+printf '# parseLegacy was removed in favour of load_config\n' > "$VM_DIR/repo/src/app/notes.py"
+printf 'def hidden_helper():\n    pass\n' > "$VM_DIR/repo/ignored/extra.py"
+echo "{\"originalPath\": \"$VM_DIR/repo\", \"entries\": []}" > "$VM_DIR/projects/-repo/sessions-index.json"
+cat > "$VM_DIR/projects/-repo/memory/layout.md" <<'MDEOF'
+---
+name: layout
+type: project
+---
+Entry point is `src/app/main.py` (see app/main.py); `load_config()` builds a `SessionCache`.
+The old lib/legacy.py and `parseLegacy` were removed. Docs: https://example.com/docs/index.html
+MDEOF
+cat > "$VM_DIR/projects/-repo/memory/plain.md" <<'MDEOF'
+---
+name: plain
+type: feedback
+---
+Prefer small commits.
+MDEOF
+cat > "$VM_DIR/projects/-gone/memory/orphan.md" <<'MDEOF'
+---
+name: orphan
+type: project
+---
+Lives in src/main.rs.
+MDEOF
+output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$VM_DIR" python3 -c "
+import os, sys
+from pathlib import Path
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+echolib.CLAUDE_DIR = Path(os.environ['ES_DIR']) / 'projects'
+print('claims=' + ','.join(v for k, v in echolib.extract_claims(
+    'Edit \x60scripts/run.py\x60 or ./a/b.txt, not https://x.io/a/b.py; call \x60mod.run_all()\x60, \x60build\x60')))
+calls = []
+real = echolib.resolve_project_root
+echolib.resolve_project_root = lambda d: calls.append(d) or real(d)
+mems = [m for _, d in sorted(echolib.all_memory_dirs()) for m in echolib.iter_memories(d)]
+reports = {os.path.basename(r.memory.path): r for r in echolib.verify_memories(mems)}
+print('resolved=%d' % len(calls))
+r = reports['layout.md']
+print('verified=' + ','.join(v for k, v in r.verified))
+print('missing=' + ','.join('%s:%s' % m for m in r.missing))
+print('score=%s' % (r.score == min(100, echolib.staleness_score(r.memory).score + 50)))
+print('plain=%d,%d' % (len(reports['plain.md'].verified), len(reports['plain.md'].missing)))
+print('orphan=%s' % reports['orphan.md'].root)
+snap = echolib.ProjectSnapshot(os.environ['ES_DIR'] + '/repo', ['hidden_helper'])
+print('walk=%s,%s' % (snap.has_path('ignored/extra.py'), snap.has_identifier('hidden_helper')))
+")
+assert_contains "$output" "claims=scripts/run.py,./a/b.txt,run_all" "claims: paths and identifiers extracted, URLs and plain words skipped"
+assert_contains "$output" "resolved=2" "verify_memories: each project root resolved once"
+assert_contains "$output" "verified=src/app/main.py,app/main.py,load_config,SessionCache" "verify_memories: existing paths and identifiers verified"
+assert_contains "$output" "missing=path:lib/legacy.py,identifier:parseLegacy" "verify_memories: missing claims reported, mentions are not definitions"
+assert_contains "$output" "score=True" "verify_memories: missing file and identifier raise the score"
+assert_contains "$output" "plain=0,0" "verify_memories: memories without claims pass"
+assert_contains "$output" "orphan=None" "verify_memories: unresolvable root leaves claims unchecked"
+assert_contains "$output" "walk=True,True" "snapshot: directory walk outside git"
+if command -v git >/dev/null 2>&1; then
+  git -C "$VM_DIR/repo" init -q
+  echo "ignored/" > "$VM_DIR/repo/.gitignore"
+  output=$(ES_SCRIPT_DIR="$SCRIPT_DIR" ES_DIR="$VM_DIR" python3 -c "
+import os, sys
+sys.path.insert(0, os.environ['ES_SCRIPT_DIR'])
+import echolib
+snap = echolib.ProjectSnapshot(os.environ['ES_DIR'] + '/repo', ['hidden_helper', 'load_config'])
+print('git=%s,%s,%s' % (snap.has_path('src/app/main.py'), snap.has_path('ignored/extra.py'),
+                        sorted(snap.identifiers)))
+")
+  assert_contains "$output" "git=True,False,['load_config']" "snapshot: git ls-files honours .gitignore"
+fi
+output=$(HOME="$VM_DIR" bash -c 'mkdir -p "$HOME/.claude" && ln -s "$HOME/projects" "$HOME/.claude/projects" && bash "$1/verify-memories.sh" --missing-only' _ "$SCRIPT_DIR" 2>&1)
+assert_contains "$output" "layout.md	project" "wrapper: verify-memories reports memories with missing claims"
+assert_contains "$output" "orphan.md" "wrapper: verify-memories flags unresolved roots"
+assert_not_contains "$output" "plain.md" "wrapper: --missing-only hides fully verified memories"
+rm -rf "$VM_DIR"
+
 # ===================================================================
 echo ""
 echo "=========================================="